@@ -0,0 +1,291 @@
+# Local mock steemd JSON-RPC server for benchmarks
+
+import argparse
+import collections
+import gzip
+import hashlib
+import http.server
+import json
+import random
+import socketserver
+import threading
+import time
+
+HEAD_BLOCK_NUM = 30000000
+BLOCK_INTERVAL = 3
+GENESIS_TIME = 1458835200
+
+def _timestamp(block_num):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(GENESIS_TIME + BLOCK_INTERVAL * block_num))
+
+def _hex(data, length):
+    return hashlib.sha256(data).hexdigest()[:length]
+
+def make_dynamic_global_properties(head_block_num=HEAD_BLOCK_NUM):
+    return collections.OrderedDict((
+        ("id", 0),
+        ("head_block_number", head_block_num),
+        ("head_block_id", "{:08x}".format(head_block_num) + _hex(str(head_block_num).encode("ascii"), 32)),
+        ("time", _timestamp(head_block_num)),
+        ("current_witness", "witness-{}".format(head_block_num % 21)),
+        ("total_pow", 514415),
+        ("num_pow_witnesses", 172),
+        ("virtual_supply", {"amount": "375000000000", "precision": 3, "nai": "@@000000021"}),
+        ("current_supply", {"amount": "360000000000", "precision": 3, "nai": "@@000000021"}),
+        ("current_sbd_supply", {"amount": "13000000000", "precision": 3, "nai": "@@000000013"}),
+        ("total_vesting_fund_steem", {"amount": "190000000000", "precision": 3, "nai": "@@000000021"}),
+        ("total_vesting_shares", {"amount": "380000000000000000", "precision": 6, "nai": "@@000000037"}),
+        ("total_reward_fund_steem", {"amount": "0", "precision": 3, "nai": "@@000000021"}),
+        ("total_reward_shares2", "0"),
+        ("pending_rewarded_vesting_shares", {"amount": "380000000000", "precision": 6, "nai": "@@000000037"}),
+        ("pending_rewarded_vesting_steem", {"amount": "190000000", "precision": 3, "nai": "@@000000021"}),
+        ("sbd_interest_rate", 0),
+        ("sbd_print_rate", 10000),
+        ("maximum_block_size", 65536),
+        ("current_aslot", head_block_num + 100000),
+        ("recent_slots_filled", "340282366920938463463374607431768211455"),
+        ("participation_count", 128),
+        ("last_irreversible_block_num", head_block_num - 15),
+        ("vote_power_reserve_rate", 10),
+        ("delegation_return_period", 432000),
+        ("reverse_auction_seconds", 1800),
+        ("sbd_stop_percent", 500),
+        ("sbd_start_percent", 200),
+        ))
+
+def make_transaction(block_num, i):
+    seed = "{}/{}".format(block_num, i).encode("ascii")
+    op = collections.OrderedDict((
+        ("type", "vote_operation"),
+        ("value", collections.OrderedDict((
+            ("voter", "voter-{}".format(i)),
+            ("author", "author-{}".format(block_num % 997)),
+            ("permlink", "post-" + _hex(seed, 16)),
+            ("weight", 10000),
+            ))),
+        ))
+    return collections.OrderedDict((
+        ("ref_block_num", block_num & 0xFFFF),
+        ("ref_block_prefix", int(_hex(seed, 8), 16)),
+        ("expiration", _timestamp(block_num + 20)),
+        ("operations", [op]),
+        ("extensions", []),
+        ("signatures", [_hex(seed + b"sig", 64) + _hex(seed + b"sig2", 66)]),
+        ))
+
+def make_block(block_num, transactions_per_block=20):
+    txs = [make_transaction(block_num, i) for i in range(transactions_per_block)]
+    return collections.OrderedDict((
+        ("previous", "{:08x}".format(block_num - 1) + _hex(str(block_num - 1).encode("ascii"), 32)),
+        ("timestamp", _timestamp(block_num)),
+        ("witness", "witness-{}".format(block_num % 21)),
+        ("transaction_merkle_root", _hex(str(block_num).encode("ascii") + b"merkle", 40)),
+        ("extensions", []),
+        ("witness_signature", _hex(str(block_num).encode("ascii") + b"witness", 64) + "00"),
+        ("transactions", txs),
+        ("block_id", "{:08x}".format(block_num) + _hex(str(block_num).encode("ascii"), 32)),
+        ("signing_key", "STM" + _hex(str(block_num % 21).encode("ascii"), 50)),
+        ("transaction_ids", [_hex(json.dumps(tx).encode("ascii"), 40) for tx in txs]),
+        ))
+
+class _ThreadedHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # The default listen backlog of 5 overflows under the threaded
+    # workloads, and the SYN retries that follow would be measured as
+    # client latency
+    request_queue_size = 128
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without TCP_NODELAY the
+    # body of a keep-alive response waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        mock = self.server.mock
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        mock.sleep()
+        if mock.inject_http_error():
+            self._send(503, b"Service Unavailable")
+            return
+        try:
+            req = json.loads(body.decode("utf-8"))
+        except ValueError:
+            self._send(400, b"Bad Request")
+            return
+        if isinstance(req, list):
+            resp = [mock.answer(r) for r in req]
+        else:
+            resp = mock.answer(req)
+        resp_bytes = json.dumps(resp, separators=(",", ":")).encode("utf-8")
+        encoding = None
+        if mock.compress and ("gzip" in self.headers.get("Accept-Encoding", "")):
+            encoding, resp_bytes = "gzip", gzip.compress(resp_bytes)
+        self._send(200, resp_bytes, encoding)
+
+    def _send(self, status, body, encoding=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class MockSteemd(object):
+    """
+    Minimal steemd stand-in serving appbase JSON-RPC over HTTP/1.1 with
+    keep-alive, for benchmarking without a real node.
+
+        with MockSteemd(latency=0.005) as mock:
+            backend = SteemRemoteBackend(nodes=[mock.url], appbase=True)
+
+    Known methods:  get_dynamic_global_properties, get_block,
+    get_block_header, get_block_range and get_config, all with synthetic
+    but realistically shaped and sized bodies.  Anything else is echoed.
+    """
+    def __init__(self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        jitter=0.0,
+        http_error_rate=0.0,
+        rpc_error_rate=0.0,
+        transactions_per_block=20,
+        head_block_num=HEAD_BLOCK_NUM,
+        compress=False,
+        seed=None,
+        ):
+        """
+        :param host:  Address to listen on
+        :param port:  Port to listen on, 0 for any free port
+        :param latency:  Seconds added to every HTTP request
+        :param jitter:  Maximum random seconds added on top of latency
+        :param http_error_rate:  Fraction of HTTP requests answered with 503
+        :param rpc_error_rate:  Fraction of calls answered with a JSON-RPC error
+        :param transactions_per_block:  Number of transactions in each block, which sets the payload size
+        :param head_block_num:  Head block number reported by the mock chain
+        :param compress:  If true, gzip responses for clients accepting it
+        :param seed:  Seed of the random error injection and jitter
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.http_error_rate = http_error_rate
+        self.rpc_error_rate = rpc_error_rate
+        self.transactions_per_block = transactions_per_block
+        self.head_block_num = head_block_num
+        self.compress = compress
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._blocks = {}
+
+        self.server = _ThreadedHTTPServer((host, port), _Handler)
+        self.server.mock = self
+        self.url = "http://{}:{}/".format(*self.server.server_address[:2])
+        self._thread = None
+        return
+
+    def _random(self):
+        with self._rng_lock:
+            return self.rng.random()
+
+    def sleep(self):
+        delay = self.latency
+        if self.jitter:
+            delay += self.jitter * self._random()
+        if delay > 0:
+            time.sleep(delay)
+        return
+
+    def inject_http_error(self):
+        return (self.http_error_rate > 0) and (self._random() < self.http_error_rate)
+
+    def block(self, block_num):
+        # Blocks are cached so that generating them does not dominate
+        # the server's response time
+        block = self._blocks.get(block_num)
+        if block is None:
+            block = make_block(block_num, self.transactions_per_block)
+            self._blocks[block_num] = block
+        return block
+
+    def answer(self, req):
+        req_id = req.get("id")
+        api, method, args = req["params"]
+        if (self.rpc_error_rate > 0) and (self._random() < self.rpc_error_rate):
+            return {"jsonrpc": "2.0", "id": req_id,
+                "error": {"code": -32000, "message": "injected error", "data": {"name": "fc::exception"}}}
+        return {"jsonrpc": "2.0", "id": req_id, "result": self.result(api, method, args)}
+
+    def result(self, api, method, args):
+        if method == "get_dynamic_global_properties":
+            return make_dynamic_global_properties(self.head_block_num)
+        if method == "get_block":
+            block_num = args["block_num"] if isinstance(args, dict) else args[0]
+            if block_num > self.head_block_num:
+                return {}
+            return {"block": self.block(block_num)}
+        if method == "get_block_header":
+            block_num = args["block_num"] if isinstance(args, dict) else args[0]
+            block = self.block(block_num)
+            return {"header": dict((k, block[k]) for k in
+                ("previous", "timestamp", "witness", "transaction_merkle_root", "extensions"))}
+        if method == "get_block_range":
+            start = args["starting_block_num"]
+            end = min(start + args["count"], self.head_block_num + 1)
+            return {"blocks": [self.block(n) for n in range(start, end)]}
+        if method == "get_config":
+            return {"STEEM_BLOCK_INTERVAL": BLOCK_INTERVAL, "STEEM_CHAIN_ID": "0" * 64}
+        return args
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a mock steemd JSON-RPC server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9990)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--http-error-rate", type=float, default=0.0)
+    parser.add_argument("--rpc-error-rate", type=float, default=0.0)
+    parser.add_argument("--transactions-per-block", type=int, default=20)
+    parser.add_argument("--compress", action="store_true")
+    args = parser.parse_args(argv)
+
+    mock = MockSteemd(host=args.host, port=args.port,
+        latency=args.latency, jitter=args.jitter,
+        http_error_rate=args.http_error_rate, rpc_error_rate=args.rpc_error_rate,
+        transactions_per_block=args.transactions_per_block, compress=args.compress)
+    print("mock steemd listening on", mock.url)
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# Benchmark SteemRemoteBackend against a local mock steemd
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+from simple_steem_client.client import SteemRemoteBackend, SteemException
+from simple_steem_client.transport import PooledHTTPTransport
+
+from benchmarks.mock_steemd import MockSteemd
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(p * len(sorted_values)), len(sorted_values) - 1)]
+
+def summarize(calls, errors, seconds, latencies):
+    latencies = sorted(latencies)
+    return {
+        "calls": calls,
+        "errors": errors,
+        "seconds": seconds,
+        "calls_per_second": calls / seconds if seconds > 0 else None,
+        "latency": {
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else None,
+            },
+        }
+
+def make_call(name, block_base):
+    """
+    Return a function i -> (api, method, kwargs) for workload call name.
+    """
+    if name == "get_block":
+        return lambda i: ("block_api", "get_block", {"block_num": block_base + i})
+    if name == "get_dynamic_global_properties":
+        return lambda i: ("database_api", "get_dynamic_global_properties", {})
+    raise ValueError("Unknown call {!r}".format(name))
+
+def timed_calls(backend, call, indices, latencies, errors):
+    for i in indices:
+        api, method, kwargs = call(i)
+        start_time = time.perf_counter()
+        try:
+            backend.rpc_call(api, method, method_kwargs=kwargs)
+        except Exception:
+            # Anything else escaping rpc_call() is still a failed call,
+            # not a reason to stop this worker's share of the calls
+            errors.append(i)
+        latencies.append(time.perf_counter() - start_time)
+    return
+
+def run_sequential(backend, call, count, **kwargs):
+    latencies = []
+    errors = []
+    start_time = time.perf_counter()
+    timed_calls(backend, call, range(count), latencies, errors)
+    return summarize(count, len(errors), time.perf_counter() - start_time, latencies)
+
+def run_threaded(backend, call, count, threads=8, **kwargs):
+    latencies = []
+    errors = []
+    workers = [threading.Thread(target=timed_calls,
+        args=(backend, call, range(t, count, threads), latencies, errors))
+        for t in range(threads)]
+    start_time = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return summarize(count, len(errors), time.perf_counter() - start_time, latencies)
+
+def run_batch(backend, call, count, batch_size=50, **kwargs):
+    latencies = []
+    errors = 0
+    start_time = time.perf_counter()
+    for first in range(0, count, batch_size):
+        calls = []
+        for i in range(first, min(first + batch_size, count)):
+            api, method, method_kwargs = call(i)
+            calls.append({"api": api, "method": method, "method_kwargs": method_kwargs})
+        batch_start = time.perf_counter()
+        results = backend.rpc_batch(calls)
+        # Latency of a batch is shared by every call in it
+        latencies.extend([time.perf_counter() - batch_start] * len(calls))
+        errors += sum(1 for r in results if isinstance(r, SteemException))
+    return summarize(count, errors, time.perf_counter() - start_time, latencies)
+
+WORKLOADS = {
+    "sequential": run_sequential,
+    "threaded": run_threaded,
+    "batch": run_batch,
+    }
+
+def make_backend(url, transport):
+    kwargs = {}
+    if transport == "pooled":
+        kwargs["urlopen"] = PooledHTTPTransport(max_connections=32)
+    # Injected errors are retried straight away, so the results measure
+    # the cost of retrying rather than the backoff sleep
+    return SteemRemoteBackend(nodes=[url], appbase=True, max_retries=-1,
+        sleep_function=lambda t: None, **kwargs)
+
+def git_revision():
+    try:
+        out = subprocess.check_output(["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.decode("ascii").strip()
+
+def run(args):
+    results = {}
+    mock = MockSteemd(latency=args.latency, jitter=args.jitter,
+        http_error_rate=args.http_error_rate, rpc_error_rate=args.rpc_error_rate,
+        transactions_per_block=args.transactions_per_block, seed=args.seed)
+    with mock:
+        for transport in args.transports:
+            for call_name in args.calls:
+                call = make_call(call_name, mock.head_block_num - args.count)
+                for workload in args.workloads:
+                    backend = make_backend(mock.url, transport)
+                    # Warm up connections and the mock's block cache
+                    WORKLOADS[workload](backend, call, min(args.count, args.warmup),
+                        threads=args.threads, batch_size=args.batch_size)
+                    best = None
+                    for r in range(args.repeat):
+                        result = WORKLOADS[workload](backend, call, args.count,
+                            threads=args.threads, batch_size=args.batch_size)
+                        if (best is None) or (result["seconds"] < best["seconds"]):
+                            best = result
+                    name = "{}/{}/{}".format(workload, call_name, transport)
+                    results[name] = best
+                    print("{:45s} {:>10s} calls/s  p50 {} ms  p99 {} ms".format(name,
+                        format_value(best["calls_per_second"], "{:.1f}"),
+                        format_value(best["latency"]["p50"], "{:.2f}", 1000),
+                        format_value(best["latency"]["p99"], "{:.2f}", 1000)))
+                    close = getattr(backend.urlopen, "close", None)
+                    if close is not None:
+                        close()
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            },
+        "results": results,
+        }
+
+def format_value(value, spec, scale=1):
+    if value is None:
+        return "n/a"
+    return spec.format(value * scale)
+
+def relative_change(old, new):
+    """
+    Return the change from old to new in percent, formatted, or "n/a" if
+    either is missing or old is zero.
+    """
+    if (old is None) or (new is None) or (old == 0):
+        return "{:>8s}".format("n/a")
+    return "{:+7.1f}%".format(100.0 * (new / old - 1.0))
+
+def compare(old, new):
+    """
+    Print the throughput and p50 latency change of each benchmark in new
+    relative to old.
+    """
+    for name in sorted(new["results"]):
+        if name not in old["results"]:
+            continue
+        a = old["results"][name]
+        b = new["results"][name]
+        print("{:45s} throughput {}  p50 {}".format(name,
+            relative_change(a["calls_per_second"], b["calls_per_second"]),
+            relative_change(a["latency"]["p50"], b["latency"]["p50"])))
+    return
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SteemRemoteBackend against a local mock steemd")
+    parser.add_argument("--workloads", nargs="+", default=sorted(WORKLOADS), choices=sorted(WORKLOADS))
+    parser.add_argument("--calls", nargs="+", default=["get_dynamic_global_properties", "get_block"],
+        choices=["get_dynamic_global_properties", "get_block"])
+    parser.add_argument("--transports", nargs="+", default=["urllib", "pooled"], choices=["urllib", "pooled"])
+    parser.add_argument("--count", type=int, default=1000, help="Calls per benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark, the fastest is reported")
+    parser.add_argument("--warmup", type=int, default=100, help="Calls made before measuring")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of server latency per HTTP request")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--http-error-rate", type=float, default=0.0)
+    parser.add_argument("--rpc-error-rate", type=float, default=0.0)
+    parser.add_argument("--transactions-per-block", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Compare with results previously written by --output")
+    args = parser.parse_args(argv)
+
+    output = run(args)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            compare(json.load(f), output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,391 @@
+# asyncio Steem client using only asyncio streams
+
+import asyncio
+import collections
+import io
+import logging
+import ssl
+import time
+import urllib.error
+import urllib.parse
+import zlib
+
+from simple_steem_client.client import (
+    SteemRemoteBackend,
+    SteemInterface,
+    SteemBatch,
+    SteemException,
+    SteemHTTPError,
+    SteemNetworkError,
+    SteemIllegalArgument,
+    )
+
+class AsyncSteemRemoteBackend(SteemRemoteBackend):
+    """
+    asyncio version of SteemRemoteBackend.  rpc_call() and rpc_batch()
+    are coroutines.
+
+    Accepts the same constructor options as SteemRemoteBackend, except
+    that urlopen is not used and sleep_function must return an awaitable
+    (asyncio.sleep is used if it is None or unspecified).  limiter and
+    hedge_policy are not supported; use max_concurrency_per_node to bound
+    the load on each node.  Instrumentation hooks, metrics and tracer
+    work as for SteemRemoteBackend, with each attempt's time split into
+    the queue (waiting for max_concurrency_per_node) and wait phases.
+    """
+    def __init__(self,
+        max_concurrency_per_node=100,
+        max_idle_connections=100,
+        ssl_context=None,
+        **kwargs
+        ):
+        """
+        :param max_concurrency_per_node:  Maximum number of requests in flight to each node
+        :param max_idle_connections:  Maximum number of idle keep-alive connections kept per node
+        :param ssl_context:  ssl.SSLContext used for https nodes, default context if None
+        :param kwargs:  Passed to SteemRemoteBackend
+        """
+        if kwargs.get("limiter") is not None:
+            # NodeLimiter.acquire() blocks the calling thread, which would
+            # stall the event loop
+            raise SteemIllegalArgument("limiter is not supported by AsyncSteemRemoteBackend, "
+                "use max_concurrency_per_node")
+        if kwargs.get("hedge_policy") is not None:
+            # Hedging runs attempts on a thread pool; concurrent async
+            # calls already overlap without one
+            raise SteemIllegalArgument("hedge_policy is not supported by AsyncSteemRemoteBackend")
+        if kwargs.get("sleep_function") is None:
+            kwargs["sleep_function"] = asyncio.sleep
+        super(AsyncSteemRemoteBackend, self).__init__(**kwargs)
+        self.max_concurrency_per_node = max_concurrency_per_node
+        self.max_idle_connections = max_idle_connections
+        self.ssl_context = ssl_context
+
+        # Both are created lazily so that they bind to the running loop
+        self._semaphores = {}
+        # (scheme, host, port) -> deque of (reader, writer)
+        self._pools = {}
+        return
+
+    def _semaphore(self, url):
+        sem = self._semaphores.get(url)
+        if sem is None:
+            sem = asyncio.Semaphore(self.max_concurrency_per_node)
+            self._semaphores[url] = sem
+        return sem
+
+    async def _open(self, key):
+        scheme, host, port = key
+        pool = self._pools.get(key)
+        while pool:
+            reader, writer = pool.pop()
+            if reader.at_eof() or (reader.exception() is not None):
+                writer.close()
+                continue
+            return reader, writer, True
+        ssl_context = None
+        if scheme == "https":
+            ssl_context = self.ssl_context
+            if ssl_context is None:
+                ssl_context = ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context)
+        return reader, writer, False
+
+    def _release(self, key, reader, writer):
+        pool = self._pools.setdefault(key, collections.deque())
+        if len(pool) >= self.max_idle_connections:
+            writer.close()
+            return
+        pool.append((reader, writer))
+        return
+
+    async def _read_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Remote end closed connection without response")
+        version, status, reason = (status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""])[:3]
+        status = int(status)
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0], 16)
+                if size == 0:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            # Skip trailers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            headers["connection"] = "close"
+        return status, reason, headers, body
+
+    async def _post(self, url, req_bytes):
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise urllib.error.URLError("Unsupported URL scheme {!r}".format(parts.scheme))
+        port = parts.port
+        if port is None:
+            port = 443 if parts.scheme == "https" else 80
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        head = ("POST {} HTTP/1.1\r\n"
+            "Host: {}\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: {}\r\n"
+            "Connection: keep-alive\r\n"
+            "{}"
+            "\r\n").format(path, parts.netloc, len(req_bytes),
+                "Accept-Encoding: gzip, deflate\r\n" if self.accept_encoding else "",
+                ).encode("latin-1")
+
+        reader, writer, reused = await self._open(key)
+        try:
+            try:
+                writer.write(head + req_bytes)
+                await writer.drain()
+                status, reason, headers, body = await self._read_response(reader)
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                # Idle keep-alive connection was closed by the server
+                writer.close()
+                reader, writer, reused = await self._open(key)
+                writer.write(head + req_bytes)
+                await writer.drain()
+                status, reason, headers, body = await self._read_response(reader)
+        except BaseException:
+            # Includes cancellation by wait_for() on timeout
+            writer.close()
+            raise
+
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self._release(key, reader, writer)
+        if not (200 <= status < 300):
+            raise urllib.error.HTTPError(url, status, reason, headers, io.BytesIO(body))
+        return self._decode_body(io.BytesIO(body).read, headers.get("content-encoding"))
+
+    async def _request(self, make_request, node=None, info=None, prefer_node=None):
+        if len(self.nodes) == 0:
+            raise SteemIllegalArgument("Must specify at least one node")
+
+        timeout = self.min_timeout
+        retry_count = 0
+        tried = set()
+        while True:
+            if info is None:
+                req_bytes = make_request()
+            else:
+                start_time = time.monotonic()
+                req_bytes = make_request()
+                self._add_phase(info, "encode", time.monotonic() - start_time)
+            logging.info("req: %s", req_bytes)
+
+            url = self._select_node(node, tried, prefer_node)
+            exc = None
+            resp_bytes = None
+
+            queue_start = time.monotonic()
+            start_time = queue_start
+            try:
+                async with self._semaphore(url):
+                    start_time = time.monotonic()
+                    resp_bytes = await asyncio.wait_for(self._post(url, req_bytes), timeout)
+            except urllib.error.URLError as e:
+                exc = e
+            except asyncio.TimeoutError as e:
+                exc = e
+            except (OSError, asyncio.IncompleteReadError, ValueError, zlib.error) as e:
+                exc = e
+            latency = time.monotonic() - start_time
+
+            if info is not None:
+                phases = {"queue": start_time - queue_start}
+                phases["failed" if exc is not None else "wait"] = latency
+                self._record_attempt(info, url, req_bytes, resp_bytes, latency, exc, phases)
+
+            if exc is not None:
+                self.node_selector.record_failure(url, latency)
+                logging.error("caught exception in request", exc_info=exc)
+                retry_count += 1
+                if (self.max_retries == -1) or (retry_count <= self.max_retries):
+                    if self._retry_round_done(url, node, tried):
+                        start_time = time.monotonic()
+                        await self.sleep_function(timeout)
+                        if info is not None:
+                            self._add_phase(info, "retry_wait", time.monotonic() - start_time)
+                        timeout = min(timeout + self.timeout_backoff, self.max_timeout)
+                    continue
+                if isinstance(exc, urllib.error.HTTPError):
+                    raise SteemHTTPError(exc)
+                raise SteemNetworkError(exc)
+            self.node_selector.record_success(url, latency)
+            logging.info("resp: %s", resp_bytes)
+            return resp_bytes
+
+    async def rpc_call(self,
+        api="", method="",
+        method_args=None,
+        method_kwargs=None,
+        node=None,
+        prefer_node=None,
+        ):
+
+        args = self._check_args(method_args, method_kwargs)
+        encode = self._request_encoder(api, method, args)
+
+        def make_request():
+            return encode(self.next_id())
+
+        info = self._begin_call(api, method)
+        try:
+            result = self._call_result(await self._request(make_request, node=node, info=info,
+                prefer_node=prefer_node), info)
+        except SteemException as e:
+            self._end_call(info, e)
+            raise
+        self._end_call(info, None)
+        return result
+
+    async def rpc_batch(self, calls, max_batch_size=None):
+        """
+        Coroutine version of SteemRemoteBackend.rpc_batch().
+        """
+        prepared, chunks = self._prepare_batch(calls, max_batch_size)
+        results = [None] * len(prepared)
+        await asyncio.gather(*[self._rpc_batch_chunk(prepared, indices, results) for indices in chunks])
+        return results
+
+    async def _rpc_batch_chunk(self, prepared, indices, results):
+        pending = list(indices)
+        id_to_index = {}
+        retry_count = 0
+        while True:
+            info = self._begin_call("jsonrpc", "batch")
+            try:
+                resp_bytes = await self._request(
+                    lambda: self._encode_batch(prepared, pending, id_to_index), info=info)
+                start_time = time.monotonic()
+                resp = self._decode_response(resp_bytes)
+                if info is not None:
+                    self._add_phase(info, "decode", time.monotonic() - start_time)
+                pending = self._collect_batch(resp, id_to_index, results)
+            except SteemException as e:
+                self._end_call(info, e)
+                raise
+            self._end_call(info, None)
+            if len(pending) == 0:
+                return
+            logging.error("batch response missing %d of %d entries", len(pending), len(indices))
+            retry_count += 1
+            if (self.max_retries != -1) and (retry_count > self.max_retries):
+                raise SteemNetworkError("Batch response missing {} entries".format(len(pending)))
+            await self.sleep_function(self.min_timeout)
+
+    def close(self):
+        """
+        Close all idle keep-alive connections.
+        """
+        pools = self._pools
+        self._pools = {}
+        for pool in pools.values():
+            for reader, writer in pool:
+                writer.close()
+        return
+
+class AsyncSteemInterface(SteemInterface):
+    """
+    SteemInterface for an AsyncSteemRemoteBackend.  Calls return
+    awaitables:
+
+        steem = AsyncSteemInterface(AsyncSteemRemoteBackend(nodes=[...], appbase=True))
+        dgpo = await steem.database_api.get_dynamic_global_properties()
+    """
+    def batch(self, max_batch_size=None):
+        """
+        Return an AsyncSteemBatch to be used with async with.
+        """
+        return AsyncSteemBatch(backend=self.backend, max_batch_size=max_batch_size)
+
+    async def map(self, method, iterable, workers=8):
+        """
+        Call method once per item of iterable, with at most workers calls
+        in flight, spreading the calls across all of the backend's healthy
+        nodes.  Returns the results in input order.  A call which fails
+        gives its SteemException instance in place of the result.
+
+            blocks = await steem.map(steem.block_api.get_block,
+                ({"block_num": n} for n in range(1, 1001)), workers=16)
+
+        :param method:  A method of this interface such as steem.block_api.get_block,
+        or a string "block_api.get_block"
+        :param iterable:  Arguments for each call, a dict of keyword arguments
+        (appbase) or a list of positional arguments
+        :param workers:  Maximum number of calls in flight
+        """
+        api_name, method_name = self._map_method(method)
+        nodes = getattr(self.backend, "nodes", None)
+        items = enumerate(iterable)
+        results = {}
+
+        async def worker():
+            # The workers share one iterator, so items are only taken
+            # from iterable as calls complete.
+            for i, item in items:
+                try:
+                    results[i] = await self.backend.rpc_call(
+                        **self._map_call_kwargs(api_name, method_name, nodes, i, item))
+                except SteemException as e:
+                    results[i] = e
+            return
+
+        tasks = [asyncio.ensure_future(worker()) for i in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return [results[i] for i in range(len(results))]
+
+class AsyncSteemBatch(SteemBatch):
+    """
+    SteemBatch which is submitted on exit from an async with block.
+    """
+    async def execute(self):
+        if self.results is not None:
+            raise SteemIllegalArgument("Batch has already been executed")
+        results = await self.backend.rpc_batch(self.calls, max_batch_size=self.max_batch_size)
+        for pending, value in zip(self.pending, results):
+            pending.value = value
+            pending.done = True
+        self.results = results
+        return results
+
+    def __enter__(self):
+        raise SteemIllegalArgument("Use async with for AsyncSteemBatch")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.execute()
+        return False
@@ -0,0 +1,307 @@
+# Persistent local store of irreversible blocks
+
+import collections
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from simple_steem_client.client import SteemException
+from simple_steem_client.irreversible import IrreversibleBlockTracker
+
+# Data offset, data length, CRC32 of the offset and length
+_index_entry = struct.Struct("<QII")
+_index_fields = struct.Struct("<QI")
+
+_compact_encoder = json.JSONEncoder(ensure_ascii=True, separators=(",", ":"))
+
+class BlockStore(object):
+    """
+    Append-only on-disk store of blocks, keyed by block number.
+
+    A directory holds blocks.dat, the concatenated JSON of the blocks,
+    and blocks.idx, a fixed-width index whose entry for block n is at
+    offset 16 * n:  the block's data offset and length, and a CRC32 of
+    both so that a torn or missing entry reads as absent.  The index is
+    a sparse file, so starting at a high block number costs no disk
+    space for the blocks below it.
+
+    Both files are read through mmap, so a lookup of a stored block
+    makes no system call.  Any number of processes may read the store
+    while one writes it:  the writer appends a block's data before its
+    index entry, and an exclusive lock on blocks.lock keeps out other
+    writers.
+    """
+    def __init__(self, directory, writable=False, fsync=False, json_decoder=None):
+        """
+        :param directory:  Directory holding the store, created if writable and missing
+        :param writable:  If true, put() may be used and the writer lock is taken
+        :param fsync:  If true, put() syncs the data file to disk before writing the index entry
+        :param json_decoder:  Used by get_block(), defaults to decoding objects as OrderedDict
+        """
+        self.directory = directory
+        self.writable = writable
+        self.fsync = fsync
+        if json_decoder is None:
+            json_decoder = json.JSONDecoder(object_pairs_hook=collections.OrderedDict)
+        self.json_decoder = json_decoder
+
+        self.data_path = os.path.join(directory, "blocks.dat")
+        self.index_path = os.path.join(directory, "blocks.idx")
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._data_file = None
+        self._index_file = None
+        self._data_map = None
+        self._index_map = None
+        # Read-only handles of the mapped files, kept open to check
+        # their size cheaply
+        self._data_reader = None
+        self._index_reader = None
+
+        if writable:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._lock_file = open(os.path.join(directory, "blocks.lock"), "a+b")
+            if fcntl is not None:
+                try:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    self._lock_file.close()
+                    raise SteemException("Block store {} is already open for writing".format(directory))
+            self._data_file = open(self.data_path, "ab")
+            if not os.path.exists(self.index_path):
+                open(self.index_path, "wb").close()
+            self._index_file = open(self.index_path, "r+b")
+        self._remap_index()
+        self._remap_data()
+        return
+
+    def _grown_map(self, path, reader, current):
+        """
+        Return (reader, map) for path, with a new map only if the file
+        has grown beyond current.  Costs a single fstat when it has not.
+        """
+        if reader is None:
+            try:
+                reader = open(path, "rb")
+            except FileNotFoundError:
+                return None, current
+        size = os.fstat(reader.fileno()).st_size
+        if (size == 0) or ((current is not None) and (size <= len(current))):
+            return reader, current
+        return reader, mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Maps being replaced may still be in use by other threads, so they
+    # are left to the garbage collector rather than closed
+
+    def _remap_index(self):
+        with self._lock:
+            self._index_reader, self._index_map = self._grown_map(
+                self.index_path, self._index_reader, self._index_map)
+        return
+
+    def _remap_data(self):
+        with self._lock:
+            self._data_reader, self._data_map = self._grown_map(
+                self.data_path, self._data_reader, self._data_map)
+        return
+
+    def _entry(self, index_map, block_num):
+        pos = block_num * _index_entry.size
+        if (index_map is None) or (pos + _index_entry.size > len(index_map)):
+            return None
+        offset, length, crc = _index_entry.unpack_from(index_map, pos)
+        if (length == 0) or (zlib.crc32(index_map[pos:pos + _index_fields.size]) != crc):
+            return None
+        return offset, length
+
+    def get(self, block_num):
+        """
+        Return the JSON bytes of a stored block, or None.
+        """
+        if block_num < 0:
+            return None
+        index_map = self._index_map
+        entry = self._entry(index_map, block_num)
+        if entry is None:
+            # Writes within the mapped part of the index show through the
+            # shared map, so only an entry past its end needs a remap
+            if (index_map is not None) and ((block_num + 1) * _index_entry.size <= len(index_map)):
+                return None
+            self._remap_index()
+            entry = self._entry(self._index_map, block_num)
+            if entry is None:
+                return None
+        offset, length = entry
+        data_map = self._data_map
+        if (data_map is None) or (offset + length > len(data_map)):
+            self._remap_data()
+            data_map = self._data_map
+        return data_map[offset:offset + length]
+
+    def get_block(self, block_num):
+        """
+        Return a stored block decoded with json_decoder, or None.
+        """
+        data = self.get(block_num)
+        if data is None:
+            return None
+        return self.json_decoder.decode(data.decode("utf-8"))
+
+    def __contains__(self, block_num):
+        return self.get(block_num) is not None
+
+    def put(self, block_num, block):
+        """
+        Store a block, given as a decoded block or as JSON bytes.  Blocks
+        already stored are not written again.
+        """
+        if not self.writable:
+            raise SteemException("Block store {} is not writable".format(self.directory))
+        if not isinstance(block, bytes):
+            block = _compact_encoder.encode(block).encode("ascii")
+        with self._lock:
+            # Check under the lock, against a map covering the entry, so
+            # that concurrent puts of one block write it only once
+            index_map = self._index_map
+            if (index_map is None) or ((block_num + 1) * _index_entry.size > len(index_map)):
+                self._index_reader, self._index_map = self._grown_map(
+                    self.index_path, self._index_reader, self._index_map)
+            if self._entry(self._index_map, block_num) is not None:
+                return
+            offset = self._data_file.seek(0, os.SEEK_END)
+            self._data_file.write(block)
+            self._data_file.flush()
+            if self.fsync:
+                os.fsync(self._data_file.fileno())
+            fields = _index_fields.pack(offset, len(block))
+            self._index_file.seek(block_num * _index_entry.size)
+            self._index_file.write(fields + struct.pack("<I", zlib.crc32(fields)))
+            self._index_file.flush()
+        return
+
+    def close(self):
+        for f in (self._data_file, self._index_file, self._lock_file, self._data_reader, self._index_reader):
+            if f is not None:
+                f.close()
+        self._data_file = self._index_file = self._lock_file = None
+        self._data_reader = self._index_reader = None
+        self._index_map = self._data_map = None
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+class BlockStoreBackend(object):
+    """
+    Wrap a backend so that block fetches are served from a BlockStore
+    when possible, and fetched blocks at or below the last irreversible
+    block are added to it.
+
+        store = BlockStore("/var/lib/myapp/blocks", writable=True)
+        steem = SteemInterface(BlockStoreBackend(SteemRemoteBackend(nodes=[...], appbase=True), store))
+
+    Covers block_api.get_block, block_api.get_block_range and
+    condenser_api.get_block.  Other calls go to the wrapped backend.  The
+    wrapped backend must decode results, i.e. not use DECODE_RAW.
+
+    Like CachingBackend, the last irreversible block is learned from
+    get_dynamic_global_properties results passing through, or fetched
+    when it is older than lib_max_age seconds and a block above it is
+    about to be stored.  Without a writable store, the store is only
+    read.
+    """
+    def __init__(self, backend, store, lib_max_age=3.0, clock=None):
+        """
+        :param backend:  Backend to wrap
+        :param store:  BlockStore
+        :param lib_max_age:  Maximum age in seconds of the last irreversible block number
+        before it is refreshed
+        :param clock:  time.monotonic() or similar
+        """
+        self.backend = backend
+        self.store = store
+        self.irreversible = IrreversibleBlockTracker(backend, max_age=lib_max_age, clock=clock)
+        self.hits = 0
+        self.misses = 0
+        return
+
+    def __getattr__(self, item):
+        return getattr(self.backend, item)
+
+    def last_irreversible_block_num(self, needed=None):
+        return self.irreversible.get(needed)
+
+    def _store(self, block_num, block):
+        if (not self.store.writable) or (not block):
+            return
+        if block_num <= self.last_irreversible_block_num(block_num):
+            self.store.put(block_num, block)
+        return
+
+    def rpc_call(self,
+        api="", method="",
+        method_args=None,
+        method_kwargs=None,
+        **kwargs
+        ):
+        call = api + "." + method
+        block_num = None
+        block_range = None
+        try:
+            if call == "block_api.get_block":
+                block_num = method_kwargs["block_num"]
+            elif call == "condenser_api.get_block":
+                block_num = method_args[0]
+            elif call == "block_api.get_block_range":
+                block_range = (method_kwargs["starting_block_num"], method_kwargs["count"])
+        except (KeyError, IndexError, TypeError):
+            # Malformed arguments are left for the node to reject
+            pass
+
+        if block_range is not None:
+            return self._get_block_range(block_range[0], block_range[1], method_kwargs, kwargs)
+
+        if block_num is not None:
+            block = self.store.get_block(block_num)
+            if block is not None:
+                self.hits += 1
+                return block if api == "condenser_api" else {"block": block}
+            self.misses += 1
+
+        result = self.backend.rpc_call(api=api, method=method,
+            method_args=method_args, method_kwargs=method_kwargs, **kwargs)
+        self.irreversible.observe(method, result)
+        if block_num is not None:
+            self._store(block_num, result if api == "condenser_api" else result.get("block"))
+        return result
+
+    def _get_block_range(self, start, count, method_kwargs, kwargs):
+        blocks = []
+        for block_num in range(start, start + count):
+            block = self.store.get_block(block_num)
+            if block is None:
+                break
+            blocks.append(block)
+        if len(blocks) == count:
+            self.hits += count
+            return {"blocks": blocks}
+
+        self.misses += 1
+        result = self.backend.rpc_call(api="block_api", method="get_block_range",
+            method_kwargs=method_kwargs, **kwargs)
+        for i, block in enumerate(result.get("blocks", [])):
+            self._store(start + i, block)
+        return result
@@ -0,0 +1,233 @@
+# Response cache wrapping a Steem backend
+
+import collections
+import json
+import threading
+import time
+
+from simple_steem_client.client import request_key
+from simple_steem_client.irreversible import IrreversibleBlockTracker
+
+FOREVER = float("inf")
+
+class CachePolicy(object):
+    """
+    Decide how long a result may be cached.  ttl() returns a number of
+    seconds, FOREVER, or None if the result must not be cached.
+    """
+    def ttl(self, cache, api, method, args, result):
+        return None
+
+class NeverCache(CachePolicy):
+    pass
+
+class TTL(CachePolicy):
+    """
+    Cache results for a fixed number of seconds.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        return
+
+    def ttl(self, cache, api, method, args, result):
+        return self.seconds
+
+class Immutable(CachePolicy):
+    """
+    Cache results forever, e.g. for get_config.
+    """
+    def ttl(self, cache, api, method, args, result):
+        return FOREVER
+
+class IrreversibleBlock(CachePolicy):
+    """
+    Cache results forever once the highest block they depend on is at or
+    below the last irreversible block, and not at all before that.
+
+    :param get_block_num:  Function mapping the call's arguments to that
+    highest block number
+    """
+    def __init__(self, get_block_num):
+        self.get_block_num = get_block_num
+        return
+
+    def ttl(self, cache, api, method, args, result):
+        if not result:
+            # Empty result, e.g. a block which does not exist yet
+            return None
+        try:
+            block_num = self.get_block_num(args)
+        except (KeyError, IndexError, TypeError):
+            return None
+        if block_num <= cache.last_irreversible_block_num(block_num):
+            return FOREVER
+        return None
+
+def _json_size(result):
+    if isinstance(result, (bytes, memoryview)):
+        # Raw result of a DECODE_RAW backend
+        return len(result)
+    return len(json.dumps(result, separators=(",", ":")))
+
+DEFAULT_POLICIES = {
+    "block_api.get_block": IrreversibleBlock(lambda args: args["block_num"]),
+    "block_api.get_block_header": IrreversibleBlock(lambda args: args["block_num"]),
+    "block_api.get_block_range": IrreversibleBlock(
+        lambda args: args["starting_block_num"] + args["count"] - 1),
+    "account_history_api.get_ops_in_block": IrreversibleBlock(lambda args: args["block_num"]),
+    "database_api.get_config": Immutable(),
+    "condenser_api.get_block": IrreversibleBlock(lambda args: args[0]),
+    "condenser_api.get_block_header": IrreversibleBlock(lambda args: args[0]),
+    "condenser_api.get_ops_in_block": IrreversibleBlock(lambda args: args[0]),
+    "condenser_api.get_config": Immutable(),
+    }
+
+class CachingBackend(object):
+    """
+    Wrap a backend with an LRU cache of RPC results.
+
+        backend = CachingBackend(SteemRemoteBackend(nodes=[...], appbase=True))
+        steem = SteemInterface(backend)
+
+    Each "api.method" is looked up in policies to decide whether and how
+    long its results are cached; methods without a policy are never
+    cached.  The cache is bounded both by number of entries and by the
+    approximate size of the cached results.
+
+    The last irreversible block is learned from
+    get_dynamic_global_properties results passing through the cache, or
+    fetched when it is older than lib_max_age seconds and a block-based
+    policy needs it.
+
+    Cached results are shared between callers and must not be modified.
+    Over a DECODE_RAW backend, results are cached as a copy of their
+    bytes, so that a cached result does not keep the whole response
+    buffer alive, and returned as read-only memoryviews of the copy.
+    """
+    def __init__(self,
+        backend,
+        policies=None,
+        max_entries=10000,
+        max_bytes=256*1024*1024,
+        lib_max_age=3.0,
+        sizer=None,
+        clock=None,
+        ):
+        """
+        :param backend:  Backend to wrap
+        :param policies:  Dict mapping "api.method" to CachePolicy, DEFAULT_POLICIES if None
+        :param max_entries:  Maximum number of cached results
+        :param max_bytes:  Maximum total size of cached results as reported by sizer
+        :param lib_max_age:  Maximum age in seconds of the last irreversible block number
+        before it is refreshed, None to never fetch it
+        :param sizer:  Function returning the size of a result, defaults to its compact JSON length
+        :param clock:  time.monotonic() or similar
+        """
+        self.backend = backend
+        if policies is None:
+            policies = DEFAULT_POLICIES
+        self.policies = dict(policies)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        if sizer is None:
+            sizer = _json_size
+        self.sizer = sizer
+        if clock is None:
+            clock = time.monotonic
+        self.clock = clock
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+        self.irreversible = IrreversibleBlockTracker(backend, max_age=lib_max_age, clock=clock)
+        # key -> (result, expires, size), in LRU order
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        return
+
+    def __getattr__(self, item):
+        return getattr(self.backend, item)
+
+    def set_last_irreversible_block_num(self, lib):
+        self.irreversible.set(lib)
+        return
+
+    def last_irreversible_block_num(self, needed=None):
+        """
+        Return the last irreversible block number known to the cache,
+        refreshing it from the backend if it is stale and below needed.
+        """
+        return self.irreversible.get(needed)
+
+    def rpc_call(self,
+        api="", method="",
+        method_args=None,
+        method_kwargs=None,
+        **kwargs
+        ):
+        policy = self.policies.get(api + "." + method)
+        if policy is None:
+            result = self.backend.rpc_call(api=api, method=method,
+                method_args=method_args, method_kwargs=method_kwargs, **kwargs)
+            self.irreversible.observe(method, result)
+            return result
+
+        key = request_key(api, method, method_args, method_kwargs)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires, size = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+                self.bytes -= size
+            self.misses += 1
+
+        result = self.backend.rpc_call(api=api, method=method,
+            method_args=method_args, method_kwargs=method_kwargs, **kwargs)
+        self.irreversible.observe(method, result)
+
+        args = method_kwargs if method_kwargs is not None else method_args
+        ttl = policy.ttl(self, api, method, args, result)
+        if ttl is not None:
+            if isinstance(result, memoryview):
+                result = memoryview(bytes(result))
+            self._store(key, result, now + ttl)
+        return result
+
+    def _store(self, key, result, expires):
+        size = self.sizer(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[key] = (result, expires, size)
+            self.bytes += size
+            while (len(self._entries) > self.max_entries) or (self.bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+        return
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                }
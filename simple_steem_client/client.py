@@ -2,13 +2,21 @@
 # Simple Steem client using urllib
 
 import collections
+import concurrent.futures
+import http.client
+import importlib
 import json
 import logging
+import re
 import time
 import socket
 import sys
+import threading
 import urllib.error
 import urllib.request
+import zlib
+
+from simple_steem_client.node_selector import LeastLatencySelector
 
 class SteemException(Exception):
     pass
@@ -28,6 +36,181 @@ class SteemIllegalArgument(SteemException):
     # Buggy code in the caller is incorrectly using the provided API
     pass
 
+DECODE_ORDERED = "ordered"
+DECODE_DICT = "dict"
+DECODE_RAW = "raw"
+
+def fast_json_loads(libraries=("orjson", "ujson")):
+    """
+    Return the loads() function of the first installed JSON library in
+    libraries, or None if none is installed, in which case the backend
+    falls back to the standard library json module:
+
+        backend = SteemRemoteBackend(nodes=[...], json_loads=fast_json_loads())
+    """
+    for name in libraries:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        return module.loads
+    return None
+
+# Byte-level JSON scanning used by the raw decode mode to find the span
+# of the result without decoding it.
+_json_string = br'"[^"\\]*(?:\\.[^"\\]*)*"'
+_re_ws = re.compile(br'[ \t\r\n]*')
+_re_string = re.compile(_json_string, re.DOTALL)
+_re_container_token = re.compile(_json_string + br'|[\[\]{}]', re.DOTALL)
+_re_scalar = re.compile(br'[^,}\] \t\r\n]+')
+# Members with string or scalar values closing the top-level object
+_re_trailing_members = re.compile(
+    br'(?:[ \t\r\n]*,[ \t\r\n]*' + _json_string + br'[ \t\r\n]*:[ \t\r\n]*(?:' +
+    _json_string + br'|[^,{}\[\]" \t\r\n]+))*[ \t\r\n]*}[ \t\r\n]*\Z', re.DOTALL)
+
+def _skip_json_value(buf, pos):
+    """
+    Return the end offset of the JSON value starting at buf[pos].
+    """
+    c = buf[pos:pos+1]
+    if c == b'"':
+        m = _re_string.match(buf, pos)
+    elif c in (b"[", b"{"):
+        depth = 0
+        for m in _re_container_token.finditer(buf, pos):
+            t = buf[m.start():m.start()+1]
+            if t in (b"[", b"{"):
+                depth += 1
+            elif t in (b"]", b"}"):
+                depth -= 1
+                if depth == 0:
+                    return m.end()
+        m = None
+    else:
+        m = _re_scalar.match(buf, pos)
+    if m is None:
+        raise ValueError("Malformed JSON at offset {}".format(pos))
+    return m.end()
+
+_non_structural_bytes = bytes(c for c in range(256) if c not in b'[]{}"')
+
+def _is_single_container(region):
+    """
+    Return True if region holds exactly one JSON array or object.  Uses
+    only bytes methods, so it runs at C speed even on large regions.
+    """
+    if (b"\\" in region):
+        region = region.replace(b"\\\\", b"").replace(b'\\"', b"")
+    # With escapes gone, quotes alternate between opening and closing a
+    # string, so every other piece between quotes is string content.
+    outside = b"".join(region.translate(None, _non_structural_bytes).split(b'"')[::2])
+    if (len(outside) < 2) or ((outside[:1] + outside[-1:]) not in (b"{}", b"[]")):
+        return False
+    inner = outside[1:-1]
+    while inner:
+        reduced = inner.replace(b"{}", b"").replace(b"[]", b"")
+        if len(reduced) == len(inner):
+            return False
+        inner = reduced
+    return True
+
+def _skip_container_from_end(buf, start):
+    """
+    Return the end offset of the container starting at buf[start] if it
+    is followed only by members with string or scalar values, as in a
+    JSON-RPC envelope.  The end is found by searching backwards from the
+    end of buf, which is much faster than tokenizing a large value in
+    Python.  Returns None if the shape does not match.
+    """
+    close = b"}" if buf[start:start+1] == b"{" else b"]"
+    end = len(buf)
+    while True:
+        p = buf.rfind(close, start, end)
+        if p < 0:
+            return None
+        if _re_trailing_members.match(buf, p + 1):
+            if _is_single_container(buf[start:p+1]):
+                return p + 1
+            return None
+        end = p
+
+def _json_members(buf, fast_key=None):
+    """
+    Yield (key, start, end) for each member of the top-level JSON object
+    in buf.  If fast_key is given and its value is a container followed
+    only by scalar members, its end is found by scanning from the end of
+    buf and the remaining members are not yielded.
+    """
+    pos = _re_ws.match(buf, 0).end()
+    if buf[pos:pos+1] != b"{":
+        raise ValueError("Expected JSON object")
+    pos = _re_ws.match(buf, pos + 1).end()
+    if buf[pos:pos+1] == b"}":
+        return
+    while True:
+        m = _re_string.match(buf, pos)
+        if m is None:
+            raise ValueError("Malformed JSON at offset {}".format(pos))
+        key = json.loads(buf[m.start():m.end()].decode("utf-8"))
+        pos = _re_ws.match(buf, m.end()).end()
+        if buf[pos:pos+1] != b":":
+            raise ValueError("Malformed JSON at offset {}".format(pos))
+        start = _re_ws.match(buf, pos + 1).end()
+        if (key == fast_key) and (buf[start:start+1] in (b"{", b"[")):
+            end = _skip_container_from_end(buf, start)
+            if (end is not None) and (buf.find(b'"error"', end) < 0):
+                yield key, start, end
+                return
+        end = _skip_json_value(buf, start)
+        yield key, start, end
+        pos = _re_ws.match(buf, end).end()
+        c = buf[pos:pos+1]
+        if c == b"}":
+            return
+        if c != b",":
+            raise ValueError("Malformed JSON at offset {}".format(pos))
+        pos = _re_ws.match(buf, pos + 1).end()
+
+def raw_json_members(buf):
+    """
+    Return a dict mapping each key of the top-level JSON object in buf
+    to the (start, end) offsets of its undecoded value.
+    """
+    return dict((key, (start, end)) for key, start, end in _json_members(buf))
+
+def raw_json_result(buf):
+    """
+    Return the (start, end) offsets of the undecoded "result" member of
+    a JSON-RPC response, or None if the response has no result or is an
+    error.
+    """
+    members = {}
+    for key, start, end in _json_members(buf, fast_key="result"):
+        members[key] = (start, end)
+    if "error" in members:
+        return None
+    return members.get("result")
+
+_request_key_encoder = json.JSONEncoder(
+    ensure_ascii=True,
+    sort_keys=True,
+    separators=(",", ":"),
+    )
+
+def request_key(api, method, method_args=None, method_kwargs=None):
+    """
+    Return a canonical string identifying a call, suitable as a dict key.
+    Calls which differ only in argument ordering of keyword arguments, or
+    in passing no arguments versus empty arguments, get the same key.
+    """
+    if method_kwargs:
+        args = method_kwargs
+    elif method_args:
+        args = list(method_args)
+    else:
+        args = None
+    return _request_key_encoder.encode([api, method, args])
+
 class SteemRemoteBackend(object):
     """
     Implement the rpc_call() method which actually submits
@@ -48,6 +231,18 @@ class SteemRemoteBackend(object):
        appbase=False,
        json_encoder=None,
        json_decoder=None,
+       max_batch_size=50,
+       node_selector=None,
+       hedge_policy=None,
+       accept_encoding=False,
+       read_chunk_size=65536,
+       decode_mode=DECODE_ORDERED,
+       json_loads=None,
+       pre_call_hooks=None,
+       post_call_hooks=None,
+       metrics=None,
+       tracer=None,
+       limiter=None,
        ):
         """
         :param nodes:  List of Steem nodes to connect to
@@ -64,7 +259,24 @@ class SteemRemoteBackend(object):
         :param sleep_function:  time.sleep() or similar
         :param appbase:  If true, require keyword arguments.  If false, require positional arguments.
         :param json_encoder:  Used to encode JSON for requests.  If not supplied, uses json.JSONEncoder
+        and splices request ids into pre-encoded envelopes rather than encoding each request in full
         :param json_decoder:  Used to decode JSON from responses.  If not supplied, uses json.JSONDecoder
+        :param max_batch_size:  Maximum number of calls sent in one HTTP request by rpc_batch()
+        :param node_selector:  NodeSelector choosing which node serves each request, a
+        LeastLatencySelector if not supplied
+        :param hedge_policy:  HedgePolicy enabling hedged rpc_call() requests, None disables hedging
+        :param accept_encoding:  If true, ask nodes for gzip or deflate compressed responses
+        :param read_chunk_size:  Size of reads when decompressing a response
+        :param decode_mode:  How rpc_call() decodes results:  DECODE_ORDERED (OrderedDict objects),
+        DECODE_DICT (plain dicts, faster and smaller), or DECODE_RAW (a memoryview of the
+        undecoded JSON of the result)
+        :param json_loads:  Function decoding a whole response from bytes, used instead of
+        json_decoder if supplied, e.g. fast_json_loads()
+        :param pre_call_hooks:  Functions called with the call info dict before each call
+        :param post_call_hooks:  Functions called with the call info dict after each call
+        :param metrics:  MetricsRegistry recording every call, added to post_call_hooks
+        :param tracer:  PhaseTracer aggregating per-phase timings, added to post_call_hooks
+        :param limiter:  NodeLimiter pacing the requests sent to each node, or None
         """
         self.nodes = list(nodes)
         self.current_node = 0
@@ -82,12 +294,16 @@ class SteemRemoteBackend(object):
 
         self.req_id = req_id
         self.req_id_increment = req_id_increment
+        self._req_id_lock = threading.Lock()
         if sleep_function is None:
             sleep_function = time.sleep
         self.sleep_function = sleep_function
 
         self.appbase = appbase
 
+        # The default encoder's output is known exactly, so requests can
+        # be assembled from pre-encoded pieces
+        self.use_templates = json_encoder is None
         if json_encoder is None:
             json_encoder = json.JSONEncoder(
                 ensure_ascii=True,
@@ -95,24 +311,57 @@ class SteemRemoteBackend(object):
                 separators=(",", ":"),
                 )
         self.json_encoder = json_encoder
+        # (api, method) -> encoded envelope up to the method's args
+        self._envelope_prefixes = {}
+        if decode_mode not in (DECODE_ORDERED, DECODE_DICT, DECODE_RAW):
+            raise SteemIllegalArgument("Unknown decode_mode {!r}".format(decode_mode))
+        self.decode_mode = decode_mode
         if json_decoder is None:
-            json_decoder = json.JSONDecoder(
-                object_pairs_hook=collections.OrderedDict,
-                )
+            if decode_mode == DECODE_ORDERED:
+                json_decoder = json.JSONDecoder(
+                    object_pairs_hook=collections.OrderedDict,
+                    )
+            else:
+                json_decoder = json.JSONDecoder()
         self.json_decoder = json_decoder
+        self.json_loads = json_loads
+
+        self.pre_call_hooks = list(pre_call_hooks or [])
+        self.post_call_hooks = list(post_call_hooks or [])
+        self.metrics = metrics
+        if metrics is not None:
+            self.post_call_hooks.append(metrics)
+        self.tracer = tracer
+        if tracer is not None:
+            self.post_call_hooks.append(tracer)
+        self._local = threading.local()
+        self.limiter = limiter
+        self.max_batch_size = max_batch_size
+        if node_selector is None:
+            node_selector = LeastLatencySelector()
+        self.node_selector = node_selector
+        self.hedge_policy = hedge_policy
+        self._hedge_executor = None
+        self._hedge_executor_lock = threading.Lock()
+
+        self.accept_encoding = accept_encoding
+        self.read_chunk_size = read_chunk_size
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self._transfer_lock = threading.Lock()
         return
 
     def next_id(self):
-        result = self.req_id
-        self.req_id = result + self.req_id_increment
+        with self._req_id_lock:
+            result = self.req_id
+            self.req_id = result + self.req_id_increment
         return result
 
-    def rpc_call(self,
-        api="", method="",
-        method_args=None,
-        method_kwargs=None,
-        ):
-
+    def _check_args(self, method_args, method_kwargs):
+        """
+        Validate arguments against the appbase setting and return the
+        value to send as the third element of params.
+        """
         if (method_args is not None) and (method_kwargs is not None):
             raise SteemIllegalArgument("Attempt to mix positional and keyword arguments")
         if self.appbase and (method_args is not None):
@@ -120,64 +369,606 @@ class SteemRemoteBackend(object):
         if (not self.appbase) and (method_kwargs is not None):
             raise SteemIllegalArgument("Pre-appbase cannot specify kwargs")
 
-        if len(self.nodes) == 0:
-            raise SteemIllegalArgument("Must specify at least one node")
-
         if self.appbase:
             if method_kwargs is None:
-                args = dict()
+                return dict()
+            return method_kwargs
+        if method_args is None:
+            return []
+        return method_args
+
+    def _encode_request(self, api, method, args, req_id):
+        d = collections.OrderedDict((
+            ("jsonrpc", "2.0"),
+            ("id", req_id),
+            ("method", "call"),
+            ("params", [api, method, args]),
+            ))
+        return self.json_encoder.encode(d)
+
+    def _request_encoder(self, api, method, args):
+        """
+        Return a function mapping a request id to the encoded request
+        for api.method(args), as bytes.
+
+        With the default json_encoder, the envelope around the id is
+        encoded once per call (and its api and method part once per
+        backend), so each attempt only formats the id.  The bytes are
+        identical to those produced by _encode_request().
+        """
+        if not self.use_templates:
+            return lambda req_id: self._encode_request(api, method, args, req_id).encode("ascii")
+
+        prefix = self._envelope_prefixes.get((api, method))
+        if prefix is None:
+            # sort_keys puts id first:
+            # {"id":N,"jsonrpc":"2.0","method":"call","params":["api","method",ARGS]}
+            prefix = (',"jsonrpc":"2.0","method":"call","params":'
+                + self.json_encoder.encode([api, method])[:-1] + ",").encode("ascii")
+            if len(self._envelope_prefixes) < 4096:
+                self._envelope_prefixes[(api, method)] = prefix
+        suffix = prefix + self.json_encoder.encode(args).encode("ascii") + b"]}"
+
+        def encode(req_id):
+            if type(req_id) is not int:
+                return self._encode_request(api, method, args, req_id).encode("ascii")
+            return b'{"id":' + str(req_id).encode("ascii") + suffix
+        return encode
+
+    def _decode_response(self, resp_bytes):
+        if self.json_loads is not None:
+            return self.json_loads(resp_bytes)
+        resp_json = resp_bytes.decode("utf-8")
+        return self.json_decoder.decode(resp_json)
+
+    def _call_result(self, resp_bytes, info=None):
+        """
+        Return the result of a single call response according to
+        decode_mode, raising SteemRPCException for an error response.
+        """
+        if info is not None:
+            start_time = time.monotonic()
+            try:
+                return self._call_result(resp_bytes)
+            finally:
+                self._add_phase(info, "decode", time.monotonic() - start_time)
+
+        if self.decode_mode == DECODE_RAW:
+            try:
+                span = raw_json_result(resp_bytes)
+            except ValueError:
+                span = None
+            if span is None:
+                raise SteemRPCException(self._decode_response(resp_bytes))
+            start, end = span
+            return memoryview(resp_bytes)[start:end]
+
+        resp = self._decode_response(resp_bytes)
+        if "error" in resp:
+            raise SteemRPCException(resp)
+        return resp["result"]
+
+    def node_stats(self):
+        """
+        Return per-node latency, error and circuit breaker statistics.
+        """
+        return self.node_selector.stats()
+
+    def _select_node(self, node, tried, prefer_node=None):
+        if node is not None:
+            return node
+        exclude = tried
+        if self.limiter is not None:
+            # Skip paused and saturated nodes, unless every node which
+            # has not failed yet is one of them.
+            unavailable = self.limiter.unavailable(self.nodes)
+            if not set(self.nodes) <= (tried | unavailable):
+                exclude = tried | unavailable
+        url = self.node_selector.select(self.nodes, exclude=exclude, prefer=prefer_node)
+        self.current_node = self.nodes.index(url)
+        return url
+
+    def _retry_round_done(self, url, node, tried):
+        """
+        Record that url failed the current request.  Returns True if every
+        eligible node has now failed, i.e. it is time to back off.
+        """
+        tried.add(url)
+        if (node is not None) or (len(tried) >= len(set(self.nodes))):
+            tried.clear()
+            return True
+        return False
+
+    def transfer_stats(self):
+        """
+        Return the number of response bytes received over the wire and
+        the number of bytes after decompression.
+        """
+        with self._transfer_lock:
+            return {
+                "bytes_received": self.bytes_received,
+                "bytes_decoded": self.bytes_decoded,
+                }
+
+    def _count_transfer(self, received, decoded):
+        with self._transfer_lock:
+            self.bytes_received += received
+            self.bytes_decoded += decoded
+        return
+
+    def _read_body(self, f):
+        """
+        Read a response body, decompressing it chunk by chunk if the node
+        sent it with a gzip or deflate Content-Encoding.
+        """
+        encoding = None
+        if self.accept_encoding:
+            headers = getattr(f, "headers", None)
+            if headers is not None:
+                encoding = headers.get("Content-Encoding")
+        return self._decode_body(f.read, encoding)
+
+    def _decode_body(self, read, encoding):
+        if encoding is not None:
+            encoding = encoding.strip().lower()
+        if encoding not in ("gzip", "deflate"):
+            resp_bytes = read()
+            self._count_transfer(len(resp_bytes), len(resp_bytes))
+            return resp_bytes
+
+        if encoding == "gzip":
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS)
+        chunks = []
+        received = 0
+        while True:
+            chunk = read(self.read_chunk_size)
+            if not chunk:
+                break
+            if (received == 0) and (encoding == "deflate"):
+                try:
+                    chunks.append(decompressor.decompress(chunk))
+                except zlib.error:
+                    # Some servers send raw deflate without the zlib header
+                    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                    chunks.append(decompressor.decompress(chunk))
             else:
-                args = method_kwargs
+                chunks.append(decompressor.decompress(chunk))
+            received += len(chunk)
+        chunks.append(decompressor.flush())
+        resp_bytes = b"".join(chunks)
+        self._count_transfer(received, len(resp_bytes))
+        return resp_bytes
+
+    def _begin_call(self, api, method):
+        """
+        Return the call info dict passed to the instrumentation hooks, or
+        None if there are no hooks.  The dict has keys api, method,
+        start_time, phases (a dict of seconds spent in each phase, see
+        tracing.PHASES) and attempts (a list with one dict per HTTP request
+        having keys node, request_bytes, response_bytes, latency,
+        error_kind, phases).  After the call, node (the node of the last
+        attempt), latency, error and error_kind are added.
+        """
+        if not (self.pre_call_hooks or self.post_call_hooks):
+            return None
+        info = {
+            "api": api,
+            "method": method,
+            "start_time": time.monotonic(),
+            "phases": {},
+            "attempts": [],
+            }
+        for hook in self.pre_call_hooks:
+            self._run_hook(hook, info)
+        return info
+
+    def _end_call(self, info, exc):
+        if info is None:
+            return
+        attempts = info["attempts"]
+        info["node"] = attempts[-1]["node"] if attempts else None
+        for attempt in attempts:
+            if attempt["error_kind"] is None:
+                info["node"] = attempt["node"]
+        info["latency"] = time.monotonic() - info["start_time"]
+        for attempt in attempts:
+            for phase, seconds in attempt["phases"].items():
+                self._add_phase(info, phase, seconds)
+        info["error"] = exc
+        if exc is None:
+            info["error_kind"] = None
+        elif isinstance(exc, SteemRPCException):
+            info["error_kind"] = "rpc_error"
+        elif isinstance(exc, SteemHTTPError):
+            info["error_kind"] = "http_error"
         else:
-            if method_args is None:
-                args = []
+            info["error_kind"] = "network_error"
+        if exc is not None:
+            exc.timing = info
+        self._local.last_timing = info
+        for hook in self.post_call_hooks:
+            self._run_hook(hook, info)
+        return
+
+    def last_timing(self):
+        """
+        Return the call info dict of the last call made by this thread,
+        or None.  Only recorded when the backend has hooks, e.g. a tracer.
+        """
+        return getattr(self._local, "last_timing", None)
+
+    @staticmethod
+    def _add_phase(info, phase, seconds):
+        phases = info["phases"]
+        phases[phase] = phases.get(phase, 0.0) + seconds
+        return
+
+    def _run_hook(self, hook, info):
+        try:
+            hook(info)
+        except Exception:
+            logging.exception("instrumentation hook failed")
+        return
+
+    @staticmethod
+    def _error_kind(exc):
+        if exc is None:
+            return None
+        if isinstance(exc, urllib.error.HTTPError):
+            return "http_error"
+        if isinstance(exc, socket.timeout) or isinstance(getattr(exc, "reason", None), socket.timeout):
+            return "timeout"
+        return "network_error"
+
+    def _record_attempt(self, info, url, req_bytes, resp_bytes, latency, exc, phases):
+        info["attempts"].append({
+            "node": url,
+            "request_bytes": len(req_bytes),
+            "response_bytes": 0 if resp_bytes is None else len(resp_bytes),
+            "latency": latency,
+            "error_kind": self._error_kind(exc),
+            "phases": phases,
+            })
+        return
+
+    def _attempt(self, url, req_bytes, timeout, info=None, ticket=None):
+        """
+        POST req_bytes to url once.  Returns (resp_bytes, exc_info), one
+        of which is None, and records the outcome with the node selector
+        and in info if it is not None.  ticket is a limiter ticket already
+        taken for url, if any, otherwise one is acquired here.
+        """
+        resp_bytes = None
+        exc = None
+        target = url
+        if self.accept_encoding:
+            target = urllib.request.Request(url, headers={"Accept-Encoding": "gzip, deflate"})
+        queue_time = None
+        if (self.limiter is not None) and (ticket is None):
+            queue_start = time.monotonic()
+            ticket = self.limiter.acquire(url)
+            queue_time = time.monotonic() - queue_start
+        start_time = time.monotonic()
+        headers_time = None
+        connect_time = None
+        try:
+            with self.urlopen(target, req_bytes, timeout,
+                *self.urlopen_args, **self.urlopen_kwargs) as f:
+                headers_time = time.monotonic()
+                connect_time = getattr(f, "connect_time", None)
+                resp_bytes = self._read_body(f)
+        except urllib.error.HTTPError as e:
+            exc = sys.exc_info()
+        except urllib.error.URLError as e:
+            exc = sys.exc_info()
+        except socket.timeout as e:
+            exc = sys.exc_info()
+        except zlib.error as e:
+            exc = sys.exc_info()
+        except OSError as e:
+            # e.g. ConnectionResetError
+            exc = sys.exc_info()
+        except http.client.HTTPException as e:
+            # e.g. RemoteDisconnected, BadStatusLine
+            exc = sys.exc_info()
+        except SteemException as e:
+            # Raised by the urlopen replacement itself, e.g. ReplayMiss,
+            # so not a failure of the node
+            if ticket is not None:
+                self.limiter.release(ticket, e)
+            self.node_selector.record_abandoned(url)
+            raise
+        except BaseException as e:
+            if ticket is not None:
+                self.limiter.release(ticket, e)
+            # Still count the attempt, so that a half-open probe does
+            # not stay in flight forever
+            self.node_selector.record_failure(url, time.monotonic() - start_time)
+            raise
+        end_time = time.monotonic()
+        latency = end_time - start_time
+        if ticket is not None:
+            self.limiter.release(ticket, None if exc is None else exc[1])
+
+        if info is not None:
+            if exc is not None:
+                phases = {"failed": latency}
             else:
-                args = method_args
+                phases = {
+                    "wait": headers_time - start_time,
+                    "read": end_time - headers_time,
+                    }
+                if connect_time is not None:
+                    phases["connect"] = connect_time
+                    phases["wait"] -= connect_time
+            if queue_time is not None:
+                phases["queue"] = queue_time
+            self._record_attempt(info, url, req_bytes, resp_bytes, latency,
+                None if exc is None else exc[1], phases)
+        if exc is not None:
+            self.node_selector.record_failure(url, latency)
+        else:
+            self.node_selector.record_success(url, latency)
+            if self.hedge_policy is not None:
+                self.hedge_policy.record_latency(latency)
+        return resp_bytes, exc
+
+    def _get_hedge_executor(self):
+        with self._hedge_executor_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(32, 4 * len(self.nodes)))
+            return self._hedge_executor
+
+    def _hedged_attempt(self, url, req_bytes, timeout, tried, info=None, ticket=None):
+        """
+        Like _attempt(), but if url has not answered within the hedge
+        delay, send the same request to a second node and use whichever
+        answers first.  The slower request is abandoned.  Returns
+        (url, resp_bytes, exc_info) for the attempt that was used.
+
+        The delay is counted from when the primary request starts, not
+        from when it is queued on the executor, so a busy executor does
+        not make healthy nodes look slow and trigger hedges.  If the
+        executor cannot start the primary request within the delay, it is
+        made in this thread without a hedge.
+
+        Each attempt records into its own call info, and only attempts
+        which have finished when this returns are added to info, so an
+        abandoned attempt never changes info after the call has ended.
+        """
+        policy = self.hedge_policy
+        policy.on_request()
+        delay = policy.hedge_delay()
+        if delay is None:
+            return (url,) + self._attempt(url, req_bytes, timeout, info, ticket)
+        executor = self._get_hedge_executor()
+        started = threading.Event()
+        primary_info = None if info is None else {"attempts": []}
+
+        def run_primary():
+            started.set()
+            return self._attempt(url, req_bytes, timeout, primary_info, ticket)
+
+        primary = executor.submit(run_primary)
+        if (not started.wait(delay)) and primary.cancel():
+            return (url,) + self._attempt(url, req_bytes, timeout, info, ticket)
+        try:
+            result = (url,) + primary.result(timeout=delay)
+            self._merge_attempts(info, [primary_info])
+            return result
+        except concurrent.futures.TimeoutError:
+            pass
+
+        hedge_url = self.node_selector.select(self.nodes, exclude=tried | set([url]))
+        if (hedge_url == url) or (not policy.try_acquire()):
+            result = (url,) + primary.result()
+            self._merge_attempts(info, [primary_info])
+            return result
+        logging.info("hedging request to %s after %.3fs", hedge_url, delay)
+        secondary_info = None if info is None else {"attempts": []}
+        secondary = executor.submit(self._attempt, hedge_url, req_bytes, timeout, secondary_info)
+        futures = {primary: url, secondary: hedge_url}
+
+        result = None
+        for future in concurrent.futures.as_completed(futures):
+            result = (futures[future],) + future.result()
+            if result[2] is None:
+                if future is secondary:
+                    policy.record_win()
+                break
+        self._merge_attempts(info, [attempt_info for future, attempt_info in
+            ((primary, primary_info), (secondary, secondary_info)) if future.done()])
+        return result
+
+    @staticmethod
+    def _merge_attempts(info, attempt_infos):
+        if info is None:
+            return
+        for attempt_info in attempt_infos:
+            info["attempts"].extend(attempt_info["attempts"])
+        return
+
+    def _request(self, make_request, node=None, hedge=False, info=None, prefer_node=None):
+        """
+        POST the bytes returned by make_request() to node (chosen by the
+        node selector if None), retrying on network and HTTP errors.  A
+        failed attempt is retried on another node straight away; once
+        every node has failed, the backend sleeps and backs off.
+        make_request() is called again for each attempt, so every attempt
+        gets fresh request ids.  Returns the raw response bytes.
+
+        If prefer_node is given, the node selector uses it when it is
+        healthy and has not failed this request yet.
+
+        If hedge is true and no node was given, attempts are hedged
+        according to the backend's hedge_policy.  Attempts are recorded in
+        the call info dict info if it is not None.
+        """
+        if len(self.nodes) == 0:
+            raise SteemIllegalArgument("Must specify at least one node")
 
         timeout = self.min_timeout
         retry_count = 0
+        tried = set()
         while True:
-            req_id = self.next_id()
-            d = collections.OrderedDict((
-                ("jsonrpc", "2.0"),
-                ("id", req_id),
-                ("method", "call"),
-                ("params", [api, method, args]),
-                ))
-            req_json = self.json_encoder.encode(d)
-            req_bytes = req_json.encode("ascii")
+            if info is None:
+                req_bytes = make_request()
+            else:
+                start_time = time.monotonic()
+                req_bytes = make_request()
+                self._add_phase(info, "encode", time.monotonic() - start_time)
             logging.info("req: %s", req_bytes)
 
-            url = self.nodes[self.current_node]
-            exc = None
-
-            try:
-                with self.urlopen(url, req_bytes, timeout,
-                    *self.urlopen_args, **self.urlopen_kwargs) as f:
-                    resp_bytes = f.read()
-            except urllib.error.HTTPError as e:
-                exc = sys.exc_info()
-            except urllib.error.URLError as e:
-                exc = sys.exc_info()
-            except socket.timeout as e:
-                exc = sys.exc_info()
+            url = self._select_node(node, tried, prefer_node)
+            ticket = None
+            if self.limiter is not None:
+                ticket = self.limiter.try_acquire(url)
+            if hedge and (node is None) and (len(self.nodes) > 1):
+                url, resp_bytes, exc = self._hedged_attempt(url, req_bytes, timeout, tried, info, ticket)
+            else:
+                resp_bytes, exc = self._attempt(url, req_bytes, timeout, info, ticket)
 
             if exc is not None:
                 logging.error("caught exception in request", exc_info=exc)
                 retry_count += 1
                 if (self.max_retries == -1) or (retry_count <= self.max_retries):
-                    self.sleep_function(timeout)
-                    timeout = min(timeout + self.timeout_backoff, self.max_timeout)
+                    if self._retry_round_done(url, node, tried):
+                        start_time = time.monotonic()
+                        self.sleep_function(timeout)
+                        if info is not None:
+                            self._add_phase(info, "retry_wait", time.monotonic() - start_time)
+                        timeout = min(timeout + self.timeout_backoff, self.max_timeout)
                     continue
-                if isinstance(exc, urllib.error.HTTPError):
+                if isinstance(exc[1], urllib.error.HTTPError):
                     raise SteemHTTPError(exc)
                 raise SteemNetworkError(exc)
             logging.info("resp: %s", resp_bytes)
-            resp_json = resp_bytes.decode("utf-8")
-            resp = self.json_decoder.decode(resp_json)
-            if "error" in resp:
-                raise SteemRPCException(resp)
-            return resp["result"]
+            return resp_bytes
+
+    def rpc_call(self,
+        api="", method="",
+        method_args=None,
+        method_kwargs=None,
+        node=None,
+        prefer_node=None,
+        ):
+        """
+        Call api.method on a remote node and return the result.
+
+        :param node:  URL of the node to send the request to, or None to
+        let the backend choose
+        :param prefer_node:  URL of a node to use if it is healthy.  Unlike
+        node, the circuit breaker and failover to other nodes still apply.
+        """
+
+        args = self._check_args(method_args, method_kwargs)
+        encode = self._request_encoder(api, method, args)
+
+        def make_request():
+            return encode(self.next_id())
+
+        hedge = (self.hedge_policy is not None) and self.hedge_policy.applies(api, method)
+        info = self._begin_call(api, method)
+        try:
+            result = self._call_result(self._request(make_request, node=node, hedge=hedge, info=info,
+                prefer_node=prefer_node), info)
+        except SteemException as e:
+            self._end_call(info, e)
+            raise
+        self._end_call(info, None)
+        return result
+
+    def rpc_batch(self, calls, max_batch_size=None):
+        """
+        Submit several calls as JSON-RPC 2.0 batch requests.
+
+        :param calls:  List of dicts with the keyword arguments of rpc_call(),
+        i.e. api, method, and optionally method_args or method_kwargs
+        :param max_batch_size:  Maximum number of calls per HTTP request,
+        defaults to the backend's max_batch_size
+        :return:  List of results in the same order as calls.  A call
+        which returned an error is represented by a SteemRPCException
+        instance in place of its result.  Results are always decoded, even
+        with decode_mode DECODE_RAW.
+        """
+        prepared, chunks = self._prepare_batch(calls, max_batch_size)
+        results = [None] * len(prepared)
+        for indices in chunks:
+            self._rpc_batch_chunk(prepared, indices, results)
+        return results
+
+    def _prepare_batch(self, calls, max_batch_size):
+        if max_batch_size is None:
+            max_batch_size = self.max_batch_size
+        if max_batch_size < 1:
+            raise SteemIllegalArgument("max_batch_size must be positive")
+
+        # Encoders of the calls, so retries do not encode args again
+        prepared = []
+        for call in calls:
+            args = self._check_args(call.get("method_args"), call.get("method_kwargs"))
+            prepared.append(self._request_encoder(call.get("api", ""), call.get("method", ""), args))
+        chunks = [range(start, min(start + max_batch_size, len(prepared)))
+            for start in range(0, len(prepared), max_batch_size)]
+        return prepared, chunks
+
+    def _encode_batch(self, prepared, pending, id_to_index):
+        id_to_index.clear()
+        entries = []
+        for i in pending:
+            req_id = self.next_id()
+            id_to_index[req_id] = i
+            entries.append(prepared[i](req_id))
+        return b"[" + b",".join(entries) + b"]"
+
+    def _collect_batch(self, resp, id_to_index, results):
+        """
+        Store the entries of a batch response into results, removing them
+        from id_to_index.  Returns the sorted indices still pending.
+        """
+        if not isinstance(resp, list):
+            # Server rejected the batch as a whole
+            raise SteemRPCException(resp)
+        for entry in resp:
+            i = id_to_index.pop(entry.get("id"), None)
+            if i is None:
+                continue
+            if "error" in entry:
+                results[i] = SteemRPCException(entry)
+            else:
+                results[i] = entry.get("result")
+        return sorted(id_to_index.values())
+
+    def _rpc_batch_chunk(self, prepared, indices, results):
+        # Entries which got no response are resubmitted on their own, so a
+        # retry only covers the failed part of the batch.
+        pending = list(indices)
+        id_to_index = {}
+        retry_count = 0
+        while True:
+            info = self._begin_call("jsonrpc", "batch")
+            try:
+                resp_bytes = self._request(
+                    lambda: self._encode_batch(prepared, pending, id_to_index), info=info)
+                start_time = time.monotonic()
+                resp = self._decode_response(resp_bytes)
+                if info is not None:
+                    self._add_phase(info, "decode", time.monotonic() - start_time)
+                pending = self._collect_batch(resp, id_to_index, results)
+            except SteemException as e:
+                self._end_call(info, e)
+                raise
+            self._end_call(info, None)
+            if len(pending) == 0:
+                return
+            logging.error("batch response missing %d of %d entries", len(pending), len(indices))
+            retry_count += 1
+            if (self.max_retries != -1) and (retry_count > self.max_retries):
+                raise SteemNetworkError("Batch response missing {} entries".format(len(pending)))
+            self.sleep_function(self.min_timeout)
 
 class SteemInterface(object):
     """
@@ -193,6 +984,91 @@ class SteemInterface(object):
             return SteemInterface.Api(api_name=item, backend=self.backend)
         raise AttributeError("Unknown attribute {!r}".format(item))
 
+    def batch(self, max_batch_size=None):
+        """
+        Return a SteemBatch which collects calls and submits them with the
+        backend's rpc_batch() when the with block exits:
+
+            with steem.batch() as b:
+                blocks = [b.block_api.get_block(block_num=n) for n in range(1, 501)]
+            print(blocks[0].result())
+        """
+        return SteemBatch(backend=self.backend, max_batch_size=max_batch_size)
+
+    def map(self, method, iterable, workers=8, max_in_flight=None):
+        """
+        Call method once per item of iterable on a thread pool, spreading
+        the calls across all of the backend's healthy nodes.  Yields results in
+        input order.  A call which fails yields its SteemException
+        instance in place of the result, so one bad item does not stop
+        the run.
+
+            for block in steem.map(steem.block_api.get_block,
+                    ({"block_num": n} for n in range(1, 1001)), workers=16):
+                ...
+
+        :param method:  A method of this interface such as steem.block_api.get_block,
+        or a string "block_api.get_block"
+        :param iterable:  Arguments for each call, a dict of keyword arguments
+        (appbase) or a list of positional arguments
+        :param workers:  Number of threads making calls
+        :param max_in_flight:  Maximum number of submitted calls not yet
+        yielded, defaults to 2 * workers
+        """
+        api_name, method_name = self._map_method(method)
+        if max_in_flight is None:
+            max_in_flight = 2 * workers
+        nodes = getattr(self.backend, "nodes", None)
+
+        def call(i, item):
+            try:
+                return self.backend.rpc_call(**self._map_call_kwargs(api_name, method_name, nodes, i, item))
+            except SteemException as e:
+                return e
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        in_flight = collections.deque()
+        try:
+            for i, item in enumerate(iterable):
+                if len(in_flight) >= max_in_flight:
+                    yield in_flight.popleft().result()
+                in_flight.append(executor.submit(call, i, item))
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def _map_method(method):
+        if isinstance(method, str):
+            api_name, _, method_name = method.partition(".")
+            return api_name, method_name
+        return method.api_name, method.method_name
+
+    @staticmethod
+    def _map_call_kwargs(api_name, method_name, nodes, i, item):
+        """
+        Return the rpc_call() keyword arguments for item number i of map().
+        """
+        method_args, method_kwargs = None, None
+        if isinstance(item, dict):
+            method_kwargs = item
+        elif item is not None:
+            method_args = list(item)
+        kwargs = {
+            "api": api_name,
+            "method": method_name,
+            "method_args": method_args,
+            "method_kwargs": method_kwargs,
+            }
+        if nodes:
+            # A preference rather than node=, so that calls still fail
+            # over from a node which is down
+            kwargs["prefer_node"] = nodes[i % len(nodes)]
+        return kwargs
+
     class Api(object):
         def __init__(self, api_name="", backend=None):
             self.api_name = api_name
@@ -224,3 +1100,76 @@ class SteemInterface(object):
                 method_args=args,
                 method_kwargs=kwargs,
                 )
+
+class SteemBatchResult(object):
+    """
+    Placeholder for the result of a call made inside a SteemBatch.
+    """
+    def __init__(self):
+        self.done = False
+        self.value = None
+        return
+
+    def result(self):
+        if not self.done:
+            raise SteemIllegalArgument("Batch has not been executed yet")
+        if isinstance(self.value, SteemException):
+            raise self.value
+        return self.value
+
+class SteemBatch(object):
+    """
+    Collect calls made through SteemInterface-style syntax and submit them
+    together as JSON-RPC batch requests.
+    """
+    def __init__(self, backend=None, max_batch_size=None):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.calls = []
+        self.pending = []
+        self.results = None
+        return
+
+    def __getattr__(self, item):
+        if item.endswith("_api"):
+            return SteemInterface.Api(api_name=item, backend=self)
+        raise AttributeError("Unknown attribute {!r}".format(item))
+
+    def rpc_call(self,
+        api="", method="",
+        method_args=None,
+        method_kwargs=None,
+        ):
+        if self.results is not None:
+            raise SteemIllegalArgument("Batch has already been executed")
+        self.calls.append(dict(
+            api=api,
+            method=method,
+            method_args=method_args,
+            method_kwargs=method_kwargs,
+            ))
+        pending = SteemBatchResult()
+        self.pending.append(pending)
+        return pending
+
+    def execute(self):
+        """
+        Submit the collected calls.  Returns the list of results (or
+        SteemRPCException instances) in call order.
+        """
+        if self.results is not None:
+            raise SteemIllegalArgument("Batch has already been executed")
+        results = self.backend.rpc_batch(self.calls, max_batch_size=self.max_batch_size)
+        for pending, value in zip(self.pending, results):
+            pending.value = value
+            pending.done = True
+        self.results = results
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        return False
@@ -0,0 +1,140 @@
+# Single-flight request coalescing wrapping a Steem backend
+
+import asyncio
+import threading
+
+from simple_steem_client.client import request_key
+
+def default_coalesce(api, method):
+    """
+    Coalesce everything except broadcasts, which must never be merged.
+    """
+    if api == "network_broadcast_api":
+        return False
+    if method.startswith("broadcast_"):
+        return False
+    return True
+
+def _make_predicate(coalesce):
+    if coalesce is None:
+        return default_coalesce
+    if callable(coalesce):
+        return coalesce
+    names = frozenset(coalesce)
+    return lambda api, method: (api + "." + method) in names
+
+class _InFlight(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exc = None
+        return
+
+class CoalescingBackend(object):
+    """
+    Wrap a backend so that identical calls made concurrently from several
+    threads share a single request.  The first caller makes the request;
+    callers arriving while it is in flight wait for it and receive the
+    same result object, or the same exception.
+
+    Results are shared between callers and must not be modified.
+    """
+    def __init__(self, backend, coalesce=None):
+        """
+        :param backend:  Backend to wrap
+        :param coalesce:  Which calls may be coalesced: a function (api, method) -> bool,
+        a collection of "api.method" names, or None for everything except broadcasts
+        """
+        self.backend = backend
+        self.should_coalesce = _make_predicate(coalesce)
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        return
+
+    def __getattr__(self, item):
+        return getattr(self.backend, item)
+
+    def rpc_call(self,
+        api="", method="",
+        method_args=None,
+        method_kwargs=None,
+        **kwargs
+        ):
+        if not self.should_coalesce(api, method):
+            return self.backend.rpc_call(api=api, method=method,
+                method_args=method_args, method_kwargs=method_kwargs, **kwargs)
+
+        key = request_key(api, method, method_args, method_kwargs)
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlight()
+                self._in_flight[key] = call
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = self.backend.rpc_call(api=api, method=method,
+                    method_args=method_args, method_kwargs=method_kwargs, **kwargs)
+            except BaseException as e:
+                call.exc = e
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                call.event.set()
+        else:
+            call.event.wait()
+
+        if call.exc is not None:
+            raise call.exc
+        return call.result
+
+class AsyncCoalescingBackend(object):
+    """
+    CoalescingBackend for an AsyncSteemRemoteBackend, sharing identical
+    calls between concurrent tasks on one event loop.
+
+    The shared request runs as a task of its own, so cancelling one of
+    the callers, including the first, does not cancel it for the others.
+    """
+    def __init__(self, backend, coalesce=None):
+        self.backend = backend
+        self.should_coalesce = _make_predicate(coalesce)
+        self.coalesced = 0
+        self._in_flight = {}
+        return
+
+    def __getattr__(self, item):
+        return getattr(self.backend, item)
+
+    async def rpc_call(self,
+        api="", method="",
+        method_args=None,
+        method_kwargs=None,
+        **kwargs
+        ):
+        if not self.should_coalesce(api, method):
+            return await self.backend.rpc_call(api=api, method=method,
+                method_args=method_args, method_kwargs=method_kwargs, **kwargs)
+
+        key = request_key(api, method, method_args, method_kwargs)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self.backend.rpc_call(api=api, method=method,
+                method_args=method_args, method_kwargs=method_kwargs, **kwargs))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved in case every caller was cancelled
+            task.exception()
+        return
@@ -0,0 +1,108 @@
+# Hedged request policy for tail latency reduction
+
+import collections
+import threading
+
+class HedgePolicy(object):
+    """
+    Decide when SteemRemoteBackend should send a second copy of a request
+    to another node.
+
+    A hedge is sent if the first node has not answered after a fixed
+    delay, or after the given percentile of recently observed latencies.
+    Hedges are paid for from a token budget: every request earns
+    budget_ratio tokens (up to max_tokens) and every hedge costs one, so
+    hedging adds at most about budget_ratio extra load.
+    """
+    def __init__(self,
+        delay=None,
+        percentile=None,
+        min_delay=0.0,
+        budget_ratio=0.1,
+        max_tokens=10.0,
+        methods=None,
+        window=1000,
+        recompute_every=50,
+        ):
+        """
+        :param delay:  Fixed hedge delay in seconds
+        :param percentile:  Hedge after this percentile (e.g. 0.95) of recent latencies,
+        used instead of delay once enough samples are available
+        :param min_delay:  Lower bound on the computed hedge delay
+        :param budget_ratio:  Tokens earned per request, i.e. the maximum fraction of hedged requests
+        :param max_tokens:  Cap on saved up tokens, bounding bursts of hedges
+        :param methods:  Collection of "api.method" names to hedge, None hedges every rpc_call
+        :param window:  Number of recent latency samples kept
+        :param recompute_every:  Recompute the percentile delay after this many samples
+        """
+        if (delay is None) and (percentile is None):
+            raise ValueError("HedgePolicy needs a delay or a percentile")
+        self.delay = delay
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget_ratio = budget_ratio
+        self.max_tokens = max_tokens
+        self.methods = None if methods is None else frozenset(methods)
+        self.recompute_every = recompute_every
+
+        self.tokens = max_tokens
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._samples = collections.deque(maxlen=window)
+        self._since_recompute = 0
+        self._percentile_delay = None
+        self._lock = threading.Lock()
+        return
+
+    def applies(self, api, method):
+        return (self.methods is None) or ((api + "." + method) in self.methods)
+
+    def record_latency(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+            self._since_recompute += 1
+            if (self.percentile is not None) and (self._since_recompute >= self.recompute_every):
+                self._since_recompute = 0
+                samples = sorted(self._samples)
+                i = min(int(self.percentile * len(samples)), len(samples) - 1)
+                self._percentile_delay = max(samples[i], self.min_delay)
+        return
+
+    def hedge_delay(self):
+        """
+        Return the number of seconds to wait before hedging, or None if
+        there is no basis for hedging yet.
+        """
+        if self._percentile_delay is not None:
+            return self._percentile_delay
+        return self.delay
+
+    def on_request(self):
+        with self._lock:
+            self.tokens = min(self.tokens + self.budget_ratio, self.max_tokens)
+        return
+
+    def try_acquire(self):
+        """
+        Spend one token on a hedge.  Returns False if the budget is exhausted.
+        """
+        with self._lock:
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            self.hedges_sent += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.hedges_won += 1
+        return
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tokens": self.tokens,
+                "hedges_sent": self.hedges_sent,
+                "hedges_won": self.hedges_won,
+                "hedge_delay": self.hedge_delay(),
+                }
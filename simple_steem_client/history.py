@@ -0,0 +1,110 @@
+# Parallel account history iteration on top of SteemInterface
+
+from simple_steem_client.client import SteemException
+
+def _op_name(name):
+    if name.endswith("_operation"):
+        return name[:-len("_operation")]
+    return name
+
+def _op_type(item):
+    """
+    Return the operation name of a history item, without the
+    "_operation" suffix, for both appbase ({"type": ..., "value": ...})
+    and legacy ([name, value]) operation formats.
+    """
+    op = item.get("op")
+    if isinstance(op, dict):
+        return _op_name(op.get("type", ""))
+    if isinstance(op, (list, tuple)) and op:
+        return _op_name(op[0])
+    return None
+
+def _history(result):
+    if isinstance(result, dict):
+        return result.get("history", [])
+    return result
+
+def _fetch(steem, appbase, account, start, limit):
+    if appbase:
+        return _history(steem.account_history_api.get_account_history(
+            account=account, start=start, limit=limit))
+    return _history(steem.condenser_api.get_account_history(account, start, limit))
+
+def latest_sequence(steem, account, appbase=None):
+    """
+    Return the sequence number of the most recent operation in the
+    history of account, or None if its history is empty.
+    """
+    if appbase is None:
+        appbase = getattr(steem.backend, "appbase", True)
+    history = _fetch(steem, appbase, account, -1, 1)
+    if not history:
+        return None
+    return max(seq for seq, item in history)
+
+def account_history(steem, account,
+    start=0,
+    end=None,
+    page_size=1000,
+    workers=8,
+    op_types=None,
+    appbase=None,
+    ):
+    """
+    Generator yielding (seq, item) for the operations in the history of
+    account in ascending sequence order.
+
+    The history is split into disjoint pages of page_size operations
+    which are fetched concurrently with SteemInterface.map(), keeping at
+    most 2 * workers pages in flight.  Operations a node returns outside
+    the requested page, e.g. at page edges, are yielded once only.
+
+    Operations added to the history after the iterator started are not
+    included unless end is given.
+
+    :param steem:  SteemInterface
+    :param account:  Account name
+    :param start:  First sequence number to yield
+    :param end:  Last sequence number to yield, or None for the latest
+    :param page_size:  Operations per call, at most the node's limit (usually 1000)
+    :param workers:  Number of concurrent calls
+    :param op_types:  If given, only yield operations of these types, e.g. ["transfer", "vote"]
+    (with or without the "_operation" suffix)
+    :param appbase:  Use account_history_api if true, condenser_api if false,
+    or the backend's appbase setting if None
+    """
+    if appbase is None:
+        appbase = getattr(steem.backend, "appbase", True)
+    if end is None:
+        end = latest_sequence(steem, account, appbase=appbase)
+        if end is None:
+            return
+    if op_types is not None:
+        op_types = frozenset(_op_name(t) for t in op_types)
+
+    # A call with start s and limit l returns sequence numbers s-l..s.
+    # Some nodes reject limit 0, so a one operation page asks for one
+    # more and the overlap is skipped below.  A page of operation 0 alone
+    # has nothing below it, so it asks for 0..1 instead.
+    page_starts = range(start, end + 1, page_size)
+    page_ends = [min(s + page_size - 1, end) for s in page_starts]
+    calls = [(e, min(max(e - s, 1), e)) if e > 0 else (1, 1) for s, e in zip(page_starts, page_ends)]
+    if appbase:
+        method = steem.account_history_api.get_account_history
+        items = ({"account": account, "start": e, "limit": l} for e, l in calls)
+    else:
+        method = steem.condenser_api.get_account_history
+        items = ([account, e, l] for e, l in calls)
+
+    next_seq = start
+    for page_end, result in zip(page_ends, steem.map(method, items, workers=workers)):
+        if isinstance(result, SteemException):
+            raise result
+        for seq, item in _history(result):
+            if (seq < next_seq) or (seq > page_end):
+                continue
+            next_seq = seq + 1
+            if (op_types is not None) and (_op_type(item) not in op_types):
+                continue
+            yield seq, item
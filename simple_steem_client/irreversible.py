@@ -0,0 +1,70 @@
+# Tracking of the last irreversible block for backend wrappers
+
+import json
+import threading
+import time
+
+class IrreversibleBlockTracker(object):
+    """
+    Keep track of the last irreversible block number for a backend.
+
+    The number is learned from get_dynamic_global_properties results
+    passed to observe(), e.g. results passing through a wrapping
+    backend, or fetched from the backend when a caller needs a higher
+    block and the known number is older than max_age seconds.
+    """
+    def __init__(self, backend, max_age=3.0, clock=None):
+        """
+        :param backend:  Backend to fetch get_dynamic_global_properties from
+        :param max_age:  Maximum age in seconds of the last irreversible block number
+        before it is refreshed, None to never fetch it
+        :param clock:  time.monotonic() or similar
+        """
+        self.backend = backend
+        self.max_age = max_age
+        if clock is None:
+            clock = time.monotonic
+        self.clock = clock
+        self.lib = 0
+        self._time = None
+        self._lock = threading.Lock()
+        return
+
+    def observe(self, method, result):
+        """
+        Learn the last irreversible block number from result if it is a
+        get_dynamic_global_properties result, decoded or raw.
+        """
+        if method != "get_dynamic_global_properties":
+            return
+        if isinstance(result, memoryview):
+            result = json.loads(bytes(result).decode("utf-8"))
+        if isinstance(result, dict):
+            lib = result.get("last_irreversible_block_num")
+            if lib is not None:
+                self.set(lib)
+        return
+
+    def set(self, lib):
+        with self._lock:
+            self.lib = max(self.lib, lib)
+            self._time = self.clock()
+        return
+
+    def get(self, needed=None):
+        """
+        Return the last irreversible block number, refreshing it from the
+        backend if it is stale and below needed.
+        """
+        if (needed is not None) and (needed <= self.lib):
+            return self.lib
+        if (self.max_age is not None) and ((self._time is None) or
+            (self.clock() - self._time > self.max_age)):
+            if getattr(self.backend, "appbase", True):
+                dgpo = self.backend.rpc_call(api="database_api",
+                    method="get_dynamic_global_properties", method_kwargs={})
+            else:
+                dgpo = self.backend.rpc_call(api="condenser_api",
+                    method="get_dynamic_global_properties", method_args=[])
+            self.observe("get_dynamic_global_properties", dgpo)
+        return self.lib
@@ -0,0 +1,213 @@
+# Per-node rate limiting and adaptive concurrency control
+
+import socket
+import threading
+import time
+import urllib.error
+
+class _NodeState(object):
+    def __init__(self, limit, burst, now):
+        self.limit = limit
+        self.in_flight = 0
+        self.tokens = burst
+        self.refill_time = now
+        self.paused_until = 0.0
+        self.last_decrease = float("-inf")
+        self.overloads = 0
+        return
+
+class NodeLimiter(object):
+    """
+    Limit the requests SteemRemoteBackend sends to each node.
+
+        limiter = NodeLimiter(rate=50)
+        backend = SteemRemoteBackend(nodes=[...], limiter=limiter)
+
+    Each node gets a token bucket allowing rate requests per second with
+    bursts of up to burst requests, and a concurrency limit adjusted by
+    AIMD:  every successful request raises the limit by increase/limit
+    (about increase per round trip when the limit is in use), while an
+    overload response (HTTP 429 or 503, or a timeout) multiplies it by
+    backoff.  Only requests sent after the last decrease can decrease it
+    again, so one burst of overload responses counts once.  A
+    Retry-After header on an overload response pauses the node for that
+    many seconds, at most max_pause.
+
+    acquire() blocks until the node may be sent a request, so the
+    limiter is for the threaded backend only.  The backend avoids
+    blocking while another node is available:  it selects among the
+    nodes which are not paused or saturated, and takes a slot with
+    try_acquire(), falling back to acquire() only if every node is
+    unavailable.
+    """
+    def __init__(self,
+        rate=None,
+        burst=None,
+        initial_limit=4,
+        min_limit=1,
+        max_limit=64,
+        increase=1.0,
+        backoff=0.5,
+        overload_statuses=(429, 503),
+        max_pause=60.0,
+        clock=None,
+        ):
+        """
+        :param rate:  Maximum requests per second per node, or None for no rate limit
+        :param burst:  Token bucket size, defaults to max(rate, 1)
+        :param initial_limit:  Concurrency limit of a node before any feedback
+        :param min_limit:  Lowest concurrency limit
+        :param max_limit:  Highest concurrency limit
+        :param increase:  Additive increase of the limit per limit successful requests
+        :param backoff:  Factor applied to the limit on overload
+        :param overload_statuses:  HTTP status codes meaning the node is overloaded
+        :param max_pause:  Maximum seconds a Retry-After header may pause a node
+        :param clock:  time.monotonic() or similar
+        """
+        self.rate = rate
+        if burst is None:
+            burst = max(rate, 1.0) if rate is not None else 1.0
+        self.burst = float(burst)
+        self.initial_limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.increase = increase
+        self.backoff = backoff
+        self.overload_statuses = frozenset(overload_statuses)
+        self.max_pause = max_pause
+        if clock is None:
+            clock = time.monotonic
+        self.clock = clock
+
+        self._nodes = {}
+        self._cond = threading.Condition()
+        return
+
+    def _state(self, url, now):
+        state = self._nodes.get(url)
+        if state is None:
+            state = _NodeState(self.initial_limit, self.burst, now)
+            self._nodes[url] = state
+        return state
+
+    def _wait_time(self, state, now):
+        """
+        Return 0 if a request may be sent now, otherwise the seconds to
+        wait, or None to wait for a release.
+        """
+        if state.paused_until > now:
+            return state.paused_until - now
+        if state.in_flight >= int(state.limit):
+            return None
+        if self.rate is not None:
+            state.tokens = min(self.burst, state.tokens + (now - state.refill_time) * self.rate)
+            state.refill_time = now
+            if state.tokens < 1.0:
+                return (1.0 - state.tokens) / self.rate
+        return 0
+
+    def _delay(self, state, now):
+        """
+        Like _wait_time(), but take a slot and token if the wait is 0.
+        """
+        delay = self._wait_time(state, now)
+        if delay == 0:
+            if self.rate is not None:
+                state.tokens -= 1.0
+            state.in_flight += 1
+        return delay
+
+    def unavailable(self, urls):
+        """
+        Return the set of urls which cannot be sent a request right now,
+        because they are paused, at their concurrency limit or out of
+        tokens.
+        """
+        with self._cond:
+            now = self.clock()
+            return set(url for url in urls if self._wait_time(self._state(url, now), now) != 0)
+
+    def try_acquire(self, url):
+        """
+        Like acquire(), but return None instead of blocking if url cannot
+        be sent a request right now.
+        """
+        with self._cond:
+            now = self.clock()
+            if self._delay(self._state(url, now), now) == 0:
+                return (url, now)
+            return None
+
+    def acquire(self, url):
+        """
+        Block until a request may be sent to url.  Returns a ticket which
+        must be passed to release() once the request is done.
+        """
+        with self._cond:
+            while True:
+                now = self.clock()
+                state = self._state(url, now)
+                delay = self._delay(state, now)
+                if delay == 0:
+                    return (url, now)
+                self._cond.wait(delay)
+
+    def release(self, ticket, exc=None):
+        """
+        Record the outcome of a request:  exc is None on success, or the
+        exception the request failed with.
+        """
+        url, sent_time = ticket
+        with self._cond:
+            now = self.clock()
+            state = self._state(url, now)
+            state.in_flight -= 1
+            if exc is None:
+                state.limit = min(self.max_limit, state.limit + self.increase / state.limit)
+            elif self._is_overload(exc):
+                state.overloads += 1
+                if sent_time > state.last_decrease:
+                    state.limit = max(self.min_limit, state.limit * self.backoff)
+                    state.last_decrease = now
+                pause = self._retry_after(exc)
+                if pause is not None:
+                    state.paused_until = max(state.paused_until, now + min(pause, self.max_pause))
+            self._cond.notify_all()
+        return
+
+    def _is_overload(self, exc):
+        if isinstance(exc, urllib.error.HTTPError):
+            return exc.code in self.overload_statuses
+        if isinstance(exc, socket.timeout):
+            return True
+        return isinstance(getattr(exc, "reason", None), socket.timeout)
+
+    @staticmethod
+    def _retry_after(exc):
+        headers = getattr(exc, "headers", None)
+        if headers is None:
+            return None
+        value = headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            # HTTP-date form, not worth parsing
+            return None
+
+    def stats(self):
+        """
+        Return a dict mapping each node URL to a dict with its current
+        concurrency limit, requests in flight, tokens, overloads seen and
+        seconds it remains paused for.
+        """
+        with self._cond:
+            now = self.clock()
+            return dict((url, {
+                "limit": state.limit,
+                "in_flight": state.in_flight,
+                "tokens": state.tokens,
+                "overloads": state.overloads,
+                "paused": max(state.paused_until - now, 0.0),
+                }) for url, state in self._nodes.items())
@@ -0,0 +1,162 @@
+# Metrics registry for SteemRemoteBackend calls
+
+import bisect
+import threading
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+    )
+
+COUNTERS = (
+    ("calls", "Calls made"),
+    ("attempts", "HTTP requests sent, including retries and hedges"),
+    ("retries", "Attempts beyond the first for a call"),
+    ("timeouts", "Attempts which timed out"),
+    ("http_errors", "Attempts which got an HTTP error status"),
+    ("network_errors", "Attempts which failed with another network error"),
+    ("rpc_errors", "Calls for which the node returned a JSON-RPC error"),
+    ("request_bytes", "Bytes of request bodies sent"),
+    ("response_bytes", "Bytes of response bodies received"),
+    )
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        return
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        return
+
+    def cumulative(self):
+        """
+        Return a list of (upper_bound, cumulative_count) including +Inf.
+        """
+        result = []
+        total = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+class _Series(object):
+    def __init__(self, buckets):
+        for name, help_text in COUNTERS:
+            setattr(self, name, 0)
+        self.latency = Histogram(buckets)
+        return
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_bound(bound):
+    if bound == float("inf"):
+        return "+Inf"
+    return repr(float(bound))
+
+class MetricsRegistry(object):
+    """
+    Per (api, method, node) call metrics for SteemRemoteBackend.
+
+        metrics = MetricsRegistry()
+        backend = SteemRemoteBackend(nodes=[...], metrics=metrics)
+        ...
+        print(metrics.to_prometheus())
+
+    The registry is a post-call hook:  it is called with the call info
+    dict built by the backend once per call.
+    """
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS, prefix="steem_rpc"):
+        """
+        :param buckets:  Upper bounds in seconds of the latency histogram buckets
+        :param prefix:  Prefix of the exported metric names
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._series = {}
+        self._lock = threading.Lock()
+        return
+
+    def _get(self, key):
+        series = self._series.get(key)
+        if series is None:
+            series = _Series(self.buckets)
+            self._series[key] = series
+        return series
+
+    def __call__(self, info):
+        api = info["api"]
+        method = info["method"]
+        attempts = info["attempts"]
+        with self._lock:
+            for attempt in attempts:
+                series = self._get((api, method, attempt["node"]))
+                series.attempts += 1
+                series.request_bytes += attempt["request_bytes"]
+                series.response_bytes += attempt["response_bytes"]
+                kind = attempt["error_kind"]
+                if kind is None:
+                    series.latency.observe(attempt["latency"])
+                elif kind == "timeout":
+                    series.timeouts += 1
+                elif kind == "http_error":
+                    series.http_errors += 1
+                else:
+                    series.network_errors += 1
+            series = self._get((api, method, info["node"]))
+            series.calls += 1
+            series.retries += max(len(attempts) - 1, 0)
+            if info["error_kind"] == "rpc_error":
+                series.rpc_errors += 1
+        return
+
+    def snapshot(self):
+        """
+        Return the metrics as nested plain dicts:
+        snapshot[api][method][node] = {"calls": ..., "latency": {...}, ...}
+        """
+        result = {}
+        with self._lock:
+            for (api, method, node), series in self._series.items():
+                d = dict((name, getattr(series, name)) for name, help_text in COUNTERS)
+                d["latency"] = {
+                    "buckets": [[bound, n] for bound, n in series.latency.cumulative()],
+                    "sum": series.latency.sum,
+                    "count": series.latency.count,
+                    }
+                result.setdefault(api, {}).setdefault(method, {})[node] = d
+        return result
+
+    def to_prometheus(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            items = sorted(self._series.items(), key=lambda kv: tuple(str(k) for k in kv[0]))
+            labels = []
+            for (api, method, node), series in items:
+                labels.append('api="{}",method="{}",node="{}"'.format(
+                    _escape_label(api), _escape_label(method), _escape_label(node)))
+
+            for name, help_text in COUNTERS:
+                metric = "{}_{}_total".format(self.prefix, name)
+                lines.append("# HELP {} {}".format(metric, help_text))
+                lines.append("# TYPE {} counter".format(metric))
+                for label, (key, series) in zip(labels, items):
+                    lines.append("{}{{{}}} {}".format(metric, label, getattr(series, name)))
+
+            metric = "{}_latency_seconds".format(self.prefix)
+            lines.append("# HELP {} Latency of successful attempts".format(metric))
+            lines.append("# TYPE {} histogram".format(metric))
+            for label, (key, series) in zip(labels, items):
+                for bound, n in series.latency.cumulative():
+                    lines.append('{}_bucket{{{},le="{}"}} {}'.format(metric, label, _format_bound(bound), n))
+                lines.append("{}_sum{{{}}} {}".format(metric, label, repr(series.latency.sum)))
+                lines.append("{}_count{{{}}} {}".format(metric, label, series.latency.count))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,235 @@
+# Node selection policies with per-node health tracking
+
+import random
+import threading
+import time
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+class NodeStats(object):
+    """
+    Health statistics and circuit breaker state for one node.
+    """
+    def __init__(self, url):
+        self.url = url
+        self.ewma_latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        return
+
+    def snapshot(self):
+        return {
+            "url": self.url,
+            "ewma_latency": self.ewma_latency,
+            "error_rate": self.error_rate,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "state": self.state,
+            }
+
+class NodeSelector(object):
+    """
+    Base class for node selection policies.
+
+    Tracks an exponentially weighted moving average (EWMA) of latency and
+    error rate per node, and a circuit breaker which stops sending traffic
+    to a node after failure_threshold consecutive failures.  After
+    reset_timeout seconds a single half-open probe is let through; if it
+    succeeds the node is used normally again, otherwise it stays open for
+    another reset_timeout.
+
+    Subclasses implement _choose() to pick among the healthy candidates.
+    """
+    def __init__(self,
+        alpha=0.3,
+        failure_threshold=5,
+        reset_timeout=30.0,
+        clock=None,
+        ):
+        """
+        :param alpha:  EWMA smoothing factor, higher values favor recent samples
+        :param failure_threshold:  Number of consecutive failures which open the circuit
+        :param reset_timeout:  Seconds an open circuit waits before a half-open probe
+        :param clock:  time.monotonic() or similar
+        """
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        if clock is None:
+            clock = time.monotonic
+        self.clock = clock
+        self._stats = {}
+        self._lock = threading.Lock()
+        return
+
+    def _get(self, url):
+        stats = self._stats.get(url)
+        if stats is None:
+            stats = NodeStats(url)
+            self._stats[url] = stats
+        return stats
+
+    def select(self, nodes, exclude=(), prefer=None):
+        """
+        Return the URL of the node to use for the next request.
+
+        :param nodes:  List of node URLs
+        :param exclude:  URLs to avoid (e.g. nodes which already failed this
+        request), ignored if no other node is available
+        :param prefer:  URL to return if its circuit is closed and it is not
+        excluded, instead of asking the policy
+        """
+        now = self.clock()
+        with self._lock:
+            candidates = []
+            probes = []
+            for url in nodes:
+                stats = self._get(url)
+                if stats.state == CIRCUIT_CLOSED:
+                    candidates.append(stats)
+                elif (not stats.probe_in_flight) and (now - stats.opened_at >= self.reset_timeout):
+                    probes.append(stats)
+            allowed = [s for s in candidates if s.url not in exclude]
+            allowed_probes = [s for s in probes if s.url not in exclude]
+
+            if allowed_probes:
+                # Give recovering nodes their probe ahead of normal traffic
+                stats = allowed_probes[0]
+                stats.state = CIRCUIT_HALF_OPEN
+                stats.probe_in_flight = True
+                return stats.url
+            if allowed:
+                for stats in allowed:
+                    if stats.url == prefer:
+                        return prefer
+                return self._choose(allowed).url
+            if candidates:
+                return self._choose(candidates).url
+            # Every circuit is open, use whichever node has waited longest
+            # rather than failing outright.
+            stats = min((self._get(url) for url in nodes), key=lambda s: s.opened_at or 0.0)
+            return stats.url
+
+    def _choose(self, candidates):
+        raise NotImplementedError()
+
+    def record_success(self, url, latency):
+        with self._lock:
+            stats = self._get(url)
+            stats.requests += 1
+            if stats.ewma_latency is None:
+                stats.ewma_latency = latency
+            else:
+                stats.ewma_latency += self.alpha * (latency - stats.ewma_latency)
+            stats.error_rate -= self.alpha * stats.error_rate
+            stats.consecutive_failures = 0
+            stats.state = CIRCUIT_CLOSED
+            stats.opened_at = None
+            stats.probe_in_flight = False
+        return
+
+    def record_failure(self, url, latency=None):
+        with self._lock:
+            stats = self._get(url)
+            stats.requests += 1
+            stats.failures += 1
+            # A failure may only raise the latency estimate, otherwise a
+            # node refusing connections would look like the fastest one.
+            if (latency is not None) and (stats.ewma_latency is not None) and (latency > stats.ewma_latency):
+                stats.ewma_latency += self.alpha * (latency - stats.ewma_latency)
+            stats.error_rate += self.alpha * (1.0 - stats.error_rate)
+            stats.consecutive_failures += 1
+            if (stats.state == CIRCUIT_HALF_OPEN) or (stats.consecutive_failures >= self.failure_threshold):
+                stats.state = CIRCUIT_OPEN
+                stats.opened_at = self.clock()
+            stats.probe_in_flight = False
+        return
+
+    def record_abandoned(self, url):
+        """
+        Record that a request to url ended without an outcome from the
+        node.  Nothing is counted, but a half-open probe is returned so
+        that another request can probe the node.
+        """
+        with self._lock:
+            stats = self._get(url)
+            if stats.state == CIRCUIT_HALF_OPEN:
+                stats.state = CIRCUIT_OPEN
+            stats.probe_in_flight = False
+        return
+
+    def stats(self):
+        """
+        Return a dict mapping node URL to a dict of its statistics.
+        """
+        with self._lock:
+            return dict((url, stats.snapshot()) for url, stats in self._stats.items())
+
+class RoundRobinSelector(NodeSelector):
+    """
+    Cycle through the healthy nodes in order.
+    """
+    def __init__(self, **kwargs):
+        super(RoundRobinSelector, self).__init__(**kwargs)
+        self._counter = 0
+        return
+
+    def _choose(self, candidates):
+        stats = candidates[self._counter % len(candidates)]
+        self._counter += 1
+        return stats
+
+class LeastLatencySelector(NodeSelector):
+    """
+    Use the healthy node with the lowest EWMA latency, inflated by its
+    recent error rate.  Nodes without samples are tried first.
+    """
+    def __init__(self, error_penalty=10.0, **kwargs):
+        """
+        :param error_penalty:  A node's score is ewma_latency * (1 + error_penalty * error_rate)
+        """
+        super(LeastLatencySelector, self).__init__(**kwargs)
+        self.error_penalty = error_penalty
+        return
+
+    def _score(self, stats):
+        if stats.ewma_latency is None:
+            # Untried nodes go first, nodes which have only ever failed last
+            return float("inf") if stats.failures else 0.0
+        return stats.ewma_latency * (1.0 + self.error_penalty * stats.error_rate)
+
+    def _choose(self, candidates):
+        return min(candidates, key=self._score)
+
+class WeightedSelector(NodeSelector):
+    """
+    Pick a healthy node at random in proportion to its weight.
+    """
+    def __init__(self, weights=None, rng=None, **kwargs):
+        """
+        :param weights:  Dict mapping node URL to weight, nodes not listed have weight 1
+        :param rng:  random.Random instance or similar
+        """
+        super(WeightedSelector, self).__init__(**kwargs)
+        self.weights = dict(weights or {})
+        if rng is None:
+            rng = random.Random()
+        self.rng = rng
+        return
+
+    def _choose(self, candidates):
+        weights = [self.weights.get(stats.url, 1.0) for stats in candidates]
+        x = self.rng.random() * sum(weights)
+        for stats, w in zip(candidates, weights):
+            x -= w
+            if x < 0:
+                return stats
+        return candidates[-1]
@@ -0,0 +1,100 @@
+# Multi-process block ingestion on top of SteemInterface
+
+import collections
+import json
+import multiprocessing
+
+from simple_steem_client.client import SteemException, SteemRPCException
+
+def _process_range(process, start, count, result):
+    """
+    Worker process side:  decode a get_block_range result if it arrived
+    as raw JSON, and run process on each block.
+    """
+    if not isinstance(result, dict):
+        result = json.loads(bytes(result).decode("utf-8"))
+    blocks = result.get("blocks", [])
+    if len(blocks) != count:
+        raise SteemRPCException("Incomplete block range starting at {}".format(start))
+    return [process(start + i, block) for i, block in enumerate(blocks)]
+
+def ingest_blocks(steem, start, end, process,
+    processes=None,
+    range_size=50,
+    fetchers=8,
+    max_pending=None,
+    pool=None,
+    ):
+    """
+    Generator yielding (block_num, process(block_num, block)) for blocks
+    start..end inclusive, in block order.
+
+    The work is split across three stages:
+
+    - Fetcher threads call block_api.get_block_range for range_size
+      blocks at a time, spread across the backend's nodes with
+      SteemInterface.map().
+    - A multiprocessing pool decodes each range and runs process on its
+      blocks, so JSON decoding and user code use every core.  For the
+      decoding to happen in the pool, the backend should use
+      decode_mode=DECODE_RAW; decoded results are passed on as they are.
+    - The generator re-sequences the pool's output by block number.
+
+    Each stage is bounded:  at most 2 * fetchers ranges are being
+    fetched, and at most max_pending ranges wait in or on the pool, so a
+    slow consumer stalls the fetchers instead of filling memory.
+
+    Requires an appbase node.  process and its results must be
+    picklable, e.g. process must be a module-level function.
+
+    :param steem:  SteemInterface
+    :param start:  First block number
+    :param end:  Last block number
+    :param process:  Function (block_num, block) -> result run in the worker processes
+    :param processes:  Number of worker processes, defaults to the number of CPUs
+    :param range_size:  Blocks fetched per call
+    :param fetchers:  Number of fetcher threads
+    :param max_pending:  Maximum ranges handed to the pool and not yet yielded,
+    defaults to 4 * processes
+    :param pool:  Existing multiprocessing.Pool to use instead of starting one
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    own_pool = pool is None
+    if own_pool:
+        pool = multiprocessing.Pool(processes)
+    if max_pending is None:
+        max_pending = 4 * processes
+
+    starts = range(start, end + 1, range_size)
+    items = ({"starting_block_num": n, "count": min(range_size, end + 1 - n)} for n in starts)
+    # (first block number, count, AsyncResult) in block order, so
+    # ranges finishing early in the pool wait here for earlier ones
+    pending = collections.deque()
+    ranges = steem.map(steem.block_api.get_block_range, items, workers=fetchers)
+
+    def drain_one():
+        first, count, async_result = pending.popleft()
+        for i, value in enumerate(async_result.get()):
+            yield first + i, value
+
+    try:
+        for first, result in zip(starts, ranges):
+            if isinstance(result, SteemException):
+                raise result
+            if isinstance(result, memoryview):
+                result = result.tobytes()
+            count = min(range_size, end + 1 - first)
+            pending.append((first, count,
+                pool.apply_async(_process_range, (process, first, count, result))))
+            while len(pending) >= max_pending:
+                for item in drain_one():
+                    yield item
+        while pending:
+            for item in drain_one():
+                yield item
+    finally:
+        ranges.close()
+        if own_pool:
+            pool.terminate()
+            pool.join()
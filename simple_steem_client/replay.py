@@ -0,0 +1,286 @@
+# Record/replay transport backed by an indexed on-disk archive
+
+import collections
+import json
+import mmap
+import os
+import struct
+import threading
+import urllib.request
+import zlib
+
+from simple_steem_client.client import SteemException, request_key
+from simple_steem_client.transport import PooledResponse
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+ARCHIVE_MAGIC = b"SSCARCH1"
+
+# flags, key length, value length
+_record_header = struct.Struct("<BII")
+_FLAG_ZLIB = 1
+
+_compact_encoder = json.JSONEncoder(ensure_ascii=True, separators=(",", ":"))
+
+class ReplayMiss(SteemException):
+    # Replayed call is not in the archive
+    pass
+
+class ReplayArchive(object):
+    """
+    Append-only file of (key, value) byte strings with an in-memory index.
+
+    The file is the magic bytes followed by records, each a header
+    (flags, key length, value length) and the key and value bytes.  A
+    key written several times maps to its last value.  The index is
+    built by skipping from header to header when the archive is opened,
+    and values are read from a memory map of the file.
+
+    Opening therefore reads every record header, which takes time in
+    proportion to the number of records.  No separate index file is
+    kept:  the archive stays a single append-only file which a crash can
+    never leave out of step with its index.  A truncated last
+    record, e.g. from a crash while recording, is ignored and
+    overwritten by the next put().
+    """
+    def __init__(self, path, writable=False, compress=False):
+        """
+        :param path:  File name of the archive, created if writable and missing
+        :param writable:  If true, put() may be used
+        :param compress:  If true, values written by put() are zlib compressed
+        """
+        self.path = path
+        self.writable = writable
+        self.compress = compress
+        # key -> (flags, value offset, value length)
+        self.index = {}
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._file = None
+
+        if writable:
+            self._file = open(path, "a+b")
+            self._file.seek(0, os.SEEK_END)
+            if self._file.tell() == 0:
+                self._file.write(ARCHIVE_MAGIC)
+                self._file.flush()
+        end = self._load()
+        if writable:
+            self._file.truncate(end)
+            self._file.seek(end)
+        return
+
+    def _load(self):
+        """
+        Build the index from the file and return the end offset of its
+        last complete record.
+        """
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                raise ValueError("{} is empty".format(self.path))
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buf[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+            buf.close()
+            raise ValueError("{} is not an archive".format(self.path))
+
+        pos = len(ARCHIVE_MAGIC)
+        header_size = _record_header.size
+        index = self.index
+        while pos + header_size <= size:
+            flags, key_len, value_len = _record_header.unpack_from(buf, pos)
+            end = pos + header_size + key_len + value_len
+            if end > size:
+                break
+            key_start = pos + header_size
+            index[buf[key_start:key_start + key_len]] = (flags, key_start + key_len, value_len)
+            pos = end
+        self._mmap = buf
+        return pos
+
+    def get(self, key, default=None):
+        """
+        Return the value stored for key, or default.
+        """
+        entry = self.index.get(key)
+        if entry is None:
+            return default
+        flags, offset, length = entry
+        if offset + length > len(self._mmap):
+            # Written since the map was made
+            self._remap()
+        value = self._mmap[offset:offset + length]
+        if flags & _FLAG_ZLIB:
+            value = zlib.decompress(value)
+        return value
+
+    def _remap(self):
+        # The old map is left to the garbage collector, since other
+        # threads may still be reading from it
+        with self._lock:
+            with open(self.path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return
+
+    def put(self, key, value):
+        if not self.writable:
+            raise SteemException("Archive {} is not writable".format(self.path))
+        flags = 0
+        if self.compress:
+            flags |= _FLAG_ZLIB
+            value = zlib.compress(value)
+        with self._lock:
+            offset = self._file.tell() + _record_header.size + len(key)
+            self._file.write(_record_header.pack(flags, len(key), len(value)) + key + value)
+            self._file.flush()
+            self.index[key] = (flags, offset, len(value))
+        return
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+class RecordReplayTransport(object):
+    """
+    urlopen replacement which records calls to an archive, or replays
+    them from it without touching the network.
+
+        # Record a slice of chain history from a real node
+        transport = RecordReplayTransport("blocks.archive", mode=MODE_RECORD)
+        backend = SteemRemoteBackend(nodes=[...], urlopen=transport, appbase=True)
+        ...
+        transport.close()
+
+        # Replay it later, with no node at all
+        transport = RecordReplayTransport("blocks.archive")
+        backend = SteemRemoteBackend(nodes=["http://replay/"], urlopen=transport, appbase=True)
+
+    Calls are matched on (api, method, args) as in request_key(), so
+    request ids, argument order, and whether calls were batched do not
+    matter.  Each call's "result" (or "error", with record_errors) is
+    stored; on replay the response is assembled around the request's id.
+
+    A call missing from the archive raises ReplayMiss, or with
+    passthrough_on_miss is sent to urlopen.
+    """
+    def __init__(self, path,
+        mode=MODE_REPLAY,
+        urlopen=None,
+        compress=False,
+        record_errors=False,
+        passthrough_on_miss=False,
+        ):
+        """
+        :param path:  File name of the archive
+        :param mode:  MODE_RECORD to forward requests to urlopen and store the results,
+        MODE_REPLAY to serve them from the archive
+        :param urlopen:  urllib.request.urlopen() or similar used to reach real nodes
+        :param compress:  If true, zlib compress recorded results
+        :param record_errors:  If true, also record calls which returned an error
+        :param passthrough_on_miss:  If true, replay misses are sent to urlopen instead of raising ReplayMiss
+        """
+        if mode not in (MODE_RECORD, MODE_REPLAY):
+            raise ValueError("Unknown mode {!r}".format(mode))
+        self.mode = mode
+        if urlopen is None:
+            urlopen = urllib.request.urlopen
+        self.urlopen = urlopen
+        self.record_errors = record_errors
+        self.passthrough_on_miss = passthrough_on_miss
+        self.archive = ReplayArchive(path, writable=(mode == MODE_RECORD), compress=compress)
+        self.hits = 0
+        self.misses = 0
+        return
+
+    @staticmethod
+    def _call_key(req):
+        api, method, args = req["params"]
+        if isinstance(args, dict):
+            key = request_key(api, method, method_kwargs=args)
+        else:
+            key = request_key(api, method, method_args=args)
+        return key.encode("ascii")
+
+    def __call__(self, url, data=None, timeout=None, *args, **kwargs):
+        if isinstance(url, urllib.request.Request):
+            if data is None:
+                data = url.data
+            url = url.full_url
+        req = json.loads(data.decode("utf-8"))
+        if self.mode == MODE_RECORD:
+            return self._record(url, data, req, timeout, args, kwargs)
+        return self._replay(url, data, req, timeout, args, kwargs)
+
+    def _forward(self, url, data, timeout, args, kwargs):
+        # Requested without Accept-Encoding, so the body is plain JSON
+        with self.urlopen(url, data, timeout, *args, **kwargs) as f:
+            return f.read()
+
+    def _record(self, url, data, req, timeout, args, kwargs):
+        body = self._forward(url, data, timeout, args, kwargs)
+        resp = json.loads(body.decode("utf-8"), object_pairs_hook=collections.OrderedDict)
+        if isinstance(req, list):
+            keys = dict((r["id"], self._call_key(r)) for r in req)
+            entries = resp if isinstance(resp, list) else []
+        else:
+            keys = {req["id"]: self._call_key(req)}
+            entries = [resp]
+        for entry in entries:
+            key = keys.get(entry.get("id"))
+            if key is None:
+                continue
+            if "error" in entry:
+                if not self.record_errors:
+                    continue
+                member = b'"error":' + _compact_encoder.encode(entry["error"]).encode("ascii")
+            elif "result" in entry:
+                member = b'"result":' + _compact_encoder.encode(entry["result"]).encode("ascii")
+            else:
+                continue
+            self.archive.put(key, member)
+        return PooledResponse(url, 200, "OK", {}, body)
+
+    def _replay(self, url, data, req, timeout, args, kwargs):
+        single = not isinstance(req, list)
+        reqs = [req] if single else req
+        parts = []
+        for r in reqs:
+            member = self.archive.get(self._call_key(r))
+            if member is None:
+                self.misses += 1
+                if self.passthrough_on_miss:
+                    return PooledResponse(url, 200, "OK", {}, self._forward(url, data, timeout, args, kwargs))
+                api, method, method_args = r["params"]
+                raise ReplayMiss("No recorded result for {}.{}({})".format(
+                    api, method, _compact_encoder.encode(method_args)))
+            parts.append(b'{"jsonrpc":"2.0","id":' + _compact_encoder.encode(r.get("id")).encode("ascii")
+                + b"," + member + b"}")
+        self.hits += len(parts)
+        if single:
+            body = parts[0]
+        else:
+            body = b"[" + b",".join(parts) + b"]"
+        return PooledResponse(url, 200, "OK", {}, body)
+
+    def close(self):
+        self.archive.close()
+        return
@@ -1 +1,3 @@
 from simple_steem_client.serializer.serializer import Serializer, twos
+from simple_steem_client.serializer.deserializer import Deserializer
+from simple_steem_client.serializer.digest import transaction_digest, transaction_digests, transaction_id, transaction_ids
@@ -0,0 +1,325 @@
+
+from simple_steem_client.serializer.serializer import Serializer, ArgumentError
+
+import struct
+import time
+import types
+
+_INT8 = struct.Struct("<b")
+_UINT16 = struct.Struct("<H")
+_UINT32 = struct.Struct("<I")
+_UINT64 = struct.Struct("<Q")
+_INT16 = struct.Struct("<h")
+_INT32 = struct.Struct("<i")
+_INT64 = struct.Struct("<q")
+_FLOAT64 = struct.Struct("<d")
+_ASSET = struct.Struct("<QB7s")
+
+class _ReaderProxy:
+  """Stands in for a Serializer when a field table function is used to read.
+
+  A function such as `lambda s, v: s.array(v, "string")` is called with a proxy
+  and a placeholder value, and the proxy reads with the Deserializer method of
+  the same name, dropping the value argument.
+  """
+  def __init__(self, deserializer):
+    self._deserializer = deserializer
+
+  def __getattr__(self, name):
+    method = getattr(self._deserializer, name)
+    return lambda value, *args: method(*args)
+
+class Deserializer:
+  """Converts sequences of bytes written by `Serializer` back into dicts and lists.
+
+  The Deserializer reads the same type definitions as `Serializer`, including its
+  field tables and `operation_variants`, so every type the Serializer writes can
+  be read back. Values are returned in the form the Serializer accepts:
+    - Structs are read as dicts, static variants as [name, value] lists,
+      and maps as lists of [key, value] pairs.
+    - Assets are read as strings such as "1.000 STEEM", and time_point_sec as
+      strings such as "2018-01-01T00:00:00".
+    - Raw bytes are read as memoryviews of the input, without copying.
+
+  Raw bytes and hex strings carry no length prefix, so their lengths come from
+  the constructor: block ids, merkle roots, and signatures. A raw_bytes field of
+  any other length, such as the data of a `custom` operation, cannot be read.
+
+  The input may be anything supporting the buffer protocol. To decode a large
+  file without reading it into memory, pass an mmap of it and use `iterate`.
+  """
+  def __init__(self, data, offset=0, block_id_size=20, checksum_size=20, signature_size=65):
+    """
+    Args:
+      data (bytes): The input, or any object supporting the buffer protocol.
+      offset (int): The offset at which to start reading.
+      block_id_size (int): The length of block ids such as a block header's `previous`.
+      checksum_size (int): The length of checksums such as `transaction_merkle_root`.
+      signature_size (int): The length of signatures.
+    """
+    self._data = memoryview(data).cast("B")
+    self._pos = offset
+    self.block_id_size = block_id_size
+    self.checksum_size = checksum_size
+    self.signature_size = signature_size
+    self._proxy = _ReaderProxy(self)
+    self._readers = {}
+
+  @property
+  def offset(self):
+    """int: The offset of the next byte to be read."""
+    return self._pos
+
+  def remaining(self):
+    """Returns the number of bytes left to read."""
+    return len(self._data) - self._pos
+
+  def _take(self, length):
+    pos = self._pos
+    end = pos + length
+    if end > len(self._data):
+      raise ArgumentError("Unexpected end of input at offset %d (%d bytes needed)" % (pos, length))
+    self._pos = end
+    return self._data[pos:end]
+
+  def _unpack(self, packer):
+    pos = self._pos
+    if pos + packer.size > len(self._data):
+      raise ArgumentError("Unexpected end of input at offset %d (%d bytes needed)" % (pos, packer.size))
+    self._pos = pos + packer.size
+    return packer.unpack_from(self._data, pos)
+
+  def _get_reader_fn(self, reader_def):
+    # Only named types are cached: field table functions such as
+    # comment_options_extensions build new definitions on every call,
+    # so caching by definition would grow without bound.
+    if type(reader_def) is types.FunctionType:
+      return lambda: reader_def(self._proxy, None)
+    elif type(reader_def) is tuple:
+      return lambda: self.fields(reader_def)
+    elif type(reader_def) is not str:
+      raise ArgumentError("Cannot read type definition %r" % (reader_def,))
+    reader = self._readers.get(reader_def)
+    if reader is None:
+      pairs = getattr(self, "_" + reader_def + "_fields", None)
+      variants = Serializer._static_variant_types.get(reader_def)
+      if pairs is not None:
+        reader = lambda: self.fields(pairs)
+      elif variants is not None:
+        reader = lambda: self.static_variant(variants)
+      else:
+        reader = getattr(self, reader_def)
+      self._readers[reader_def] = reader
+    return reader
+
+  def read(self, reader_def):
+    """Reads one value.
+
+    Args:
+      reader_def: A type name such as "signed_transaction", a tuple of
+        (name, type) field pairs, or a function (s, v) as used in field tables.
+
+    Returns:
+      The value read.
+    """
+    return self._get_reader_fn(reader_def)()
+
+  def iterate(self, reader_def):
+    """Reads values of one type until the end of the input.
+
+    Values are decoded one at a time as the generator is advanced.
+
+    Args:
+      reader_def: The type of the values, as for `read`.
+
+    Yields:
+      The values read.
+    """
+    reader = self._get_reader_fn(reader_def)
+    end = len(self._data)
+    while self._pos < end:
+      yield reader()
+
+  def uint8(self):
+    return self._take(1)[0]
+
+  def uint16(self):
+    return self._unpack(_UINT16)[0]
+
+  def uint32(self):
+    return self._unpack(_UINT32)[0]
+
+  def uint64(self):
+    return self._unpack(_UINT64)[0]
+
+  def int8(self):
+    return self._unpack(_INT8)[0]
+
+  def int16(self):
+    return self._unpack(_INT16)[0]
+
+  def int32(self):
+    return self._unpack(_INT32)[0]
+
+  def int64(self):
+    return self._unpack(_INT64)[0]
+
+  def binary64(self):
+    return self._unpack(_FLOAT64)[0]
+
+  def uvarint(self):
+    data = self._data
+    pos = self._pos
+    value = 0
+    shift = 0
+    while True:
+      if pos >= len(data):
+        raise ArgumentError("Unexpected end of input in varint at offset %d" % (self._pos,))
+      byte = data[pos]
+      pos += 1
+      value |= (byte & 0x7f) << shift
+      shift += 7
+      if byte < 0x80:
+        break
+    self._pos = pos
+    return value
+
+  def svarint(self):
+    value = self.uvarint()
+    return (value >> 1) ^ -(value & 1)
+
+  def boolean(self):
+    value = self.uint8()
+    if value not in (0, 1):
+      raise ArgumentError("Invalid boolean value %d at offset %d" % (value, self._pos - 1))
+    return value == 1
+
+  def raw_bytes(self, length=None):
+    """Reads `length` bytes, returned as a memoryview of the input."""
+    if length is None:
+      raise ArgumentError("Cannot read raw_bytes of unknown length")
+    return self._take(length)
+
+  def raw_string(self, length):
+    return str(self._take(length), "utf8")
+
+  def string(self):
+    return self.raw_string(self.uvarint())
+
+  def hex_string(self, length=None):
+    return self.raw_bytes(length).hex()
+
+  def block_id(self):
+    return self.raw_bytes(self.block_id_size)
+
+  def checksum(self):
+    return self.raw_bytes(self.checksum_size)
+
+  def signature(self):
+    return self.hex_string(self.signature_size)
+
+  def time_point_sec(self):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(self.uint32()))
+
+  def array(self, itemtype):
+    item_reader = self._get_reader_fn(itemtype)
+    return [item_reader() for i in range(self.uvarint())]
+
+  def map(self, keytype, valuetype):
+    key_reader = self._get_reader_fn(keytype)
+    value_reader = self._get_reader_fn(valuetype)
+    result = []
+    for i in range(self.uvarint()):
+      k = key_reader()
+      result.append([k, value_reader()])
+    return result
+
+  def optional(self, underlyingtype):
+    if self.boolean():
+      return self._get_reader_fn(underlyingtype)()
+    return None
+
+  def fields(self, pairs):
+    result = {}
+    for name, fieldtype in pairs:
+      result[name] = self._get_reader_fn(fieldtype)()
+    return result
+
+  def public_key(self):
+    """Reads a public key as the 65 bytes of an uncompressed key, including the header byte."""
+    return b"\x04" + bytes(self._take(64))
+
+  def static_variant(self, variants):
+    i = self.uvarint()
+    if i >= len(variants):
+      raise ArgumentError("Unknown type for static variant (selector: %s)" % (i,))
+    variant_name, variant_def = variants[i]
+    return [variant_name, self._get_reader_fn(variant_def)()]
+
+  def extensions(self, variants):
+    return [self.static_variant(variants) for i in range(self.uvarint())]
+
+  def void(self):
+    raise ArgumentError("Cannot read a value of type void at offset %d" % (self._pos,))
+
+  def asset(self):
+    amount, prec, symbol = self._unpack(_ASSET)
+    symbol = symbol.rstrip(b"\0").decode("utf8")
+    if (symbol, prec) not in Serializer._allowed_symbol_prec:
+      raise ArgumentError("Unknown asset symbol %s with precision %d" % (symbol, prec))
+    return "%d.%0*d %s" % (amount // 10**prec, prec, amount % 10**prec, symbol)
+
+  _authority_fields = Serializer._authority_fields
+  _beneficiary_fields = Serializer._beneficiary_fields
+  _price_fields = Serializer._price_fields
+  _chain_properties_fields = Serializer._chain_properties_fields
+  _transaction_fields = Serializer._transaction_fields
+
+  # The unprefixed byte fields, whose lengths come from the constructor
+
+  _signed_block_header_fields = (
+      ( "previous", "block_id" ),
+      ( "timestamp", "time_point_sec" ),
+      ( "witness", "string" ),
+      ( "transaction_merkle_root", "checksum" ),
+      ( "extensions", lambda s, v: s.array(v, "void") ),
+      ( "witness_signature", "signature_bytes" )
+    )
+
+  _signed_transaction_fields = _transaction_fields + (
+      ( "signatures", lambda s, v: s.array(v, "signature") ),
+    )
+
+  _signed_block_fields = _signed_block_header_fields + (
+      ( "transactions", lambda s, v: s.array(v, "signed_transaction") ),
+    )
+
+  def signature_bytes(self):
+    return self.raw_bytes(self.signature_size)
+
+  def authority(self):
+    return self.read("authority")
+
+  def beneficiary(self):
+    return self.read("beneficiary")
+
+  def price(self):
+    return self.read("price")
+
+  def signed_block_header(self):
+    return self.read("signed_block_header")
+
+  def chain_properties(self):
+    return self.read("chain_properties")
+
+  def operation(self):
+    return self.read("operation")
+
+  def transaction(self):
+    return self.read("transaction")
+
+  def signed_transaction(self):
+    return self.read("signed_transaction")
+
+  def signed_block(self):
+    return self.read("signed_block")
@@ -0,0 +1,96 @@
+
+from simple_steem_client.serializer.serializer import Serializer
+
+import hashlib
+
+# The chain id of the STEEM main network
+STEEM_CHAIN_ID = bytes(32)
+
+# A transaction id is the first 20 bytes of the SHA-256 of the transaction
+TRANSACTION_ID_SIZE = 20
+
+def _chain_id_bytes(chain_id):
+  if type(chain_id) is str:
+    return bytes.fromhex(chain_id)
+  return bytes(chain_id)
+
+def transaction_digests(transactions, chain_id=STEEM_CHAIN_ID, serializer=None):
+  """Computes the digests to sign for many transactions.
+
+  All transactions are serialized into one reused buffer and hashed from it
+  without copying, and the chain id is hashed once for the whole batch.
+
+  Args:
+    transactions (iterable): Transactions, as accepted by `Serializer.transaction`.
+      Signatures, if present, are ignored.
+    chain_id (bytes): The chain id, as bytes or a hex string.
+    serializer (Serializer): A serializer to use, or None to create one.
+      It is reset before each transaction and on return.
+
+  Returns:
+    list: The 32-byte SHA-256 digest of the chain id and each transaction, in order.
+  """
+  if serializer is None:
+    serializer = Serializer(size=4096)
+  chain_hash = hashlib.sha256(_chain_id_bytes(chain_id))
+  encode = Serializer.compile("transaction")
+  result = []
+  try:
+    for tx in transactions:
+      serializer.reset()
+      encode(serializer, tx)
+      h = chain_hash.copy()
+      h.update(serializer.getbuffer())
+      result.append(h.digest())
+  finally:
+    serializer.reset()
+  return result
+
+def transaction_ids(transactions, serializer=None):
+  """Computes the ids of many transactions.
+
+  Args:
+    transactions (iterable): Transactions, as accepted by `Serializer.transaction`.
+      Signatures, if present, are ignored.
+    serializer (Serializer): A serializer to use, or None to create one.
+      It is reset before each transaction and on return.
+
+  Returns:
+    list: The id of each transaction as a hex string, as the API reports it, in order.
+  """
+  if serializer is None:
+    serializer = Serializer(size=4096)
+  encode = Serializer.compile("transaction")
+  result = []
+  try:
+    for tx in transactions:
+      serializer.reset()
+      encode(serializer, tx)
+      h = hashlib.sha256(serializer.getbuffer())
+      result.append(h.digest()[0:TRANSACTION_ID_SIZE].hex())
+  finally:
+    serializer.reset()
+  return result
+
+def transaction_digest(tx, chain_id=STEEM_CHAIN_ID):
+  """Computes the digest to sign for a transaction.
+
+  Args:
+    tx: The transaction, as accepted by `Serializer.transaction`.
+    chain_id (bytes): The chain id, as bytes or a hex string.
+
+  Returns:
+    bytes: The 32-byte SHA-256 digest of the chain id and the transaction.
+  """
+  return transaction_digests((tx,), chain_id)[0]
+
+def transaction_id(tx):
+  """Computes the id of a transaction.
+
+  Args:
+    tx: The transaction, as accepted by `Serializer.transaction`.
+
+  Returns:
+    str: The transaction id as a hex string.
+  """
+  return transaction_ids((tx,))[0]
@@ -1,11 +1,11 @@
 from simple_steem_client.serializer.operation_variants import operation_variants
 
-import math
 import time
 import datetime
 import calendar
 import types
 import re
+import struct
 
 NIF_FLOAT_64 = 0xfff0000000000000
 INF_FLOAT_64 = 0x7ff0000000000000
@@ -18,6 +18,17 @@ UINT64_MAX   = 0xFFFFFFFFFFFFFFFF
 
 BINARY64_RANGE = 2**53
 
+DEFAULT_MAX_SIZE = 2**26
+
+# Little-endian fixed-width encodings. Signed values are masked to their
+# two's complement and written unsigned, which also keeps the truncation
+# of out-of-range values the byte-wise encoders had.
+_UINT16 = struct.Struct("<H")
+_UINT32 = struct.Struct("<I")
+_UINT64 = struct.Struct("<Q")
+_FLOAT64 = struct.Struct("<d")
+_ASSET = struct.Struct("<QB7s")
+
 class ArgumentError(Exception):
     pass
 
@@ -57,9 +68,35 @@ class Serializer:
     - Variable-length sequences such as text strings, arrays, and maps are prefixed with a varint
       indicating their length.
   """
-  def __init__(self, size=65536):
-    self._data = bytearray(size)
+  def __init__(self, size=65536, max_size=DEFAULT_MAX_SIZE):
+    """
+    Args:
+      size (int): The initial size of the output buffer. It doubles as needed.
+      max_size (int): The largest output the buffer may grow to, or None for no limit.
+    """
+    self._data = bytearray(max(size, 1))
     self._pos = 0
+    self._max_size = max_size
+
+  def _grow(self, needed):
+    """Makes room for `needed` more bytes of output.
+
+    A new buffer is allocated rather than resizing the current one, so that
+    memoryviews handed out by `getbuffer` stay valid.
+    """
+    end = self._pos + needed
+    if end <= len(self._data):
+      return
+    if self._max_size is not None and end > self._max_size:
+      raise ArgumentError("Serializer output would exceed max_size (%d bytes)" % self._max_size)
+    size = len(self._data)
+    while size < end:
+      size *= 2
+    if self._max_size is not None:
+      size = min(size, self._max_size)
+    data = bytearray(size)
+    data[0:self._pos] = memoryview(self._data)[0:self._pos]
+    self._data = data
 
   def _get_prop(self, value, prop):
     if type(value) is dict:
@@ -77,50 +114,52 @@ class Serializer:
       return lambda v: self.fields(v, serializer_def)
 
   def _write_byte(self, value):
-    self._data[self._pos] = value
+    try:
+      self._data[self._pos] = value
+    except IndexError:
+      self._grow(1)
+      self._data[self._pos] = value
     self._pos += 1
     return 1
 
   def uint8(self, value):
     return self._write_byte(value)
 
+  def _pack(self, packer, *values):
+    pos = self._pos
+    size = packer.size
+    if pos + size > len(self._data):
+      self._grow(size)
+    packer.pack_into(self._data, pos, *values)
+    self._pos = pos + size
+    return size
+
   def uint16(self, value):
-    return self.uint8(value & 0xff) + self.uint8((value >> 8) & 0xff) 
+    return self._pack(_UINT16, value & UINT16_MAX)
 
   def uint32(self, value):
-    return self.uint16(value & 0xffff) + self.uint16((value >> 16) & 0xffff) 
+    return self._pack(_UINT32, value & UINT32_MAX)
 
   def uint64(self, value):
-    return self.uint32(value & 0xffffffff) + self.uint32((value >> 32) & 0xffffffff)
+    return self._pack(_UINT64, value & UINT64_MAX)
 
   def int8(self, value):
     return self.uint8(twos(value, 1))
 
   def int16(self, value):
-    return self.uint16(twos(value, 2))
+    return self._pack(_UINT16, value & UINT16_MAX)
 
   def int32(self, value):
-    return self.uint32(twos(value, 4))
+    return self._pack(_UINT32, value & UINT32_MAX)
 
   def int64(self, value):
-    return self.uint64(twos(value, 8)) 
-
-  def binary64(self, value): 
-    if math.isinf(value) and value < 0:
-      encoded_value = NIF_FLOAT_64
-    elif math.isinf(value):
-      encoded_value = INF_FLOAT_64
-    elif math.isnan(value):
-      encoded_value = NAN_FLOAT_64
-    else:
-      # frontmost bit: sign, next 11 bits: exponent, next 52 bits: mantissa
-      (mantissa_frac, exponent) = math.frexp(value)
-      mantissa = int(abs(mantissa_frac) * BINARY64_RANGE)
-      sign = 1 if value < 0 else 0
-      # convert exponent offset to IEEE-754 standard
-      exponent += 1022
-      encoded_value = (sign << 63) | ((exponent & 0x7ff) << 52) | (mantissa & 0xfffffffffffff)
-    return self.uint64(encoded_value)
+    return self._pack(_UINT64, value & UINT64_MAX)
+
+  def binary64(self, value):
+    if value != value:
+      # All NaNs are written as the canonical quiet NaN
+      return self._pack(_UINT64, NAN_FLOAT_64)
+    return self._pack(_FLOAT64, value)
 
   def uvarint(self, value):
     assert(value >= 0)
@@ -142,6 +181,8 @@ class Serializer:
 
   def raw_bytes(self, value):
     l = len(value)
+    if self._pos + l > len(self._data):
+      self._grow(l)
     self._data[self._pos:self._pos+l] = value
     self._pos += l
     return l
@@ -259,51 +300,67 @@ class Serializer:
     prec = len(ramount)
     assert( (symbol, prec) in self._allowed_symbol_prec )
 
-    encoded_symbol = bytearray(7)
-    encoded_symbol[0:len(symbol)] = symbol.encode("utf8")
-
     amount = int(ramount) + (10**prec) * int(lamount)
 
-    return self.uint64( amount ) + self.uint8( prec ) + self.raw_bytes( encoded_symbol )
+    # amount, precision, and the symbol zero-padded to 7 bytes
+    return self._pack(_ASSET, amount & UINT64_MAX, prec, symbol.encode("utf8"))
 
-  def authority(self, value):
-    return self.fields(value, (
+  # Field tables of the composite types.  A type "foo" with a table
+  # _foo_fields is compiled from it, see compile().
+
+  _authority_fields = (
       ( "weight_threshold", "uint32" ),
       ( "account_auths", lambda s, v: s.map(v, "string", "uint16") ),
       ( "key_auths", lambda s, v: s.map(v, "public_key", "uint16") )
-    ))
+    )
 
-  def beneficiary(self, value):
-    return self.fields(value, (
+  _beneficiary_fields = (
       ( "account", "string" ),
       ( "weight", "uint16" )
-    ))
+    )
 
-  def price(self, value):
-    return self.fields(value, (
+  _price_fields = (
       ( "base", "asset" ),
       ( "quote", "asset" )
-    ))
+    )
 
-  def signed_block_header(self, value):
-    return self.fields(value, (
+  _signed_block_header_fields = (
       ( "previous", "raw_bytes" ),
       ( "timestamp", "time_point_sec" ),
       ( "witness", "string" ),
       ( "transaction_merkle_root", "raw_bytes" ),
       ( "extensions", lambda s, v: s.array(v, "void") ),
       ( "witness_signature", "raw_bytes" )
-    ))
+    )
 
-  def chain_properties(self, value):
-    return self.fields(value, (
+  _chain_properties_fields = (
       ( "account_creation_fee", "asset" ),
       ( "maximum_block_size", "uint32" ),
       ( "sbd_interest_rate", "uint16" )
-    ))
+    )
+
+  # Static variant types, compiled like the field tables
+  _static_variant_types = {
+    "operation": operation_variants,
+  }
+
+  def authority(self, value):
+    return self.compile("authority")(self, value)
+
+  def beneficiary(self, value):
+    return self.compile("beneficiary")(self, value)
+
+  def price(self, value):
+    return self.compile("price")(self, value)
+
+  def signed_block_header(self, value):
+    return self.compile("signed_block_header")(self, value)
+
+  def chain_properties(self, value):
+    return self.compile("chain_properties")(self, value)
 
   def operation(self, value):
-    return self.static_variant(value, operation_variants)
+    return self.compile("operation")(self, value)
 
   _transaction_fields = (
       ( "ref_block_num", "uint16" ),
@@ -318,10 +375,37 @@ class Serializer:
     )
 
   def transaction(self, value):
-    return self.fields(value, self._transaction_fields)
+    return self.compile("transaction")(self, value)
+
+  _signed_block_fields = _signed_block_header_fields + (
+      ( "transactions", lambda s, v: s.array(v, "signed_transaction") ),
+    )
 
   def signed_transaction(self, value):
-    return self.fields(value, self._signed_transaction_fields)
+    return self.compile("signed_transaction")(self, value)
+
+  def signed_block(self, value):
+    return self.compile("signed_block")(self, value)
+
+  @classmethod
+  def compile(cls, serializer_def):
+    """Returns a specialized encoder for a type.
+
+    The encoder resolves the whole type definition once, so serializing
+    a value does no method lookups by name, creates no closures, and
+    builds no temporary lists.  Its output is identical to serializing
+    the value with the corresponding method.  Encoders of named types
+    are cached per class.
+
+    Args:
+      serializer_def: A type name such as "signed_transaction", a tuple of
+        (name, type) field pairs, or a function (s, v) as used in field tables.
+
+    Returns:
+      function: An encoder called as encoder(serializer, value), returning
+        the number of bytes written like the serializer's methods.
+    """
+    return _compile(cls, serializer_def)
 
   def flush(self):
     """Returns the serializer's output and resets the serializer.
@@ -332,17 +416,206 @@ class Serializer:
     Returns:
       bytes: The output of the serializer.
     """
-    result = bytes(self._data[0:self._pos])
+    result = bytes(memoryview(self._data)[0:self._pos])
     self._pos = 0
     return result
-  
+
   def flush_into(self, ba, offset=0):
     """Writes the serializer's output into `ba` and resets the serializer.
 
+    Successive calls with the returned offsets pack several outputs into one buffer.
+
     Args:
-      ba (bytearray): The buffer to write the serializer's output into.
-      offset (int): The offset at which to start writing into `ba`. 
+      ba (bytearray): The buffer to write the serializer's output into. Any
+        writable object supporting the buffer protocol, such as a memoryview, will do.
+      offset (int): The offset at which to start writing into `ba`.
+
+    Returns:
+      int: The offset in `ba` just past the output.
+
+    Raises:
+      ArgumentError: If the output does not fit in `ba` at `offset`.
     """
-    ba[offset:self._pos] = self._data[out_offset:self._pos]
+    end = offset + self._pos
+    if offset < 0 or end > len(ba):
+      raise ArgumentError("Serializer output (%d bytes) does not fit at offset %d" % (self._pos, offset))
+    ba[offset:end] = memoryview(self._data)[0:self._pos]
     self._pos = 0
+    return end
+
+  def getbuffer(self):
+    """Returns the serializer's output without copying it.
+
+    The memoryview shares memory with the serializer, so it is only valid
+    until the next write after a `flush` or `reset`. Copy it (e.g. with
+    `bytes()`) if it needs to outlive that.
+
+    Returns:
+      memoryview: The output written since the last flush or reset.
+    """
+    return memoryview(self._data)[0:self._pos]
+
+  def reset(self):
+    """Discards the serializer's output without returning it."""
+    self._pos = 0
+
+
+# Schema compilation
+#
+# Serializer.compile() turns type definitions into encoder functions
+# encoder(serializer, value).  Functions in field tables, such as
+# lambda s, v: s.array(v, "string"), are compiled by calling them with a
+# _SchemaRecorder in place of the serializer, which returns the encoder
+# for the call instead of serializing anything.  A function which does
+# anything else is called as it is for each value.
+
+_compiled_encoders = {}
+
+class _Compiled:
+  def __init__(self, encoder):
+    self.encoder = encoder
+
+_SCHEMA_VALUE = object()
+
+class _SchemaRecorder:
+  def __init__(self, cls):
+    self._cls = cls
+
+  def _check(self, value):
+    if value is not _SCHEMA_VALUE:
+      raise ArgumentError("Schema function passed a value of its own")
+
+  def array(self, value, itemtype):
+    self._check(value)
+    return _Compiled(_compile_array(self._cls, itemtype))
+
+  def map(self, value, keytype, valuetype):
+    self._check(value)
+    return _Compiled(_compile_map(self._cls, keytype, valuetype))
+
+  def optional(self, value, underlyingtype):
+    self._check(value)
+    return _Compiled(_compile_optional(self._cls, underlyingtype))
+
+  def fields(self, value, pairs):
+    self._check(value)
+    return _Compiled(_compile_fields(self._cls, pairs))
+
+  def static_variant(self, value, variants):
+    self._check(value)
+    return _Compiled(_compile_static_variant(self._cls, variants))
 
+  def extensions(self, value, variants):
+    self._check(value)
+    return _Compiled(_compile_array_of(self._cls, _compile_static_variant(self._cls, variants)))
+
+  def __getattr__(self, name):
+    def record(value):
+      self._check(value)
+      return _Compiled(_compile(self._cls, name))
+    return record
+
+def _compile(cls, serializer_def):
+  if type(serializer_def) is str:
+    key = (cls, serializer_def)
+    encoder = _compiled_encoders.get(key)
+    if encoder is None:
+      encoder = _compile_named(cls, serializer_def)
+      _compiled_encoders[key] = encoder
+    return encoder
+  elif type(serializer_def) is tuple:
+    return _compile_fields(cls, serializer_def)
+  elif type(serializer_def) is types.FunctionType:
+    try:
+      recorded = serializer_def(_SchemaRecorder(cls), _SCHEMA_VALUE)
+    except (ArgumentError, AttributeError, TypeError):
+      recorded = None
+    if isinstance(recorded, _Compiled):
+      return recorded.encoder
+    return serializer_def
+  raise ArgumentError("Cannot compile serializer definition %r" % (serializer_def,))
+
+def _compile_named(cls, name):
+  pairs = getattr(cls, "_" + name + "_fields", None)
+  if pairs is not None:
+    return _compile_fields(cls, pairs)
+  variants = cls._static_variant_types.get(name)
+  if variants is not None:
+    return _compile_static_variant(cls, variants)
+  encoder = getattr(cls, name, None)
+  if type(encoder) is not types.FunctionType:
+    raise ArgumentError("Unknown serializer type %r" % (name,))
+  return encoder
+
+def _compile_fields(cls, pairs):
+  compiled = tuple((name, _compile(cls, fieldtype)) for (name, fieldtype) in pairs)
+
+  def encode_fields(s, value):
+    bytes_written = 0
+    if type(value) is dict:
+      get = value.get
+      for name, encoder in compiled:
+        bytes_written += encoder(s, get(name))
+    else:
+      for name, encoder in compiled:
+        bytes_written += encoder(s, getattr(value, name, None))
+    return bytes_written
+  return encode_fields
+
+def _compile_array(cls, itemtype):
+  return _compile_array_of(cls, _compile(cls, itemtype))
+
+def _compile_array_of(cls, item_encoder):
+  uvarint = cls.uvarint
+
+  def encode_array(s, value):
+    bytes_written = uvarint(s, len(value))
+    for item in value:
+      bytes_written += item_encoder(s, item)
+    return bytes_written
+  return encode_array
+
+def _compile_map(cls, keytype, valuetype):
+  uvarint = cls.uvarint
+  key_encoder = _compile(cls, keytype)
+  value_encoder = _compile(cls, valuetype)
+
+  def encode_map(s, value):
+    bytes_written = uvarint(s, len(value))
+    if type(value) is dict:
+      iterator = value.items()
+    elif type(value) is list:
+      iterator = value
+    else:
+      raise ArgumentError("'map' serializer needs either a dict or a list of 2-tuples")
+    for k, v in iterator:
+      bytes_written += key_encoder(s, k) + value_encoder(s, v)
+    return bytes_written
+  return encode_map
+
+def _compile_optional(cls, underlyingtype):
+  uint8 = cls.uint8
+  underlying_encoder = _compile(cls, underlyingtype)
+
+  def encode_optional(s, value):
+    if value is None:
+      return uint8(s, 0)
+    return uint8(s, 1) + underlying_encoder(s, value)
+  return encode_optional
+
+def _compile_static_variant(cls, variants):
+  uvarint = cls.uvarint
+  table = {}
+  for i, (variant_name, variant_def) in enumerate(variants):
+    if variant_name not in table:
+      table[variant_name] = (i, _compile(cls, variant_def))
+
+  def encode_static_variant(s, value):
+    assert(type(value) in (list, tuple))
+    assert(len(value) == 2)
+    try:
+      i, encoder = table[value[0]]
+    except (KeyError, TypeError):
+      raise ArgumentError("Unknown type for static variant (selector: %s)" % (value[0],))
+    return uvarint(s, i) + encoder(s, value[1])
+  return encode_static_variant
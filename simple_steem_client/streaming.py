@@ -0,0 +1,101 @@
+# Block streaming on top of SteemInterface
+
+import time
+
+from simple_steem_client.client import SteemException, SteemRPCException
+
+def _fetch_range(steem, first, last, prefetch, range_size):
+    """
+    Yield (block_num, block) for first..last inclusive, keeping up to
+    prefetch requests in flight with SteemInterface.map().
+    """
+    if range_size is None:
+        items = ({"block_num": n} for n in range(first, last + 1))
+        results = steem.map(steem.block_api.get_block, items, workers=prefetch)
+        for block_num, result in zip(range(first, last + 1), results):
+            if isinstance(result, SteemException):
+                raise result
+            block = result.get("block")
+            if block is None:
+                raise SteemRPCException("Block {} not found".format(block_num))
+            yield block_num, block
+        return
+
+    starts = range(first, last + 1, range_size)
+    items = ({"starting_block_num": n, "count": min(range_size, last + 1 - n)} for n in starts)
+    results = steem.map(steem.block_api.get_block_range, items, workers=prefetch)
+    for start, result in zip(starts, results):
+        if isinstance(result, SteemException):
+            raise result
+        blocks = result.get("blocks", [])
+        if len(blocks) != min(range_size, last + 1 - start):
+            raise SteemRPCException("Incomplete block range starting at {}".format(start))
+        for i, block in enumerate(blocks):
+            yield start + i, block
+
+def stream_blocks(steem, start, end=None,
+    prefetch=16,
+    irreversible=True,
+    range_size=None,
+    poll_interval=0.5,
+    sleep_function=None,
+    ):
+    """
+    Generator yielding (block_num, block) in order, starting at block start.
+
+    While far behind the chain, blocks are fetched in bulk with up to
+    prefetch requests in flight.  Once the stream catches up it tails the
+    chain, polling every poll_interval seconds and yielding each new block
+    as soon as it is available.
+
+    Requires an appbase node.
+
+    :param steem:  SteemInterface
+    :param start:  First block number to yield
+    :param end:  Last block number to yield, or None to stream forever
+    :param prefetch:  Number of requests kept in flight during catch-up
+    :param irreversible:  If true, only yield blocks up to the last irreversible block,
+    otherwise follow the head block
+    :param range_size:  If set, catch up with block_api.get_block_range fetching this many
+    blocks per call, instead of one block_api.get_block call per block
+    :param poll_interval:  Seconds between polls when caught up with the chain
+    :param sleep_function:  time.sleep() or similar
+    """
+    if sleep_function is None:
+        sleep_function = time.sleep
+    next_block = start
+    while (end is None) or (next_block <= end):
+        dgpo = steem.database_api.get_dynamic_global_properties()
+        if irreversible:
+            target = dgpo["last_irreversible_block_num"]
+        else:
+            target = dgpo["head_block_number"]
+        if end is not None:
+            target = min(target, end)
+
+        if target - next_block >= prefetch:
+            # Bulk catch-up
+            for block_num, block in _fetch_range(steem, next_block, target, prefetch, range_size):
+                yield block_num, block
+            next_block = target + 1
+            continue
+
+        # Tailing: fetch whatever is available one block at a time
+        while next_block <= target:
+            block = steem.block_api.get_block(block_num=next_block).get("block")
+            if block is None:
+                break
+            yield next_block, block
+            next_block += 1
+        if (end is not None) and (next_block > end):
+            return
+
+        if (not irreversible) and (next_block > target):
+            # Poll for the next head block directly, saving a round trip
+            # per block compared to polling the global properties.
+            block = steem.block_api.get_block(block_num=next_block).get("block")
+            if block is not None:
+                yield next_block, block
+                next_block += 1
+                continue
+        sleep_function(poll_interval)
@@ -0,0 +1,95 @@
+# Per-phase latency breakdown of SteemRemoteBackend calls
+
+import collections
+import threading
+
+PHASES = (
+    # Encoding the JSON-RPC request
+    "encode",
+    # Waiting for the node's rate and concurrency limits
+    "queue",
+    # Opening a new connection, when the transport reports it
+    "connect",
+    # Sending the request until the response headers arrive
+    "wait",
+    # Reading and content-decoding the response body
+    "read",
+    # Time spent in attempts which failed
+    "failed",
+    # Sleeping between retry rounds
+    "retry_wait",
+    # Decoding the JSON-RPC response
+    "decode",
+    )
+
+class PhaseTracer(object):
+    """
+    Aggregate per-phase timings of calls by api.method.
+
+        tracer = PhaseTracer()
+        backend = SteemRemoteBackend(nodes=[...], tracer=tracer)
+        ...
+        print(tracer.report())
+
+    Like MetricsRegistry, the tracer is a post-call hook.  Each call's
+    timing record is the info dict passed to the hooks, whose "phases"
+    key maps phase names (see PHASES) to seconds.  The most recent record
+    is also available from backend.last_timing(), and is attached to
+    exceptions raised by rpc_call() as their timing attribute.
+
+    Percentiles are computed over the last window calls of each method.
+    """
+    def __init__(self, percentiles=(0.5, 0.9, 0.99), window=1000):
+        """
+        :param percentiles:  Percentiles reported by report(), as fractions
+        :param window:  Number of recent calls per method kept for the percentiles
+        """
+        self.percentiles = percentiles
+        self.window = window
+        # "api.method" -> phase -> deque of seconds
+        self._samples = {}
+        self._lock = threading.Lock()
+        return
+
+    def __call__(self, info):
+        name = info["api"] + "." + info["method"]
+        phases = info["phases"]
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = dict((phase, collections.deque(maxlen=self.window))
+                    for phase in PHASES + ("total",))
+                self._samples[name] = samples
+            for phase in PHASES:
+                samples[phase].append(phases.get(phase, 0.0))
+            samples["total"].append(info["latency"])
+        return
+
+    def report(self):
+        """
+        Return report[api_method][phase][percentile] = seconds, where
+        api_method is "api.method" and phase is one of PHASES or "total".
+        """
+        with self._lock:
+            snapshot = dict((name, dict((phase, list(values)) for phase, values in samples.items()))
+                for name, samples in self._samples.items())
+        result = {}
+        for name, samples in snapshot.items():
+            result[name] = dict((phase, self._percentiles(values))
+                for phase, values in samples.items())
+        return result
+
+    def _percentiles(self, values):
+        values.sort()
+        result = {}
+        for p in self.percentiles:
+            if values:
+                result[p] = values[min(int(p * len(values)), len(values) - 1)]
+            else:
+                result[p] = None
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+        return
@@ -0,0 +1,286 @@
+# Persistent HTTP/1.1 transport using http.client
+
+import collections
+import http.client
+import io
+import select
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+class PooledResponse(object):
+    """
+    Minimal file-like response returned by PooledHTTPTransport.
+
+    The body has already been read from the socket (http.client requires
+    this before a connection can be reused), so read() just hands out the
+    buffered bytes.  connect_time is the number of seconds spent opening
+    a new connection for the request, 0.0 if a pooled one was reused.
+    """
+    def __init__(self, url, status, reason, headers, body, connect_time=0.0):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._body = io.BytesIO(body)
+        self.connect_time = connect_time
+        return
+
+    def read(self, amt=None):
+        if amt is None:
+            return self._body.read()
+        return self._body.read(amt)
+
+    def getcode(self):
+        return self.status
+
+    def close(self):
+        self._body.close()
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+class PooledHTTPTransport(object):
+    """
+    Drop-in replacement for urllib.request.urlopen which keeps a bounded
+    pool of persistent HTTP/1.1 connections per node.
+
+    At most max_connections connections to a node are open at a time,
+    in use or idle.  A request to a node at the limit waits, up to its
+    timeout, for another request to release a connection, and raises
+    socket.timeout if none is released in time.
+
+    Usage:
+
+        transport = PooledHTTPTransport(max_connections=4)
+        backend = SteemRemoteBackend(nodes=[...], urlopen=transport)
+
+    Like urlopen, failures are reported as urllib.error.HTTPError for
+    non-2xx responses, urllib.error.URLError for connection problems, and
+    socket.timeout for timeouts, so SteemRemoteBackend's retry logic is
+    unchanged.
+    """
+    def __init__(self,
+        max_connections=8,
+        max_idle_time=30.0,
+        headers=None,
+        ssl_context=None,
+        clock=None,
+        ):
+        """
+        :param max_connections:  Maximum number of open connections per node, in use or idle
+        :param max_idle_time:  Idle connections older than this many seconds are closed instead of reused
+        :param headers:  Dict of extra headers to send with every request
+        :param ssl_context:  ssl.SSLContext used for https nodes, default context if None
+        :param clock:  time.monotonic() or similar
+        """
+        self.max_connections = max_connections
+        self.max_idle_time = max_idle_time
+        self.headers = collections.OrderedDict((
+            ("Content-Type", "application/json"),
+            ("Connection", "keep-alive"),
+            ))
+        if headers is not None:
+            self.headers.update(headers)
+        self.ssl_context = ssl_context
+        if clock is None:
+            clock = time.monotonic
+        self.clock = clock
+
+        # (scheme, host, port) -> deque of (connection, last_used)
+        self._pools = {}
+        # (scheme, host, port) -> number of open connections, in use or idle
+        self._open = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        return
+
+    def __call__(self, url, data=None, timeout=None):
+        extra_headers = {}
+        if isinstance(url, urllib.request.Request):
+            if data is None:
+                data = url.data
+            extra_headers = dict((k.title(), v) for k, v in url.header_items())
+            url = url.full_url
+
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise urllib.error.URLError("Unsupported URL scheme {!r}".format(parts.scheme))
+        port = parts.port
+        if port is None:
+            port = 443 if parts.scheme == "https" else 80
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        headers = dict(self.headers)
+        headers.update(extra_headers)
+        headers["Host"] = parts.netloc
+        method = "GET" if data is None else "POST"
+
+        conn, reused = self._acquire(key, timeout)
+        connect_time = 0.0
+        try:
+            try:
+                if not reused:
+                    connect_time = self._connect(conn)
+                resp = self._roundtrip(conn, method, path, data, headers)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection between
+                # our staleness check and the request, try a fresh one.
+                self._discard(key, conn)
+                conn = None
+                conn, reused = self._acquire(key, timeout, fresh=True)
+                connect_time = self._connect(conn)
+                resp = self._roundtrip(conn, method, path, data, headers)
+            body = resp.read()
+        except socket.timeout:
+            self._discard(key, conn)
+            raise
+        except (http.client.HTTPException, OSError) as e:
+            self._discard(key, conn)
+            raise urllib.error.URLError(e)
+        except BaseException:
+            self._discard(key, conn)
+            raise
+
+        if resp.will_close:
+            self._discard(key, conn)
+        else:
+            self._release(key, conn)
+
+        if not (200 <= resp.status < 300):
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.msg, io.BytesIO(body))
+        return PooledResponse(url, resp.status, resp.reason, resp.msg, body, connect_time)
+
+    def _connect(self, conn):
+        # Connect explicitly rather than on the first request, so the time
+        # spent on DNS, TCP and TLS can be reported separately.
+        start_time = time.monotonic()
+        conn.connect()
+        return time.monotonic() - start_time
+
+    def _roundtrip(self, conn, method, path, data, headers):
+        conn.request(method, path, body=data, headers=headers)
+        return conn.getresponse()
+
+    def _new_connection(self, key, timeout):
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=self.ssl_context)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def _acquire(self, key, timeout, fresh=False):
+        """
+        Return (connection, reused) for the given node, reusing an idle
+        connection if a live one is available.  If max_connections are
+        open, idle ones are closed to make room for a fresh connection,
+        and otherwise this waits up to timeout for one to be released.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        conn = None
+        stale = []
+        with self._lock:
+            while True:
+                now = self.clock()
+                pool = self._pools.get(key)
+                while pool and not fresh:
+                    candidate, last_used = pool.pop()
+                    self._open[key] -= 1
+                    if (now - last_used > self.max_idle_time) or self._is_closed(candidate):
+                        stale.append(candidate)
+                        continue
+                    self._open[key] += 1
+                    conn = candidate
+                    break
+                if conn is not None:
+                    break
+                if pool and (self._open[key] >= self.max_connections):
+                    stale.append(pool.popleft()[0])
+                    self._open[key] -= 1
+                if self._open.get(key, 0) < self.max_connections:
+                    self._open[key] = self._open.get(key, 0) + 1
+                    break
+                wait_time = None
+                if deadline is not None:
+                    wait_time = deadline - time.monotonic()
+                    if wait_time <= 0:
+                        raise socket.timeout("timed out waiting for a pooled connection")
+                self._released.wait(wait_time)
+        for c in stale:
+            c.close()
+        if conn is None:
+            return self._new_connection(key, timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, key, conn):
+        with self._lock:
+            self._pools.setdefault(key, collections.deque()).append((conn, self.clock()))
+            self._released.notify()
+        return
+
+    def _discard(self, key, conn):
+        if conn is None:
+            return
+        conn.close()
+        with self._lock:
+            self._open[key] -= 1
+            self._released.notify()
+        return
+
+    @staticmethod
+    def _is_closed(conn):
+        # An idle HTTP/1.1 connection should have nothing to read.  If the
+        # socket is readable, the server has either closed it (EOF) or sent
+        # something we did not ask for; either way it cannot be reused.
+        # poll() is used where available since select() cannot watch
+        # descriptors above FD_SETSIZE.
+        sock = conn.sock
+        if sock is None:
+            return True
+        try:
+            if hasattr(select, "poll"):
+                poller = select.poll()
+                poller.register(sock, select.POLLIN)
+                return len(poller.poll(0)) > 0
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return len(readable) > 0
+
+    def idle_connections(self):
+        """
+        Return a dict mapping (scheme, host, port) to the number of idle
+        pooled connections.
+        """
+        with self._lock:
+            return dict((key, len(pool)) for key, pool in self._pools.items())
+
+    def close(self):
+        """
+        Close all idle pooled connections.
+        """
+        with self._lock:
+            pools = self._pools
+            self._pools = {}
+            for key, pool in pools.items():
+                self._open[key] -= len(pool)
+            self._released.notify_all()
+        for pool in pools.values():
+            for conn, last_used in pool:
+                conn.close()
+        return
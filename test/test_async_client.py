@@ -0,0 +1,87 @@
+
+import asyncio
+import threading
+import unittest
+
+from simple_steem_client.client import SteemHTTPError, SteemIllegalArgument, SteemRPCException
+from simple_steem_client.async_client import AsyncSteemRemoteBackend, AsyncSteemInterface
+from simple_steem_client.hedging import HedgePolicy
+from simple_steem_client.limiter import NodeLimiter
+from simple_steem_client.metrics import MetricsRegistry
+from simple_steem_client.tracing import PhaseTracer
+from test.test_transport import ThreadedHTTPServer, EchoHandler
+
+class TestAsyncSteemRemoteBackend(unittest.TestCase):
+
+  def setUp(self):
+    self.server = ThreadedHTTPServer(("127.0.0.1", 0), EchoHandler)
+    self.server.connections = set()
+    self.thread = threading.Thread(target=self.server.serve_forever)
+    self.thread.daemon = True
+    self.thread.start()
+    self.url = "http://127.0.0.1:{}/".format(self.server.server_address[1])
+    self.loop = asyncio.new_event_loop()
+    self.backend = AsyncSteemRemoteBackend(nodes=[self.url], appbase=True, max_retries=0,
+      max_concurrency_per_node=4)
+    self.steem = AsyncSteemInterface(self.backend)
+
+  def tearDown(self):
+    self.backend.close()
+    self.loop.close()
+    self.server.shutdown()
+    self.server.server_close()
+
+  def run_async(self, coro):
+    return self.loop.run_until_complete(coro)
+
+  def test_call(self):
+    self.assertEqual(self.run_async(self.steem.block_api.echo(block_num=7)), {"block_num": 7})
+
+  def test_concurrent_calls(self):
+    async def many():
+      return await asyncio.gather(*[self.steem.block_api.echo(i=i) for i in range(20)])
+    self.assertEqual(self.run_async(many()), [{"i": i} for i in range(20)])
+    self.assertLessEqual(len(self.server.connections), 4)
+
+  def test_http_error(self):
+    with self.assertRaises(SteemHTTPError):
+      self.run_async(self.steem.block_api.fail())
+
+  def test_map(self):
+    results = self.run_async(self.steem.map(self.steem.a_api.echo, ({"i": i} for i in range(20)), workers=3))
+    self.assertEqual(results, [{"i": i} for i in range(20)])
+    self.assertLessEqual(len(self.server.connections), 3)
+    errors = self.run_async(self.steem.map("a_api.fail", [{}, {}]))
+    self.assertEqual(len(errors), 2)
+    for e in errors:
+      self.assertIsInstance(e, SteemHTTPError)
+
+  def test_batch(self):
+    async def batch():
+      async with self.steem.batch() as b:
+        r1 = b.a_api.echo(x=1)
+        r2 = b.a_api.echo(x=2)
+      return r1.result(), r2.result()
+    self.assertEqual(self.run_async(batch()), ({"x": 1}, {"x": 2}))
+
+  def test_instrumentation(self):
+    metrics = MetricsRegistry()
+    tracer = PhaseTracer()
+    backend = AsyncSteemRemoteBackend(nodes=[self.url], appbase=True, max_retries=0,
+      metrics=metrics, tracer=tracer)
+    steem = AsyncSteemInterface(backend)
+    self.run_async(steem.block_api.echo(x=1))
+    with self.assertRaises(SteemHTTPError):
+      self.run_async(steem.block_api.fail())
+    backend.close()
+    text = metrics.to_prometheus()
+    self.assertIn('steem_rpc_calls_total{api="block_api",method="echo",node="%s"} 1' % self.url, text)
+    self.assertIn("wait", tracer.report()["block_api.echo"])
+
+  def test_limiter_rejected(self):
+    with self.assertRaises(SteemIllegalArgument):
+      AsyncSteemRemoteBackend(nodes=[self.url], limiter=NodeLimiter())
+
+  def test_hedge_policy_rejected(self):
+    with self.assertRaises(SteemIllegalArgument):
+      AsyncSteemRemoteBackend(nodes=[self.url], hedge_policy=HedgePolicy(delay=0.1))
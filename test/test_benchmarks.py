@@ -0,0 +1,43 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmarks import run
+
+def result(calls_per_second, p50):
+  return {"calls_per_second": calls_per_second, "latency": {"p50": p50}}
+
+class TestBenchmarks(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def test_main(self):
+    path = os.path.join(self.dir, "results.json")
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+      status = run.main(["--count", "10", "--repeat", "1", "--warmup", "0",
+        "--workloads", "sequential", "--transports", "pooled",
+        "--calls", "get_dynamic_global_properties", "--output", path, "--compare", path])
+    self.assertEqual(status, 0)
+    with open(path, "r") as f:
+      results = json.load(f)["results"]
+    self.assertEqual(results["sequential/get_dynamic_global_properties/pooled"]["calls"], 10)
+    self.assertIn("throughput    +0.0%", out.getvalue())
+
+  def test_compare_missing_values(self):
+    old = {"results": {"a": result(None, 0.001), "b": result(0.0, 0.0)}}
+    new = {"results": {"a": result(100.0, 0.002), "b": result(50.0, None)}}
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+      run.compare(old, new)
+    lines = out.getvalue().splitlines()
+    self.assertIn("throughput      n/a  p50  +100.0%", lines[0])
+    self.assertIn("throughput      n/a  p50      n/a", lines[1])
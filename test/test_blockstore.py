@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from simple_steem_client.blockstore import BlockStore, BlockStoreBackend
+from simple_steem_client.client import SteemException, SteemInterface
+from test.test_client import make_backend
+from test.test_streaming import FakeChain
+
+class TestBlockStore(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def test_put_get(self):
+    with BlockStore(self.dir, writable=True) as store:
+      self.assertIsNone(store.get(5))
+      store.put(5, {"b": 1, "a": [5]})
+      store.put(1000000, b'{"n":1000000}')
+      self.assertEqual(store.get(5), b'{"b":1,"a":[5]}')
+      self.assertEqual(list(store.get_block(5).keys()), ["b", "a"])
+      self.assertEqual(store.get_block(1000000), {"n": 1000000})
+      self.assertNotIn(6, store)
+      self.assertIsNone(store.get(-1))
+
+  def test_reader_sees_writes(self):
+    reader = BlockStore(self.dir)
+    self.assertIsNone(reader.get(1))
+    with BlockStore(self.dir, writable=True) as writer:
+      writer.put(1, {"n": 1})
+      self.assertEqual(reader.get_block(1), {"n": 1})
+      writer.put(2, {"n": 2})
+      self.assertEqual(reader.get_block(2), {"n": 2})
+    reader.close()
+
+  def test_misses_do_not_remap(self):
+    with BlockStore(self.dir, writable=True) as writer:
+      writer.put(100, {"n": 100})
+      reader = BlockStore(self.dir)
+      index_map, data_map = reader._index_map, reader._data_map
+      for n in list(range(100)) + list(range(101, 200)):
+        self.assertIsNone(reader.get(n))
+      self.assertIs(reader._index_map, index_map)
+      self.assertIs(reader._data_map, data_map)
+      # A write inside the mapped index shows through without a remap
+      writer.put(50, {"n": 50})
+      self.assertEqual(reader.get_block(50), {"n": 50})
+      self.assertIs(reader._index_map, index_map)
+      writer.put(150, {"n": 150})
+      self.assertEqual(reader.get_block(150), {"n": 150})
+      reader.close()
+
+  def test_put_once(self):
+    with BlockStore(self.dir, writable=True) as store:
+      store.put(5, {"n": 5})
+      store.put(5, {"n": 6})
+      self.assertEqual(store.get_block(5), {"n": 5})
+      self.assertEqual(os.path.getsize(store.data_path), len(b'{"n":5}'))
+
+  def test_single_writer(self):
+    with BlockStore(self.dir, writable=True):
+      with self.assertRaises(SteemException):
+        BlockStore(self.dir, writable=True)
+
+  def test_torn_index_entry(self):
+    with BlockStore(self.dir, writable=True) as store:
+      store.put(3, {"n": 3})
+    with open(os.path.join(self.dir, "blocks.idx"), "r+b") as f:
+      f.seek(3 * 16)
+      f.write(b"\x01")
+    self.assertIsNone(BlockStore(self.dir).get(3))
+
+class FailingBackend:
+  def __init__(self):
+    self.calls = 0
+
+  def rpc_call(self, api="", method="", method_args=None, method_kwargs=None):
+    self.calls += 1
+    raise KeyError("blocks")
+
+class TestBlockStoreBackend(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.store = BlockStore(self.dir, writable=True)
+
+  def tearDown(self):
+    self.store.close()
+    shutil.rmtree(self.dir)
+
+  def test_get_block(self):
+    chain = FakeChain(head=20, lib=10)
+    node, backend = make_backend(chain)
+    steem = SteemInterface(BlockStoreBackend(backend, self.store))
+    for n in (5, 15, 5, 15):
+      self.assertEqual(steem.block_api.get_block(block_num=n), {"block": {"n": n}})
+    self.assertEqual(chain.calls.count("get_block"), 3)
+    self.assertIn(5, self.store)
+    self.assertNotIn(15, self.store)
+
+  def test_get_block_range(self):
+    chain = FakeChain(head=30, lib=30)
+    node, backend = make_backend(chain)
+    steem = SteemInterface(BlockStoreBackend(backend, self.store))
+    self.assertEqual(steem.block_api.get_block_range(starting_block_num=1, count=10)["blocks"][9], {"n": 10})
+    # Served from disk by a new process
+    reader = SteemInterface(BlockStoreBackend(backend, BlockStore(self.dir)))
+    self.assertEqual(reader.block_api.get_block(block_num=7), {"block": {"n": 7}})
+    self.assertEqual(len(reader.block_api.get_block_range(starting_block_num=2, count=9)["blocks"]), 9)
+    self.assertEqual(chain.calls.count("get_block_range"), 1)
+    self.assertEqual(chain.calls.count("get_block"), 0)
+
+  def test_backend_error_not_retried(self):
+    failing = FailingBackend()
+    backend = BlockStoreBackend(failing, self.store)
+    with self.assertRaises(KeyError):
+      backend.rpc_call("block_api", "get_block_range", method_kwargs={"starting_block_num": 1, "count": 2})
+    self.assertEqual(failing.calls, 1)
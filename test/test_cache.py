@@ -0,0 +1,78 @@
+
+import json
+import unittest
+
+from simple_steem_client.client import DECODE_RAW, SteemInterface, request_key
+from simple_steem_client.cache import CachingBackend, TTL
+from test.test_client import make_backend
+from test.test_node_selector import FakeClock
+from test.test_streaming import FakeChain
+
+class TestCachingBackend(unittest.TestCase):
+
+  def setUp(self):
+    self.chain = FakeChain(head=120, lib=100)
+    self.node, backend = make_backend(self.chain)
+    self.clock = FakeClock()
+    self.cache = CachingBackend(backend, clock=self.clock)
+    self.steem = SteemInterface(self.cache)
+
+  def test_request_key(self):
+    self.assertEqual(request_key("a", "m", method_kwargs={"x": 1, "y": 2}), request_key("a", "m", method_kwargs={"y": 2, "x": 1}))
+    self.assertEqual(request_key("a", "m", method_args=[]), request_key("a", "m", method_kwargs={}))
+    self.assertNotEqual(request_key("a", "m", method_args=[1]), request_key("a", "m", method_args=[2]))
+
+  def test_irreversible_blocks_cached(self):
+    self.steem.block_api.get_block(block_num=50)
+    self.steem.block_api.get_block(block_num=50)
+    self.steem.block_api.get_block(block_num=110)
+    self.steem.block_api.get_block(block_num=110)
+    self.assertEqual(self.chain.calls.count("get_block"), 3)
+    self.assertEqual(self.chain.calls.count("get_dynamic_global_properties"), 1)
+    self.assertEqual(self.cache.stats()["hits"], 1)
+    self.assertEqual(self.cache.stats()["misses"], 3)
+
+  def test_raw_results(self):
+    chain = FakeChain(head=120, lib=100)
+    node, backend = make_backend(chain, decode_mode=DECODE_RAW)
+    cache = CachingBackend(backend, clock=self.clock)
+    steem = SteemInterface(cache)
+    first = steem.block_api.get_block(block_num=50)
+    second = steem.block_api.get_block(block_num=50)
+    self.assertIsInstance(second, memoryview)
+    self.assertEqual(bytes(first), bytes(second))
+    self.assertEqual(json.loads(bytes(second).decode("utf-8")), {"block": {"n": 50}})
+    self.assertEqual(chain.calls.count("get_block"), 1)
+    self.assertEqual(cache.stats()["bytes"], len(second))
+
+  def test_lib_learned_from_dgpo(self):
+    self.chain.lib = 115
+    self.steem.database_api.get_dynamic_global_properties()
+    self.steem.block_api.get_block(block_num=110)
+    self.steem.block_api.get_block(block_num=110)
+    self.assertEqual(self.chain.calls.count("get_dynamic_global_properties"), 1)
+    self.assertEqual(self.chain.calls.count("get_block"), 1)
+
+  def test_ttl(self):
+    self.cache.policies["database_api.get_dynamic_global_properties"] = TTL(3.0)
+    self.steem.database_api.get_dynamic_global_properties()
+    self.steem.database_api.get_dynamic_global_properties()
+    self.clock.now = 3.5
+    self.steem.database_api.get_dynamic_global_properties()
+    self.assertEqual(self.chain.calls.count("get_dynamic_global_properties"), 2)
+
+  def test_lru_eviction(self):
+    self.cache.max_entries = 2
+    for n in (1, 2, 1, 3, 1, 2):
+      self.steem.block_api.get_block(block_num=n)
+    stats = self.cache.stats()
+    self.assertEqual(stats["entries"], 2)
+    self.assertEqual(stats["evictions"], 2)
+    self.assertEqual(stats["hits"], 2)
+
+  def test_byte_limit(self):
+    self.cache.max_bytes = 30
+    self.steem.block_api.get_block(block_num=1)
+    self.steem.block_api.get_block(block_num=2)
+    self.assertLessEqual(self.cache.stats()["bytes"], 30)
+    self.assertEqual(self.cache.stats()["entries"], 1)
@@ -0,0 +1,421 @@
+
+import collections
+import http.client
+import io
+import json
+import socket
+import threading
+import time
+import unittest
+
+from simple_steem_client.client import (
+  SteemRemoteBackend,
+  SteemInterface,
+  SteemRPCException,
+  SteemNetworkError,
+  DECODE_DICT,
+  DECODE_RAW,
+  fast_json_loads,
+  raw_json_members,
+  raw_json_result,
+  )
+from simple_steem_client.hedging import HedgePolicy
+from simple_steem_client.metrics import MetricsRegistry
+from simple_steem_client.tracing import PhaseTracer
+from simple_steem_client.node_selector import RoundRobinSelector
+
+class FakeResponse(io.BytesIO):
+  pass
+
+class FakeNode:
+  """urlopen replacement which answers JSON-RPC requests with handler(api, method, args)."""
+
+  def __init__(self, handler):
+    self.handler = handler
+    self.requests = []
+    self.fail_next = 0
+    self.fail_urls = set()
+    self.drop = set()
+
+  def answer(self, req):
+    api, method, args = req["params"]
+    try:
+      return {"jsonrpc": "2.0", "id": req["id"], "result": self.handler(api, method, args)}
+    except Exception as e:
+      return {"jsonrpc": "2.0", "id": req["id"], "error": {"message": str(e)}}
+
+  def __call__(self, url, data, timeout):
+    self.requests.append((url, data))
+    if self.fail_next > 0 or url in self.fail_urls:
+      self.fail_next = max(self.fail_next - 1, 0)
+      raise socket.timeout("timed out")
+    req = json.loads(data.decode("ascii"))
+    if isinstance(req, list):
+      resp = [self.answer(r) for r in req if r["params"][1] not in self.drop]
+      self.drop = set()
+    else:
+      resp = self.answer(req)
+    return FakeResponse(json.dumps(resp).encode("utf-8"))
+
+def echo(api, method, args):
+  if method == "fail" or "fail" in args:
+    raise ValueError("failed")
+  return args
+
+def make_backend(handler=echo, **kwargs):
+  node = FakeNode(handler)
+  kwargs.setdefault("nodes", ["http://node-a/"])
+  backend = SteemRemoteBackend(urlopen=node, appbase=True, sleep_function=lambda t: None, **kwargs)
+  return node, backend
+
+class TestRpcCall(unittest.TestCase):
+
+  def test_call(self):
+    node, backend = make_backend()
+    steem = SteemInterface(backend)
+    self.assertEqual(steem.block_api.get_block(block_num=5), {"block_num": 5})
+    self.assertEqual(
+      node.requests[0][1],
+      b'{"id":0,"jsonrpc":"2.0","method":"call","params":["block_api","get_block",{"block_num":5}]}')
+
+  def test_retry(self):
+    node, backend = make_backend(max_retries=2)
+    node.fail_next = 2
+    self.assertEqual(backend.rpc_call("a_api", "m", method_kwargs={"x": 1}), {"x": 1})
+    node.fail_next = 3
+    with self.assertRaises(SteemNetworkError):
+      backend.rpc_call("a_api", "m", method_kwargs={"x": 1})
+
+  def test_rpc_error(self):
+    node, backend = make_backend()
+    with self.assertRaises(SteemRPCException):
+      backend.rpc_call("a_api", "fail", method_kwargs={})
+
+  def test_request_encoder_matches_full_encode(self):
+    node, backend = make_backend()
+    for api, method, args in [
+      ("a_api", "m", {}),
+      ("condenser_api", "get_block", [1]),
+      ("a_api", "m\u00e9\"", {"z": [1, 2.5, None, True], "a": {"y": "\u263a", "b": "x\\n"}}),
+      ]:
+      encode = backend._request_encoder(api, method, args)
+      for req_id in (0, 7, -3, 2**70, 1.5):
+        self.assertEqual(encode(req_id), backend._encode_request(api, method, args, req_id).encode("ascii"))
+
+  def test_custom_encoder_not_templated(self):
+    encoder = json.JSONEncoder(separators=(", ", ": "))
+    node, backend = make_backend(json_encoder=encoder)
+    backend.rpc_call("a_api", "m", method_kwargs={"x": 1})
+    self.assertIn(b'"jsonrpc": "2.0"', node.requests[0][1])
+
+class TestBatch(unittest.TestCase):
+
+  def test_rpc_batch(self):
+    node, backend = make_backend(max_batch_size=2)
+    calls = [dict(api="a_api", method="m", method_kwargs={"i": i}) for i in range(5)]
+    calls[3]["method"] = "fail"
+    results = backend.rpc_batch(calls)
+    self.assertEqual(len(node.requests), 3)
+    self.assertEqual(results[0:3], [{"i": 0}, {"i": 1}, {"i": 2}])
+    self.assertIsInstance(results[3], SteemRPCException)
+    self.assertEqual(results[4], {"i": 4})
+
+  def test_retry_missing_entries(self):
+    node, backend = make_backend()
+    node.drop = set(["m2"])
+    calls = [dict(api="a_api", method="m{}".format(i), method_kwargs={"i": i}) for i in range(4)]
+    self.assertEqual(backend.rpc_batch(calls), [{"i": i} for i in range(4)])
+    retried = json.loads(node.requests[1][1].decode("ascii"))
+    self.assertEqual([r["params"][1] for r in retried], ["m2"])
+
+  def test_interface_batch(self):
+    node, backend = make_backend()
+    steem = SteemInterface(backend)
+    with steem.batch() as b:
+      r1 = b.block_api.get_block(block_num=1)
+      r2 = b.block_api.fail()
+      r3 = b.database_api.get_config()
+    self.assertEqual(len(node.requests), 1)
+    self.assertEqual(r1.result(), {"block_num": 1})
+    with self.assertRaises(SteemRPCException):
+      r2.result()
+    self.assertEqual(r3.result(), {})
+    self.assertIsInstance(b.results[1], SteemRPCException)
+
+class TestMap(unittest.TestCase):
+
+  def test_map_in_order(self):
+    node, backend = make_backend(nodes=["http://node-a/", "http://node-b/"])
+    steem = SteemInterface(backend)
+    items = [{"i": i} for i in range(50)]
+    items[7] = {"i": 7, "fail": True}
+    results = list(steem.map(steem.block_api.get_block, items, workers=4))
+    self.assertEqual(len(results), 50)
+    self.assertIsInstance(results[7], SteemRPCException)
+    self.assertEqual(results[:7] + results[8:], [{"i": i} for i in range(50) if i != 7])
+    self.assertEqual(set(url for url, data in node.requests), set(["http://node-a/", "http://node-b/"]))
+
+  def test_map_fails_over_from_dead_node(self):
+    node, backend = make_backend(nodes=["http://node-a/", "http://node-b/"])
+    node.fail_urls.add("http://node-b/")
+    steem = SteemInterface(backend)
+    results = list(steem.map(steem.block_api.get_block, ({"i": i} for i in range(20)), workers=4))
+    self.assertEqual(results, [{"i": i} for i in range(20)])
+    self.assertEqual(backend.node_stats()["http://node-b/"]["state"], "open")
+
+  def test_map_method_name(self):
+    node, backend = make_backend()
+    steem = SteemInterface(backend)
+    results = list(steem.map("block_api.get_block", ({"i": i} for i in range(3)), workers=2))
+    self.assertEqual(results, [{"i": 0}, {"i": 1}, {"i": 2}])
+
+class TestNodeSelection(unittest.TestCase):
+
+  def test_failover_without_sleep(self):
+    sleeps = []
+    node = FakeNode(echo)
+    node.fail_urls.add("http://node-a/")
+    backend = SteemRemoteBackend(nodes=["http://node-a/", "http://node-b/"], urlopen=node,
+      appbase=True, sleep_function=sleeps.append)
+    for i in range(3):
+      self.assertEqual(backend.rpc_call("a_api", "m", method_kwargs={"i": i}), {"i": i})
+    self.assertEqual(sleeps, [])
+    stats = backend.node_stats()
+    self.assertGreater(stats["http://node-a/"]["failures"], 0)
+    self.assertEqual(stats["http://node-b/"]["failures"], 0)
+    self.assertEqual(backend.nodes[backend.current_node], "http://node-b/")
+
+  def test_sleep_when_all_nodes_fail(self):
+    sleeps = []
+    node = FakeNode(echo)
+    node.fail_next = 4
+    backend = SteemRemoteBackend(nodes=["http://node-a/", "http://node-b/"], urlopen=node,
+      appbase=True, sleep_function=sleeps.append, min_timeout=1.0, timeout_backoff=1.0)
+    self.assertEqual(backend.rpc_call("a_api", "m", method_kwargs={}), {})
+    self.assertEqual(sleeps, [1.0, 2.0])
+
+  def test_connection_errors_fail_over(self):
+    node = FakeNode(echo)
+    errors = [ConnectionResetError(104, "Connection reset by peer"),
+      http.client.RemoteDisconnected("Remote end closed connection without response")]
+    def urlopen(url, data, timeout):
+      if url == "http://node-a/":
+        raise errors.pop(0)
+      return node(url, data, timeout)
+    backend = SteemRemoteBackend(nodes=["http://node-a/", "http://node-b/"], urlopen=urlopen,
+      appbase=True, node_selector=RoundRobinSelector(), sleep_function=lambda t: None)
+    for i in range(2):
+      backend.node_selector._counter = 0
+      self.assertEqual(backend.rpc_call("a_api", "m", method_kwargs={"i": i}), {"i": i})
+    self.assertEqual(backend.node_stats()["http://node-a/"]["failures"], 2)
+
+  def test_unexpected_error_clears_probe(self):
+    clock = [0.0]
+    selector = RoundRobinSelector(failure_threshold=1, reset_timeout=10.0, clock=lambda: clock[0])
+    def urlopen(url, data, timeout):
+      raise ValueError("bad response")
+    backend = SteemRemoteBackend(nodes=["http://node-a/"], urlopen=urlopen,
+      appbase=True, node_selector=selector)
+    selector.record_failure("http://node-a/")
+    clock[0] = 10.0
+    with self.assertRaises(ValueError):
+      backend.rpc_call("a_api", "m", method_kwargs={})
+    self.assertEqual(selector.stats()["http://node-a/"]["state"], "open")
+    clock[0] = 20.0
+    self.assertEqual(selector.select(backend.nodes), "http://node-a/")
+    self.assertEqual(selector.stats()["http://node-a/"]["state"], "half_open")
+
+class TestHedging(unittest.TestCase):
+
+  def make_slow_backend(self, policy):
+    node = FakeNode(echo)
+    def urlopen(url, data, timeout):
+      if url == "http://slow/":
+        time.sleep(0.3)
+      return node(url, data, timeout)
+    selector = RoundRobinSelector()
+    backend = SteemRemoteBackend(nodes=["http://slow/", "http://fast/"], urlopen=urlopen,
+      appbase=True, node_selector=selector, hedge_policy=policy)
+    return node, backend
+
+  def test_hedge_wins(self):
+    policy = HedgePolicy(delay=0.02)
+    node, backend = self.make_slow_backend(policy)
+    start = time.monotonic()
+    self.assertEqual(backend.rpc_call("a_api", "m", method_kwargs={"x": 1}), {"x": 1})
+    self.assertLess(time.monotonic() - start, 0.25)
+    self.assertEqual(policy.stats()["hedges_won"], 1)
+
+  def test_abandoned_attempt_not_recorded(self):
+    policy = HedgePolicy(delay=0.02)
+    node, backend = self.make_slow_backend(policy)
+    calls = []
+    backend.post_call_hooks.append(calls.append)
+    backend.rpc_call("a_api", "m", method_kwargs={})
+    self.assertEqual([a["node"] for a in calls[0]["attempts"]], ["http://fast/"])
+    # The slow primary finishing later leaves the ended call alone
+    time.sleep(0.4)
+    self.assertEqual(len(calls[0]["attempts"]), 1)
+
+  def test_budget_limits_hedges(self):
+    policy = HedgePolicy(delay=0.02, budget_ratio=0.0, max_tokens=1.0)
+    node, backend = self.make_slow_backend(policy)
+    backend.rpc_call("a_api", "m", method_kwargs={})
+    backend.node_selector._counter = 0
+    backend.rpc_call("a_api", "m", method_kwargs={})
+    self.assertEqual(policy.stats()["hedges_sent"], 1)
+
+  def test_no_hedges_under_concurrency(self):
+    # More concurrent callers than hedge executor threads:  primaries
+    # waiting for a thread must not count as slow
+    policy = HedgePolicy(delay=0.1)
+    node = FakeNode(echo)
+    def urlopen(url, data, timeout):
+      time.sleep(0.05)
+      return node(url, data, timeout)
+    backend = SteemRemoteBackend(nodes=["http://node-a/", "http://node-b/"], urlopen=urlopen,
+      appbase=True, hedge_policy=policy)
+    threads = [threading.Thread(target=backend.rpc_call, args=("a_api", "m"), kwargs={"method_kwargs": {}})
+      for i in range(80)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    self.assertEqual(len(node.requests), 80)
+    self.assertEqual(policy.stats()["hedges_sent"], 0)
+
+  def test_methods_filter(self):
+    policy = HedgePolicy(delay=0.02, methods=["database_api.get_dynamic_global_properties"])
+    self.assertTrue(policy.applies("database_api", "get_dynamic_global_properties"))
+    self.assertFalse(policy.applies("block_api", "get_block"))
+
+  def test_percentile_delay(self):
+    policy = HedgePolicy(percentile=0.9, recompute_every=10)
+    self.assertIsNone(policy.hedge_delay())
+    for i in range(10):
+      policy.record_latency(i / 10.0)
+    self.assertEqual(policy.hedge_delay(), 0.9)
+
+class TestDecodeModes(unittest.TestCase):
+
+  tricky = {"s": "a\"]}{[\\", "n": [1, -2.5e3, True, None], "o": {"k": []}}
+
+  def test_ordered_default(self):
+    node, backend = make_backend()
+    self.assertIsInstance(backend.rpc_call("a_api", "m", method_kwargs={"x": 1}), collections.OrderedDict)
+
+  def test_dict(self):
+    node, backend = make_backend(decode_mode=DECODE_DICT)
+    result = backend.rpc_call("a_api", "m", method_kwargs={"x": 1})
+    self.assertIs(type(result), dict)
+
+  def test_raw(self):
+    node, backend = make_backend(decode_mode=DECODE_RAW)
+    result = backend.rpc_call("a_api", "m", method_kwargs=self.tricky)
+    self.assertIsInstance(result, memoryview)
+    self.assertEqual(json.loads(bytes(result).decode("utf-8")), self.tricky)
+    with self.assertRaises(SteemRPCException):
+      backend.rpc_call("a_api", "fail", method_kwargs={})
+
+  def test_raw_json_members(self):
+    buf = b' { "result" : [1, "]", {"a": "}"}] , "id":3 ,"x":"\\"}"}'
+    members = raw_json_members(buf)
+    self.assertEqual(buf[slice(*members["result"])], b'[1, "]", {"a": "}"}]')
+    self.assertEqual(buf[slice(*members["id"])], b'3')
+    self.assertEqual(buf[slice(*members["x"])], b'"\\"}"')
+
+  def test_raw_json_result(self):
+    self.assertEqual(raw_json_result(b'{"jsonrpc":"2.0","result":{"a":"}"},"id":1}'), (26, 35))
+    self.assertEqual(raw_json_result(b'{"result":[1,2] , "x" : "]}" }'), (10, 15))
+    self.assertEqual(raw_json_result(b'{"id":1,"result":{"a":{}}}'), (17, 25))
+    self.assertEqual(raw_json_result(b'{"result":{"a":1},"more":{"b":2}}'), (10, 17))
+    self.assertEqual(raw_json_result(b'{"result":{"s":"\\\\\\"}{["},"id":1}'), (10, 25))
+    self.assertIsNone(raw_json_result(b'{"id":1,"error":{"message":"x"}}'))
+    self.assertIsNone(raw_json_result(b'{"result":{},"error":{"message":"x"}}'))
+
+  def test_json_loads_hook(self):
+    seen = []
+    def loads(b):
+      seen.append(type(b))
+      return json.loads(b.decode("utf-8"))
+    node, backend = make_backend(json_loads=loads)
+    self.assertEqual(backend.rpc_call("a_api", "m", method_kwargs={"x": 1}), {"x": 1})
+    self.assertEqual(seen, [bytes])
+
+  def test_fast_json_loads_fallback(self):
+    self.assertIsNone(fast_json_loads(libraries=("no_such_json_library",)))
+
+class TestMetrics(unittest.TestCase):
+
+  def test_hooks(self):
+    pre = []
+    post = []
+    node, backend = make_backend(pre_call_hooks=[lambda info: pre.append(len(info["attempts"]))],
+      post_call_hooks=[post.append])
+    backend.rpc_call("a_api", "m", method_kwargs={"x": 1})
+    self.assertEqual(pre, [0])
+    info = post[0]
+    self.assertEqual((info["api"], info["method"], info["node"]), ("a_api", "m", "http://node-a/"))
+    self.assertIsNone(info["error_kind"])
+    self.assertEqual(len(info["attempts"]), 1)
+    self.assertEqual(info["attempts"][0]["request_bytes"], len(node.requests[0][1]))
+    self.assertGreater(info["attempts"][0]["response_bytes"], 0)
+
+  def test_failing_hook_does_not_break_call(self):
+    def hook(info):
+      raise RuntimeError("broken hook")
+    node, backend = make_backend(post_call_hooks=[hook])
+    with self.assertLogs(level="ERROR"):
+      self.assertEqual(backend.rpc_call("a_api", "m", method_kwargs={}), {})
+
+  def test_registry(self):
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    node, backend = make_backend(nodes=["http://node-a/", "http://node-b/"],
+      node_selector=RoundRobinSelector(), metrics=metrics)
+    node.fail_urls.add("http://node-a/")
+    backend.rpc_call("a_api", "m", method_kwargs={})
+    with self.assertRaises(SteemRPCException):
+      backend.rpc_call("a_api", "fail", method_kwargs={})
+    backend.rpc_batch([{"api": "a_api", "method": "m", "method_kwargs": {}}] * 2)
+
+    snap = metrics.snapshot()
+    a = snap["a_api"]["m"]["http://node-a/"]
+    b = snap["a_api"]["m"]["http://node-b/"]
+    self.assertEqual((a["attempts"], a["timeouts"], a["calls"]), (1, 1, 0))
+    self.assertEqual((b["attempts"], b["calls"], b["retries"]), (1, 1, 1))
+    self.assertEqual(b["latency"]["count"], 1)
+    self.assertEqual(b["latency"]["buckets"][-1][0], float("inf"))
+    self.assertEqual(sum(s["rpc_errors"] for s in snap["a_api"]["fail"].values()), 1)
+    self.assertEqual(sum(s["calls"] for s in snap["jsonrpc"]["batch"].values()), 1)
+
+    text = metrics.to_prometheus()
+    self.assertIn('steem_rpc_calls_total{api="a_api",method="m",node="http://node-b/"} 1', text)
+    self.assertIn('steem_rpc_latency_seconds_bucket{api="a_api",method="m",node="http://node-b/",le="+Inf"} 1', text)
+    self.assertIn("# TYPE steem_rpc_latency_seconds histogram", text)
+
+class TestTracing(unittest.TestCase):
+
+  def test_phases(self):
+    tracer = PhaseTracer(percentiles=(0.5, 1.0))
+    node, backend = make_backend(tracer=tracer)
+    self.assertIsNone(backend.last_timing())
+    node.fail_next = 1
+    for i in range(3):
+      backend.rpc_call("a_api", "m", method_kwargs={"i": i})
+    timing = backend.last_timing()
+    self.assertEqual(timing["method"], "m")
+    for phase in ("encode", "wait", "read", "decode"):
+      self.assertGreaterEqual(timing["phases"][phase], 0.0)
+    self.assertNotIn("failed", timing["phases"])
+
+    report = tracer.report()["a_api.m"]
+    self.assertGreater(report["failed"][1.0], 0.0)
+    self.assertEqual(report["failed"][0.5], 0.0)
+    self.assertGreaterEqual(report["total"][1.0], report["total"][0.5])
+
+  def test_timing_attached_to_exception(self):
+    node, backend = make_backend(tracer=PhaseTracer())
+    with self.assertRaises(SteemRPCException) as cm:
+      backend.rpc_call("a_api", "fail", method_kwargs={})
+    self.assertIs(cm.exception.timing, backend.last_timing())
+    self.assertIn("decode", cm.exception.timing["phases"])
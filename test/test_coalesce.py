@@ -0,0 +1,118 @@
+
+import asyncio
+import threading
+import time
+import unittest
+
+from simple_steem_client.coalesce import CoalescingBackend, AsyncCoalescingBackend, default_coalesce
+
+class SlowBackend:
+  def __init__(self, fail=False):
+    self.calls = []
+    self.started = threading.Event()
+    self.release = threading.Event()
+    self.fail = fail
+
+  def rpc_call(self, api="", method="", method_args=None, method_kwargs=None):
+    self.calls.append((api, method))
+    self.started.set()
+    self.release.wait(5)
+    if self.fail:
+      raise ValueError("failed")
+    return {"method": method}
+
+class AsyncSlowBackend:
+  def __init__(self):
+    self.calls = []
+
+  async def rpc_call(self, api="", method="", method_args=None, method_kwargs=None):
+    self.calls.append((api, method))
+    await asyncio.sleep(0.01)
+    return {"method": method}
+
+class TestCoalescingBackend(unittest.TestCase):
+
+  def run_threads(self, backend, api, method, n=5):
+    results = []
+    def worker():
+      try:
+        results.append(backend.rpc_call(api=api, method=method, method_kwargs={}))
+      except Exception as e:
+        results.append(e)
+    threads = [threading.Thread(target=worker) for i in range(n)]
+    for t in threads:
+      t.start()
+    return threads, results
+
+  def finish(self, slow, threads):
+    self.assertTrue(slow.started.wait(5))
+    slow.release.set()
+    for t in threads:
+      t.join()
+
+  def test_identical_calls_share_request(self):
+    slow = SlowBackend()
+    backend = CoalescingBackend(slow)
+    threads, results = self.run_threads(backend, "database_api", "get_dynamic_global_properties")
+    # Hold the first request until every other caller has joined it
+    deadline = time.monotonic() + 5
+    while backend.coalesced < 4 and time.monotonic() < deadline:
+      time.sleep(0.001)
+    self.finish(slow, threads)
+    self.assertEqual(backend.coalesced, 4)
+    self.assertEqual(len(slow.calls), 1)
+    self.assertEqual(len(results), 5)
+    self.assertEqual(len(set(id(r) for r in results)), 1)
+
+  def test_exception_shared(self):
+    slow = SlowBackend(fail=True)
+    backend = CoalescingBackend(slow)
+    threads, results = self.run_threads(backend, "database_api", "get_config")
+    self.finish(slow, threads)
+    self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+  def test_broadcast_not_coalesced(self):
+    self.assertFalse(default_coalesce("network_broadcast_api", "broadcast_transaction"))
+    self.assertFalse(default_coalesce("condenser_api", "broadcast_transaction_synchronous"))
+    slow = SlowBackend()
+    slow.release.set()
+    backend = CoalescingBackend(slow)
+    threads, results = self.run_threads(backend, "network_broadcast_api", "broadcast_transaction", n=3)
+    for t in threads:
+      t.join()
+    self.assertEqual(len(slow.calls), 3)
+    self.assertEqual(backend.coalesced, 0)
+
+  def test_async(self):
+    slow = AsyncSlowBackend()
+    backend = AsyncCoalescingBackend(slow)
+    async def many():
+      return await asyncio.gather(*[backend.rpc_call("block_api", "get_block", method_kwargs={"block_num": 1}) for i in range(10)])
+    loop = asyncio.new_event_loop()
+    try:
+      results = loop.run_until_complete(many())
+    finally:
+      loop.close()
+    self.assertEqual(len(slow.calls), 1)
+    self.assertEqual(backend.coalesced, 9)
+    self.assertEqual(results, [{"method": "get_block"}] * 10)
+
+  def test_async_leader_cancelled(self):
+    slow = AsyncSlowBackend()
+    backend = AsyncCoalescingBackend(slow)
+    async def cancel_leader():
+      leader = asyncio.ensure_future(backend.rpc_call("block_api", "get_block", method_kwargs={"block_num": 1}))
+      await asyncio.sleep(0)
+      follower = asyncio.ensure_future(backend.rpc_call("block_api", "get_block", method_kwargs={"block_num": 1}))
+      await asyncio.sleep(0)
+      leader.cancel()
+      result = await follower
+      return leader.cancelled(), result
+    loop = asyncio.new_event_loop()
+    try:
+      cancelled, result = loop.run_until_complete(cancel_leader())
+    finally:
+      loop.close()
+    self.assertTrue(cancelled)
+    self.assertEqual(result, {"method": "get_block"})
+    self.assertEqual((len(slow.calls), backend.coalesced), (1, 1))
@@ -0,0 +1,164 @@
+
+import mmap, tempfile, time, unittest
+from simple_steem_client.serializer import Serializer, Deserializer
+from simple_steem_client.serializer.serializer import ArgumentError
+from test.test_serializer import PublicKey, hx, hs, pk_bytes
+
+thirty_two_bytes = bytes.fromhex("000102030405060708090a0b0c0d0e0f000102030405060708090a0b0c0d0e0f")
+
+def comment_options():
+  return ["comment_options", {
+    "author": "goldibex",
+    "permlink": "https://example.com",
+    "max_accepted_payout": "0.010 STEEM",
+    "percent_steem_dollars": 100,
+    "allow_votes": True,
+    "allow_curation_rewards": True,
+    "extensions": [["beneficiaries", [
+      {"account": "goldibex", "weight": 2},
+      {"account": "ned", "weight": 1}
+    ]]]
+  }]
+
+def signed_transaction():
+  return {
+    "ref_block_num": 65535,
+    "ref_block_prefix": 65535,
+    "expiration": "2038-01-19T03:14:07",
+    "operations": [
+      ["account_witness_vote", {"account": "goldibex", "witness": "ned", "approve": False}],
+      ["vote", {"voter": "goldibex", "author": "ned", "permlink": "x", "weight": -10000}],
+      comment_options()
+    ],
+    "extensions": [],
+    "signatures": ["1f" * 65, "20" * 65]
+  }
+
+class TestDeserializer(unittest.TestCase):
+
+  def setUp(self):
+    self.s = Serializer()
+
+  def round_trip(self, typename, value, **kwargs):
+    getattr(self.s, typename)(value)
+    data = self.s.flush()
+    d = Deserializer(data, **kwargs)
+    result = getattr(d, typename)()
+    self.assertEqual(d.remaining(), 0)
+    getattr(self.s, typename)(result)
+    self.assertEqual(self.s.flush(), data)
+    return result
+
+  def test_integers(self):
+    self.s.uint8(0xff)
+    self.s.uint16(0xfffe)
+    self.s.uint32(0xfffffffe)
+    self.s.uint64(0xfffffffffffffffe)
+    self.s.int8(-128)
+    self.s.int16(-32768)
+    self.s.int32(-2147483648)
+    self.s.int64(-9223372036854775808)
+    self.s.binary64(3.141592653589793)
+    self.s.uvarint(16384)
+    self.s.svarint(-64)
+    d = Deserializer(self.s.flush())
+    self.assertEqual([d.uint8(), d.uint16(), d.uint32(), d.uint64()],
+      [0xff, 0xfffe, 0xfffffffe, 0xfffffffffffffffe])
+    self.assertEqual([d.int8(), d.int16(), d.int32(), d.int64()],
+      [-128, -32768, -2147483648, -9223372036854775808])
+    self.assertEqual(d.binary64(), 3.141592653589793)
+    self.assertEqual(d.uvarint(), 16384)
+    self.assertEqual(d.svarint(), -64)
+    self.assertEqual(d.remaining(), 0)
+
+  def test_asset_and_time(self):
+    self.assertEqual(self.round_trip("asset", "0.010 STEEM"), "0.010 STEEM")
+    self.assertEqual(self.round_trip("asset", "1234.000010 VESTS"), "1234.000010 VESTS")
+    self.assertEqual(self.round_trip("time_point_sec", time.gmtime(2147483647)), "2038-01-19T03:14:07")
+
+  def test_authority(self):
+    result = self.round_trip("authority", {
+      "weight_threshold": 65535,
+      "account_auths": [("goldibex", 65535)],
+      "key_auths": [(PublicKey(), 32768)]
+    })
+    self.assertEqual(result["account_auths"], [["goldibex", 65535]])
+    self.assertEqual(result["key_auths"], [[b"\x04" + pk_bytes, 32768]])
+
+  def test_price_and_chain_properties(self):
+    self.assertEqual(self.round_trip("price", {"base": "0.010 STEEM", "quote": "0.000010 VESTS"}),
+      {"base": "0.010 STEEM", "quote": "0.000010 VESTS"})
+    self.round_trip("chain_properties", {
+      "account_creation_fee": "0.010 STEEM",
+      "maximum_block_size": 16777215,
+      "sbd_interest_rate": 9
+    })
+
+  def test_operation(self):
+    self.assertEqual(self.round_trip("operation", comment_options()), comment_options())
+    self.assertEqual(self.round_trip("operation", ["account_create", {
+      "fee": "0.010 STEEM",
+      "creator": "goldibex",
+      "new_account_name": "ned",
+      "owner": {"weight_threshold": 1, "account_auths": [], "key_auths": [[PublicKey(), 1]]},
+      "active": {"weight_threshold": 1, "account_auths": [["goldibex", 1]], "key_auths": []},
+      "posting": {"weight_threshold": 1, "account_auths": [], "key_auths": []},
+      "memo_key": PublicKey(),
+      "json_metadata": "{}"
+    }])[1]["creator"], "goldibex")
+
+    with self.assertRaises(ArgumentError):
+      Deserializer(hx("ff01")).operation()
+
+  def test_reader_cache_bounded(self):
+    for i in range(100):
+      self.s.operation(comment_options())
+    d = Deserializer(self.s.flush())
+    self.assertEqual(list(d.iterate("operation")), [comment_options()] * 100)
+    self.assertLess(len(d._readers), 10)
+
+  def test_signed_transaction(self):
+    self.assertEqual(self.round_trip("signed_transaction", signed_transaction()), signed_transaction())
+
+  def test_signed_block_header(self):
+    result = self.round_trip("signed_block_header", {
+      "previous": thirty_two_bytes,
+      "timestamp": time.gmtime(2147483647),
+      "witness": "goldibex",
+      "transaction_merkle_root": thirty_two_bytes,
+      "extensions": [],
+      "witness_signature": thirty_two_bytes
+    }, block_id_size=32, checksum_size=32, signature_size=32)
+    self.assertIsInstance(result["previous"], memoryview)
+    self.assertEqual(result["witness_signature"], thirty_two_bytes)
+
+  def test_truncated_input(self):
+    self.s.signed_transaction(signed_transaction())
+    data = self.s.flush()
+    with self.assertRaises(ArgumentError):
+      Deserializer(data[:-1]).signed_transaction()
+    with self.assertRaises(ArgumentError):
+      Deserializer(hx("ff")).uvarint()
+
+  def test_iterate_mmap(self):
+    block = {
+      "previous": bytes(20),
+      "timestamp": "2018-01-01T00:00:00",
+      "witness": "goldibex",
+      "transaction_merkle_root": bytes(20),
+      "extensions": [],
+      "witness_signature": bytes(65),
+      "transactions": [signed_transaction()]
+    }
+    with tempfile.TemporaryFile() as f:
+      for i in range(100):
+        block["witness"] = "w%d" % i
+        self.s.signed_block(block)
+        f.write(self.s.getbuffer())
+        self.s.reset()
+      f.flush()
+      m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      d = Deserializer(m)
+      witnesses = [b["witness"] for b in d.iterate("signed_block")]
+      self.assertEqual(witnesses, ["w%d" % i for i in range(100)])
+      del d
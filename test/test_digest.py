@@ -0,0 +1,65 @@
+
+import hashlib, unittest
+from simple_steem_client.serializer.serializer import ArgumentError
+from simple_steem_client.serializer import Serializer, transaction_digest, transaction_digests, transaction_id, transaction_ids
+from test.test_deserializer import signed_transaction
+
+# A vote transaction whose serialization is published with the steem-python
+# and graphenelib test suites, hashed with the STEEM testnet chain id
+VOTE_TRANSACTION = {
+  "ref_block_num": 34294,
+  "ref_block_prefix": 3707022213,
+  "expiration": "2016-04-06T08:29:27",
+  "operations": [["vote", {"voter": "foobara", "author": "foobarc", "permlink": "foobard", "weight": 1000}]],
+  "extensions": []
+}
+VOTE_SERIALIZED = "f68585abf4dce7c80457010007666f6f6261726107666f6f6261726307666f6f62617264e80300"
+TESTNET_CHAIN_ID = "46d82ab7d8db682eb1959aed0ada039a6d49afa1602491f93dde9cac3e8e6c32"
+VOTE_DIGEST = "00516af0c66d4c93fb5dd4129150e4e6b47611fed9a1926c4e3dc118790c5a9c"
+VOTE_ID = "ec919589a78fb5235faf1be5531fb10eb658a692"
+
+class TestDigest(unittest.TestCase):
+
+  def setUp(self):
+    self.s = Serializer()
+    self.s.transaction(signed_transaction())
+    self.data = self.s.flush()
+
+  def test_transaction_digest(self):
+    self.assertEqual(transaction_digest(signed_transaction()), hashlib.sha256(bytes(32) + self.data).digest())
+    chain_id = "79276aea5d4877d9a25892eaa01b0adf019d3e5cb12a97478df3298ccdd01673"
+    self.assertEqual(transaction_digest(signed_transaction(), chain_id),
+      hashlib.sha256(bytes.fromhex(chain_id) + self.data).digest())
+
+  def test_transaction_id(self):
+    self.assertEqual(transaction_id(signed_transaction()), hashlib.sha256(self.data).hexdigest()[0:40])
+
+  def test_batch(self):
+    txs = []
+    for i in range(50):
+      tx = signed_transaction()
+      tx["ref_block_num"] = i
+      txs.append(tx)
+    ids = transaction_ids(txs, serializer=Serializer(size=16))
+    self.assertEqual(len(set(ids)), 50)
+    self.assertEqual(ids[7], transaction_id(txs[7]))
+    digests = transaction_digests(iter(txs), chain_id=b"\x01" * 32)
+    self.assertEqual(digests[49], transaction_digest(txs[49], b"\x01" * 32))
+    self.assertEqual(transaction_ids([]), [])
+
+  def test_vector(self):
+    s = Serializer()
+    s.transaction(VOTE_TRANSACTION)
+    self.assertEqual(s.flush().hex(), VOTE_SERIALIZED)
+    self.assertEqual(transaction_digest(VOTE_TRANSACTION, TESTNET_CHAIN_ID).hex(), VOTE_DIGEST)
+    self.assertEqual(transaction_id(VOTE_TRANSACTION), VOTE_ID)
+
+  def test_serializer_reset(self):
+    s = Serializer()
+    s.uint32(7)
+    self.assertEqual(transaction_ids([VOTE_TRANSACTION], serializer=s), [VOTE_ID])
+    bad = dict(VOTE_TRANSACTION, operations=[["no_such_operation", {}]])
+    with self.assertRaises(ArgumentError):
+      transaction_digests([VOTE_TRANSACTION, bad], serializer=s)
+    self.assertEqual(len(s.getbuffer()), 0)
+    self.assertEqual(transaction_ids([VOTE_TRANSACTION], serializer=s), [VOTE_ID])
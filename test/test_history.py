@@ -0,0 +1,83 @@
+import unittest
+
+from simple_steem_client.client import SteemInterface, SteemRemoteBackend, SteemRPCException
+from simple_steem_client.history import account_history, latest_sequence
+from test.test_client import FakeNode, make_backend
+
+class FakeHistory:
+  """Account history of n operations, alternating transfers and votes."""
+
+  def __init__(self, n, legacy=False, overlap=0):
+    self.n = n
+    self.legacy = legacy
+    self.overlap = overlap
+    self.calls = []
+
+  def op(self, seq):
+    name = "transfer" if seq % 2 == 0 else "vote"
+    if self.legacy:
+      return {"trx_id": str(seq), "op": [name, {"seq": seq}]}
+    return {"trx_id": str(seq), "op": {"type": name + "_operation", "value": {"seq": seq}}}
+
+  def __call__(self, api, method, args):
+    if isinstance(args, dict):
+      start, limit = args["start"], args["limit"]
+    else:
+      account, start, limit = args
+    self.calls.append((start, limit))
+    if limit > 1000 or (start != -1 and start < limit):
+      raise ValueError("bad limit")
+    if start == -1:
+      start = self.n - 1
+    first = max(start - limit - self.overlap, 0)
+    history = [[seq, self.op(seq)] for seq in range(first, min(start + self.overlap, self.n - 1) + 1)]
+    if self.legacy:
+      return history
+    return {"history": history}
+
+class TestAccountHistory(unittest.TestCase):
+
+  def test_all(self):
+    chain = FakeHistory(2501)
+    node, backend = make_backend(chain)
+    steem = SteemInterface(backend)
+    self.assertEqual(latest_sequence(steem, "alice"), 2500)
+    ops = list(account_history(steem, "alice", page_size=1000, workers=4))
+    self.assertEqual([seq for seq, item in ops], list(range(2501)))
+    self.assertEqual(ops[7][1]["op"]["value"], {"seq": 7})
+    self.assertEqual(sorted(chain.calls[1:]), [(-1, 1), (999, 999), (1999, 999), (2500, 500)])
+
+  def test_overlapping_pages_deduplicated(self):
+    chain = FakeHistory(95, overlap=3)
+    node, backend = make_backend(chain)
+    ops = list(account_history(SteemInterface(backend), "alice", start=10, end=90, page_size=10))
+    self.assertEqual([seq for seq, item in ops], list(range(10, 91)))
+
+  def test_single_operation_page(self):
+    chain = FakeHistory(21)
+    node, backend = make_backend(chain)
+    ops = list(account_history(SteemInterface(backend), "alice", page_size=10))
+    self.assertEqual([seq for seq, item in ops], list(range(21)))
+    self.assertIn((20, 1), chain.calls)
+
+  def test_only_operation_zero(self):
+    chain = FakeHistory(1)
+    node, backend = make_backend(chain)
+    ops = list(account_history(SteemInterface(backend), "alice"))
+    self.assertEqual([seq for seq, item in ops], [0])
+    self.assertNotIn(0, [limit for start, limit in chain.calls])
+
+  def test_op_types_legacy(self):
+    chain = FakeHistory(50, legacy=True)
+    node = FakeNode(chain)
+    backend = SteemRemoteBackend(nodes=["http://node-a/"], urlopen=node, appbase=False)
+    ops = list(account_history(SteemInterface(backend), "alice", page_size=20,
+      op_types=["transfer_operation"]))
+    self.assertEqual([seq for seq, item in ops], list(range(0, 50, 2)))
+
+  def test_empty_and_error(self):
+    node, backend = make_backend(FakeHistory(0))
+    self.assertEqual(list(account_history(SteemInterface(backend), "alice")), [])
+    node, backend = make_backend(FakeHistory(1500))
+    with self.assertRaises(SteemRPCException):
+      list(account_history(SteemInterface(backend), "alice", page_size=2000))
@@ -0,0 +1,104 @@
+import email.message
+import io
+import socket
+import threading
+import time
+import unittest
+import urllib.error
+
+from simple_steem_client.client import SteemRemoteBackend
+from simple_steem_client.limiter import NodeLimiter
+
+def http_error(code, retry_after=None):
+  headers = email.message.Message()
+  if retry_after is not None:
+    headers["Retry-After"] = retry_after
+  return urllib.error.HTTPError("http://a/", code, "error", headers, io.BytesIO(b""))
+
+class TestNodeLimiter(unittest.TestCase):
+
+  def test_aimd(self):
+    limiter = NodeLimiter(initial_limit=4, max_limit=5)
+    for i in range(4):
+      limiter.release(limiter.acquire("a"))
+    self.assertAlmostEqual(limiter.stats()["a"]["limit"], 4.9, delta=0.1)
+    for i in range(20):
+      limiter.release(limiter.acquire("a"))
+    self.assertEqual(limiter.stats()["a"]["limit"], 5.0)
+
+    tickets = [limiter.acquire("a") for i in range(3)]
+    for ticket in tickets:
+      limiter.release(ticket, http_error(503))
+    # Requests sent before the decrease do not decrease the limit again
+    self.assertEqual(limiter.stats()["a"]["limit"], 2.5)
+    self.assertEqual(limiter.stats()["a"]["overloads"], 3)
+
+    time.sleep(0.01)
+    limiter.release(limiter.acquire("a"), socket.timeout("timed out"))
+    self.assertEqual(limiter.stats()["a"]["limit"], 1.25)
+    limiter.release(limiter.acquire("a"), http_error(500))
+    self.assertEqual(limiter.stats()["a"]["limit"], 1.25)
+
+  def test_concurrency_limit_blocks(self):
+    limiter = NodeLimiter(initial_limit=1)
+    ticket = limiter.acquire("a")
+    other = limiter.acquire("b")
+    acquired = threading.Event()
+    def worker():
+      limiter.release(limiter.acquire("a"))
+      acquired.set()
+    thread = threading.Thread(target=worker)
+    thread.start()
+    self.assertFalse(acquired.wait(0.05))
+    limiter.release(ticket)
+    self.assertTrue(acquired.wait(1.0))
+    thread.join()
+    limiter.release(other)
+
+  def test_rate(self):
+    limiter = NodeLimiter(rate=50, burst=1)
+    start = time.monotonic()
+    for i in range(4):
+      limiter.release(limiter.acquire("a"))
+    self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+  def test_retry_after(self):
+    limiter = NodeLimiter()
+    limiter.release(limiter.acquire("a"), http_error(429, "120"))
+    self.assertAlmostEqual(limiter.stats()["a"]["paused"], 60.0, places=0)
+
+  def test_backend(self):
+    errors = [http_error(503, "0.01")]
+    def urlopen(url, data, timeout):
+      if errors:
+        raise errors.pop()
+      return io.BytesIO(b'{"jsonrpc":"2.0","id":0,"result":{}}')
+    limiter = NodeLimiter(initial_limit=2)
+    backend = SteemRemoteBackend(nodes=["http://a/"], urlopen=urlopen, appbase=True,
+      sleep_function=lambda t: None, limiter=limiter)
+    self.assertEqual(backend.rpc_call("a_api", "m", method_kwargs={}), {})
+    stats = limiter.stats()["http://a/"]
+    self.assertEqual((stats["overloads"], stats["in_flight"]), (1, 0))
+
+  def test_try_acquire(self):
+    limiter = NodeLimiter(initial_limit=1)
+    ticket = limiter.try_acquire("a")
+    self.assertIsNotNone(ticket)
+    self.assertIsNone(limiter.try_acquire("a"))
+    self.assertEqual(limiter.unavailable(["a", "b"]), set(["a"]))
+    limiter.release(ticket)
+    self.assertEqual(limiter.unavailable(["a", "b"]), set())
+
+  def test_backend_skips_paused_node(self):
+    urls = []
+    def urlopen(url, data, timeout):
+      urls.append(url)
+      return io.BytesIO(b'{"jsonrpc":"2.0","id":0,"result":{}}')
+    limiter = NodeLimiter()
+    limiter.release(limiter.acquire("http://a/"), http_error(429, "60"))
+    backend = SteemRemoteBackend(nodes=["http://a/", "http://b/"], urlopen=urlopen, appbase=True, limiter=limiter)
+    start = time.monotonic()
+    for i in range(4):
+      self.assertEqual(backend.rpc_call("a_api", "m", method_kwargs={}), {})
+    self.assertLess(time.monotonic() - start, 1.0)
+    self.assertEqual(urls, ["http://b/"] * 4)
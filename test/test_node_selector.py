@@ -0,0 +1,77 @@
+
+import random
+import unittest
+
+from simple_steem_client.node_selector import (
+  RoundRobinSelector,
+  LeastLatencySelector,
+  WeightedSelector,
+  CIRCUIT_OPEN,
+  CIRCUIT_CLOSED,
+  )
+
+NODES = ["a", "b", "c"]
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+class TestNodeSelector(unittest.TestCase):
+
+  def test_round_robin(self):
+    sel = RoundRobinSelector()
+    self.assertEqual([sel.select(NODES) for i in range(4)], ["a", "b", "c", "a"])
+
+  def test_least_latency(self):
+    sel = LeastLatencySelector()
+    sel.record_success("a", 0.5)
+    sel.record_success("b", 0.1)
+    self.assertEqual(sel.select(NODES), "c")
+    sel.record_success("c", 0.3)
+    self.assertEqual(sel.select(NODES), "b")
+    self.assertEqual(sel.select(NODES, exclude=["b"]), "c")
+    sel.record_failure("b")
+    self.assertEqual(sel.select(NODES), "c")
+
+  def test_weighted(self):
+    sel = WeightedSelector(weights={"a": 0, "b": 1, "c": 0}, rng=random.Random(1))
+    self.assertEqual(set(sel.select(NODES) for i in range(20)), set(["b"]))
+
+  def test_prefer(self):
+    clock = FakeClock()
+    sel = RoundRobinSelector(failure_threshold=1, clock=clock)
+    self.assertEqual([sel.select(NODES, prefer="c") for i in range(3)], ["c", "c", "c"])
+    self.assertEqual(sel.select(NODES, exclude=["c"], prefer="c"), "a")
+    sel.record_failure("c")
+    self.assertNotEqual(sel.select(NODES, prefer="c"), "c")
+
+  def test_circuit_breaker(self):
+    clock = FakeClock()
+    sel = RoundRobinSelector(failure_threshold=2, reset_timeout=10.0, clock=clock)
+    sel.record_failure("a")
+    sel.record_failure("a")
+    self.assertEqual(sel.stats()["a"]["state"], CIRCUIT_OPEN)
+    self.assertNotIn("a", [sel.select(NODES) for i in range(4)])
+
+    # Half-open: exactly one probe is let through
+    clock.now = 10.0
+    self.assertEqual(sel.select(NODES), "a")
+    self.assertNotIn("a", [sel.select(NODES) for i in range(4)])
+    sel.record_failure("a")
+    self.assertEqual(sel.stats()["a"]["state"], CIRCUIT_OPEN)
+
+    clock.now = 20.0
+    self.assertEqual(sel.select(NODES), "a")
+    sel.record_success("a", 0.1)
+    self.assertEqual(sel.stats()["a"]["state"], CIRCUIT_CLOSED)
+
+  def test_all_open(self):
+    clock = FakeClock()
+    sel = RoundRobinSelector(failure_threshold=1, reset_timeout=10.0, clock=clock)
+    sel.record_failure("b")
+    clock.now = 1.0
+    sel.record_failure("a")
+    self.assertEqual(sel.select(["a", "b"]), "b")
@@ -0,0 +1,28 @@
+import multiprocessing
+import unittest
+
+from simple_steem_client.client import SteemInterface, SteemRPCException, DECODE_RAW
+from simple_steem_client.pipeline import ingest_blocks
+from test.test_client import make_backend
+from test.test_streaming import FakeChain
+
+def block_info(block_num, block):
+  return (block_num, block["n"], multiprocessing.current_process().name)
+
+class TestIngestBlocks(unittest.TestCase):
+
+  def test_ordered_output(self):
+    chain = FakeChain(head=500, lib=500)
+    node, backend = make_backend(chain, decode_mode=DECODE_RAW, nodes=["http://node-a/", "http://node-b/"])
+    results = list(ingest_blocks(SteemInterface(backend), 3, 407, block_info,
+      processes=2, range_size=10, fetchers=4, max_pending=3))
+    self.assertEqual([n for n, r in results], list(range(3, 408)))
+    self.assertTrue(all(n == r[0] == r[1] for n, r in results))
+    self.assertNotIn("MainProcess", set(r[2] for n, r in results))
+    self.assertEqual(set(url for url, data in node.requests), set(backend.nodes))
+
+  def test_incomplete_range(self):
+    chain = FakeChain(head=50, lib=50)
+    node, backend = make_backend(chain)
+    with self.assertRaises(SteemRPCException):
+      list(ingest_blocks(SteemInterface(backend), 1, 60, block_info, processes=1, range_size=20))
@@ -0,0 +1,109 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from simple_steem_client.client import SteemRemoteBackend, SteemRPCException
+from simple_steem_client.replay import (
+  ReplayArchive,
+  ReplayMiss,
+  RecordReplayTransport,
+  MODE_RECORD,
+  )
+
+class FakeUrlopen:
+  """Answers get_block with a fake block, fails method "fail"."""
+
+  def __init__(self):
+    self.requests = 0
+
+  def answer(self, req):
+    api, method, args = req["params"]
+    if method == "fail":
+      return {"jsonrpc": "2.0", "id": req["id"], "error": {"message": "failed"}}
+    return {"jsonrpc": "2.0", "id": req["id"], "result": {"block": {"num": args["block_num"], "z": 1, "a": 2}}}
+
+  def __call__(self, url, data, timeout):
+    self.requests += 1
+    req = json.loads(data.decode("ascii"))
+    if isinstance(req, list):
+      resp = [self.answer(r) for r in req]
+    else:
+      resp = self.answer(req)
+    return io.BytesIO(json.dumps(resp).encode("utf-8"))
+
+class TestRecordReplay(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.dir, "calls.archive")
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def backend(self, transport, req_id=0):
+    return SteemRemoteBackend(nodes=["http://node/"], urlopen=transport, appbase=True,
+      max_retries=0, req_id=req_id)
+
+  def test_record_then_replay(self):
+    node = FakeUrlopen()
+    transport = RecordReplayTransport(self.path, mode=MODE_RECORD, urlopen=node, compress=True)
+    backend = self.backend(transport)
+    recorded = [backend.rpc_call("block_api", "get_block", method_kwargs={"block_num": n}) for n in range(3)]
+    backend.rpc_batch([{"api": "block_api", "method": "get_block", "method_kwargs": {"block_num": n}}
+      for n in range(3, 5)])
+    with self.assertRaises(SteemRPCException):
+      backend.rpc_call("block_api", "fail", method_kwargs={})
+    transport.close()
+
+    transport = RecordReplayTransport(self.path)
+    self.assertEqual(len(transport.archive), 5)
+    backend = self.backend(transport, req_id=100)
+    self.assertEqual([backend.rpc_call("block_api", "get_block", method_kwargs={"block_num": n})
+      for n in range(3)], recorded)
+    self.assertEqual(list(recorded[0]["block"].keys()), ["num", "z", "a"])
+    results = backend.rpc_batch([{"api": "block_api", "method": "get_block", "method_kwargs": {"block_num": n}}
+      for n in (4, 1)])
+    self.assertEqual([r["block"]["num"] for r in results], [4, 1])
+    with self.assertRaises(ReplayMiss):
+      backend.rpc_call("block_api", "fail", method_kwargs={})
+    self.assertEqual((transport.hits, transport.misses), (5, 1))
+    self.assertEqual(node.requests, 5)
+    transport.close()
+
+  def test_miss_is_not_a_node_failure(self):
+    ReplayArchive(self.path, writable=True).close()
+    transport = RecordReplayTransport(self.path)
+    backend = self.backend(transport)
+    for i in range(6):
+      with self.assertRaises(ReplayMiss):
+        backend.rpc_call("block_api", "get_block", method_kwargs={"block_num": i})
+    stats = backend.node_stats()["http://node/"]
+    self.assertEqual((stats["failures"], stats["state"]), (0, "closed"))
+    transport.close()
+
+  def test_passthrough_on_miss(self):
+    node = FakeUrlopen()
+    ReplayArchive(self.path, writable=True).close()
+    transport = RecordReplayTransport(self.path, urlopen=node, passthrough_on_miss=True)
+    result = self.backend(transport).rpc_call("block_api", "get_block", method_kwargs={"block_num": 7})
+    self.assertEqual(result["block"]["num"], 7)
+    self.assertEqual(node.requests, 1)
+    transport.close()
+
+  def test_archive_truncated_record(self):
+    with ReplayArchive(self.path, writable=True) as archive:
+      archive.put(b"a", b"1")
+      archive.put(b"b", b"2")
+      archive.put(b"a", b"3")
+      self.assertEqual(archive.get(b"a"), b"3")
+    with open(self.path, "ab") as f:
+      f.write(b"\x00\x05\x00")
+    with ReplayArchive(self.path, writable=True) as archive:
+      self.assertEqual((archive.get(b"a"), archive.get(b"b"), len(archive)), (b"3", b"2", 2))
+      archive.put(b"c", b"4")
+    with ReplayArchive(self.path) as archive:
+      self.assertEqual(archive.get(b"c"), b"4")
+      self.assertIsNone(archive.get(b"d"))
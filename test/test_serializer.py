@@ -480,3 +480,69 @@ class TestSerializer(unittest.TestCase):
     self.assertEqual(data[51:52], hx("01"))
     self.assertEqual(data[52:72], hx("01000208") + hs("goldibex") + hx("0200") + hx("03") + hs("ned") + hx("0100"))
 
+
+  def test_compile(self):
+    tx = {
+      "ref_block_num": 1234,
+      "ref_block_prefix": 99999,
+      "expiration": time.gmtime(2147483647),
+      "operations": [
+        ["account_witness_vote", {"account": "goldibex", "witness": "ned", "approve": True}],
+        ["comment_options", {
+          "author": "goldibex",
+          "permlink": "p",
+          "max_accepted_payout": "0.010 STEEM",
+          "percent_steem_dollars": 100,
+          "allow_votes": True,
+          "allow_curation_rewards": False,
+          "extensions": [["beneficiaries", [{"account": "ned", "weight": 1}]]]}]],
+      "extensions": [],
+      "signatures": ["01" * 65]
+    }
+
+    # The generic path, dispatching each field by name
+    generic = self.s.fields(tx, Serializer._signed_transaction_fields)
+    expected = self.s.flush()
+
+    self.assertEqual(self.s.signed_transaction(tx), generic)
+    self.assertEqual(self.s.flush(), expected)
+    self.assertIs(Serializer.compile("signed_transaction"), Serializer.compile("signed_transaction"))
+
+    with self.assertRaises(Exception):
+      self.s.operation(["no_such_operation", {}])
+
+  def test_growable_buffer(self):
+    s = Serializer(size=4, max_size=1024)
+    self.assertEqual(s.string("x" * 200), 202)
+    view = s.getbuffer()
+    self.assertEqual(view[0:2], hx("c801"))
+    self.assertEqual(s.uint32(0xffffffff), 4)
+    self.assertEqual(bytes(view[2:4]), b"xx")
+    self.assertEqual(len(s.getbuffer()), 206)
+    s.reset()
+    self.assertEqual(len(s.getbuffer()), 0)
+
+    with self.assertRaises(Exception):
+      s.raw_bytes(bytes(1025))
+
+  def test_flush_into(self):
+    ba = bytearray(8)
+    self.s.uint16(0x0201)
+    offset = self.s.flush_into(ba, 1)
+    self.assertEqual(offset, 3)
+    self.s.uint32(0x06050403)
+    self.assertEqual(self.s.flush_into(ba, offset), 7)
+    self.assertEqual(ba, hx("0001020304050600"))
+
+    self.s.uint16(0)
+    with self.assertRaises(Exception):
+      self.s.flush_into(ba, 7)
+
+  def test_fixed_width_truncation(self):
+    # Out-of-range values keep only their low bytes, e.g. a full block
+    # number given as ref_block_num
+    self.assertEqual(self.s.uint16(0x12345678), 2)
+    self.assertEqual(self.s.int16(-65537), 2)
+    self.assertEqual(self.s.binary64(0.0), 8)
+    self.assertEqual(self.s.binary64(-0.5), 8)
+    self.assertEqual(self.s.flush(), hx("7856ffff") + hx("0000000000000000") + hx("000000000000e0bf"))
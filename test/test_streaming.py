@@ -0,0 +1,49 @@
+
+import unittest
+
+from simple_steem_client.client import SteemInterface
+from simple_steem_client.streaming import stream_blocks
+from test.test_client import make_backend
+
+class FakeChain:
+  def __init__(self, head, lib):
+    self.head = head
+    self.lib = lib
+    self.calls = []
+
+  def __call__(self, api, method, args):
+    self.calls.append(method)
+    if method == "get_dynamic_global_properties":
+      return {"head_block_number": self.head, "last_irreversible_block_num": self.lib}
+    if method == "get_block":
+      if args["block_num"] > self.head:
+        return {}
+      return {"block": {"n": args["block_num"]}}
+    if method == "get_block_range":
+      n = args["starting_block_num"]
+      return {"blocks": [{"n": i} for i in range(n, min(n + args["count"], self.head + 1))]}
+    raise ValueError(method)
+
+  def advance(self, seconds):
+    self.head += 1
+    self.lib += 1
+
+class TestStreamBlocks(unittest.TestCase):
+
+  def test_catch_up_and_tail(self):
+    chain = FakeChain(head=120, lib=100)
+    node, backend = make_backend(chain)
+    steem = SteemInterface(backend)
+    blocks = list(stream_blocks(steem, 1, end=105, prefetch=8, sleep_function=chain.advance))
+    self.assertEqual([n for n, b in blocks], list(range(1, 106)))
+    self.assertEqual([b["n"] for n, b in blocks], list(range(1, 106)))
+    self.assertEqual(chain.lib, 105)
+
+  def test_head_mode_with_ranges(self):
+    chain = FakeChain(head=50, lib=30)
+    node, backend = make_backend(chain)
+    steem = SteemInterface(backend)
+    blocks = list(stream_blocks(steem, 1, end=53, prefetch=4, irreversible=False, range_size=10,
+      sleep_function=chain.advance))
+    self.assertEqual([b["n"] for n, b in blocks], list(range(1, 54)))
+    self.assertIn("get_block_range", chain.calls)
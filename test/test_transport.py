@@ -0,0 +1,185 @@
+
+import asyncio
+import http.server
+import json
+import gzip
+import os
+import resource
+import socketserver
+import threading
+import time
+import unittest
+import urllib.error
+import zlib
+
+from simple_steem_client.client import SteemRemoteBackend, SteemHTTPError
+from simple_steem_client.async_client import AsyncSteemRemoteBackend
+from simple_steem_client.transport import PooledHTTPTransport
+
+class ThreadedHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+  daemon_threads = True
+
+class EchoHandler(http.server.BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+
+  def do_POST(self):
+    body = self.rfile.read(int(self.headers["Content-Length"]))
+    req = json.loads(body.decode("utf-8"))
+    self.server.connections.add(self.client_address)
+    if isinstance(req, list):
+      status, method = 200, "batch"
+      resp = json.dumps([{"jsonrpc": "2.0", "id": r["id"], "result": r["params"][2]} for r in req]).encode("utf-8")
+    elif req["params"][1] == "slow":
+      time.sleep(0.2)
+      status, method = 200, "slow"
+      resp = json.dumps({"jsonrpc": "2.0", "id": req["id"], "result": req["params"][2]}).encode("utf-8")
+    elif req["params"][1] == "fail":
+      status, method, resp = 503, "fail", b"busy"
+    else:
+      status, method = 200, req["params"][1]
+      resp = json.dumps({"jsonrpc": "2.0", "id": req["id"], "result": req["params"][2]}).encode("utf-8")
+    accept = self.headers.get("Accept-Encoding", "")
+    encoding = None
+    if method == "deflate" and "deflate" in accept:
+      encoding, resp = "deflate", zlib.compress(resp)
+    elif "gzip" in accept:
+      encoding, resp = "gzip", gzip.compress(resp)
+    self.send_response(status)
+    self.send_header("Content-Length", str(len(resp)))
+    if encoding is not None:
+      self.send_header("Content-Encoding", encoding)
+    if method == "close":
+      self.send_header("Connection", "close")
+    self.end_headers()
+    self.wfile.write(resp)
+
+  def log_message(self, *args):
+    pass
+
+class TestPooledHTTPTransport(unittest.TestCase):
+
+  def setUp(self):
+    self.server = ThreadedHTTPServer(("127.0.0.1", 0), EchoHandler)
+    self.server.connections = set()
+    self.thread = threading.Thread(target=self.server.serve_forever)
+    self.thread.daemon = True
+    self.thread.start()
+    self.url = "http://127.0.0.1:{}/".format(self.server.server_address[1])
+    self.transport = PooledHTTPTransport(max_connections=2)
+    self.backend = SteemRemoteBackend(nodes=[self.url], urlopen=self.transport, appbase=True, max_retries=0)
+
+  def tearDown(self):
+    self.transport.close()
+    self.server.shutdown()
+    self.server.server_close()
+
+  def test_reuses_connection(self):
+    for i in range(5):
+      self.assertEqual(self.backend.rpc_call("test_api", "echo", method_kwargs={"i": i}), {"i": i})
+    self.assertEqual(len(self.server.connections), 1)
+
+  def test_connection_close_not_pooled(self):
+    self.backend.rpc_call("test_api", "close", method_kwargs={})
+    self.assertEqual(sum(self.transport.idle_connections().values()), 0)
+    self.backend.rpc_call("test_api", "echo", method_kwargs={})
+    self.assertEqual(sum(self.transport.idle_connections().values()), 1)
+
+  def test_server_closed_connection_detected(self):
+    self.backend.rpc_call("test_api", "echo", method_kwargs={})
+    for pool in self.transport._pools.values():
+      for conn, last_used in pool:
+        conn.sock.shutdown(0)
+    self.assertEqual(self.backend.rpc_call("test_api", "echo", method_kwargs={"a": 1}), {"a": 1})
+
+  def test_idle_eviction(self):
+    self.transport.max_idle_time = -1
+    self.backend.rpc_call("test_api", "echo", method_kwargs={})
+    self.backend.rpc_call("test_api", "echo", method_kwargs={})
+    self.assertEqual(len(self.server.connections), 2)
+
+  def test_max_connections_bounds_open_connections(self):
+    threads = [threading.Thread(target=self.backend.rpc_call, args=("test_api", "slow"), kwargs={"method_kwargs": {}}) for i in range(4)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    self.assertEqual(len(self.server.connections), 2)
+    self.assertEqual(sum(self.transport.idle_connections().values()), 2)
+
+  def test_reuses_connection_with_high_fd(self):
+    # select() cannot watch descriptors above FD_SETSIZE (1024)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < 1200:
+      self.skipTest("open file limit too low")
+    fds = [os.dup(0) for i in range(1100)]
+    try:
+      for i in range(3):
+        self.backend.rpc_call("test_api", "echo", method_kwargs={})
+      for pool in self.transport._pools.values():
+        for conn, last_used in pool:
+          self.assertGreater(conn.sock.fileno(), 1024)
+    finally:
+      for fd in fds:
+        os.close(fd)
+    self.assertEqual(len(self.server.connections), 1)
+
+  def test_connect_time(self):
+    data = json.dumps({"id": 0, "params": ["a", "echo", {}]}).encode("ascii")
+    with self.transport(self.url, data, 5) as f:
+      self.assertGreater(f.connect_time, 0.0)
+    with self.transport(self.url, data, 5) as f:
+      self.assertEqual(f.connect_time, 0.0)
+
+  def test_http_error(self):
+    with self.assertRaises(urllib.error.HTTPError):
+      self.transport(self.url, json.dumps({"id": 0, "params": ["a", "fail", {}]}).encode("ascii"), 5)
+    with self.assertRaises(SteemHTTPError):
+      self.backend.rpc_call("test_api", "fail", method_kwargs={})
+
+class TestCompression(unittest.TestCase):
+
+  def setUp(self):
+    self.server = ThreadedHTTPServer(("127.0.0.1", 0), EchoHandler)
+    self.server.connections = set()
+    self.thread = threading.Thread(target=self.server.serve_forever)
+    self.thread.daemon = True
+    self.thread.start()
+    self.url = "http://127.0.0.1:{}/".format(self.server.server_address[1])
+    self.payload = {"body": "x" * 10000}
+
+  def tearDown(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def check_backend(self, backend):
+    self.assertEqual(backend.rpc_call("test_api", "echo", method_kwargs=self.payload), self.payload)
+    self.assertEqual(backend.rpc_call("test_api", "deflate", method_kwargs=self.payload), self.payload)
+    stats = backend.transfer_stats()
+    self.assertLess(stats["bytes_received"] * 10, stats["bytes_decoded"])
+
+  def test_urllib(self):
+    self.check_backend(SteemRemoteBackend(nodes=[self.url], appbase=True, max_retries=0,
+      accept_encoding=True, read_chunk_size=64))
+
+  def test_pooled(self):
+    transport = PooledHTTPTransport()
+    self.check_backend(SteemRemoteBackend(nodes=[self.url], urlopen=transport, appbase=True,
+      max_retries=0, accept_encoding=True))
+    transport.close()
+
+  def test_not_requested(self):
+    backend = SteemRemoteBackend(nodes=[self.url], appbase=True, max_retries=0)
+    self.assertEqual(backend.rpc_call("test_api", "echo", method_kwargs=self.payload), self.payload)
+    stats = backend.transfer_stats()
+    self.assertEqual(stats["bytes_received"], stats["bytes_decoded"])
+
+  def test_async(self):
+    backend = AsyncSteemRemoteBackend(nodes=[self.url], appbase=True, max_retries=0, accept_encoding=True)
+    loop = asyncio.new_event_loop()
+    try:
+      result = loop.run_until_complete(backend.rpc_call("test_api", "deflate", method_kwargs=self.payload))
+    finally:
+      backend.close()
+      loop.close()
+    self.assertEqual(result, self.payload)
+    self.assertLess(backend.transfer_stats()["bytes_received"] * 10, backend.transfer_stats()["bytes_decoded"])